@@ -0,0 +1,240 @@
+"""Offline benchmarks for the game, solver and evaluator hot paths.
+
+Runs without any language model backend (a dummy model and `KnuthSolver` stand in), sweeps game configurations and
+records wall time and peak traced memory per benchmark as JSON. A stored result can serve as a baseline to flag
+regressions:
+
+    python benchmarks/bench_hot_paths.py --configs 4x6 5x8 --output bench.json
+    python benchmarks/bench_hot_paths.py --configs 4x6 5x8 --baseline bench.json --threshold 0.25
+"""
+
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import rootutils
+
+from mastermind.evaluator import Evaluator
+from mastermind.game import Mastermind
+from mastermind.models import ChatHistory, LanguageModel
+from mastermind.solvers import KnuthSolver
+from mastermind.utils import parse_guess
+
+# the dataset build benchmark imports the top-level scripts of the repository
+ROOT = rootutils.find_root(search_from=__file__, indicator=".project-root")
+sys.path.insert(0, str(ROOT))
+
+BenchmarkResult = Dict[str, object]
+
+
+class DummyModel(LanguageModel):
+    def __call__(self, chat_history: ChatHistory) -> ChatHistory:
+        chat_history.append({"role": "assistant", "content": "This is a dummy response."})
+        return chat_history
+
+    def get_model_info(self) -> str:
+        return "dummy"
+
+
+def measure(fn: Callable[[], None], repeats: int) -> Tuple[float, int]:
+    """Median wall time over `repeats` runs and the peak traced memory of a single run."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def random_history(game: Mastermind, num_guesses: int) -> List:
+    history = []
+    for _ in range(num_guesses):
+        guess = random.choices(game.possible_colors, k=game.code_length)
+        exact_matches, partial_matches, _ = game.evaluate(guess)
+        history.append((guess, (exact_matches, partial_matches)))
+    return history
+
+
+def bench_evaluate_guess(game: Mastermind) -> Callable[[], None]:
+    pairs = [
+        (random.choices(game.possible_colors, k=game.code_length), random.choices(game.possible_colors, k=game.code_length))
+        for _ in range(10_000)
+    ]
+
+    def run():
+        for guess, code in pairs:
+            game.evaluate_guess(guess, code)
+
+    return run
+
+
+def bench_parse_guess(game: Mastermind) -> Callable[[], None]:
+    turns = [
+        {"role": "assistant", "content": f"Some reasoning about the feedback.\nFINAL GUESS: {random.choices(game.possible_colors, k=game.code_length)}"}
+        for _ in range(10_000)
+    ]
+
+    def run():
+        for turn in turns:
+            parse_guess(turn)
+
+    return run
+
+
+def bench_progress(game: Mastermind) -> Callable[[], None]:
+    evaluator = Evaluator(game, DummyModel())
+    history = random_history(game, num_guesses=8)
+    return lambda: evaluator.progress(history, game)
+
+
+def bench_knuth_game(game: Mastermind) -> Callable[[], None]:
+    solver = KnuthSolver(game)
+
+    def run():
+        solver.reset()
+        chat_history = []
+        for _ in range(game.max_guesses):
+            chat_history = solver(chat_history)
+            if chat_history[-1]["content"] == game.secret_code:
+                break
+            chat_history.append({"role": "user", "content": "Feedback"})
+
+    return run
+
+
+def bench_dataset_build_chunk(game: Mastermind) -> Callable[[], None]:
+    # `make_eval_harness` spreads chunks over a process pool whose startup would dominate the timing and whose
+    # memory tracemalloc cannot see, so the per-chunk work of its workers is measured in this process instead
+    from create_eval_harness_splits import build_chunk
+
+    games = []
+    for _ in range(200):
+        history = random_history(game, num_guesses=5)
+        history.append((list(game.secret_code), (game.code_length, 0)))
+        games.append(
+            {
+                "game": game.to_json(),
+                "guess_history": history,
+                "progress_history": [0] * (len(history) - 1) + [1],
+            }
+        )
+    # scores come back from disk as lists
+    games = json.loads(json.dumps(games))
+
+    return lambda: build_chunk(0, games, seed=0)
+
+
+BENCHMARKS: Dict[str, Tuple[Callable[[Mastermind], Callable[[], None]], int, str]] = {
+    # name: (setup, maximum size of the code space the benchmark is run for, what one run measures)
+    "evaluate_guess": (bench_evaluate_guess, 10**7, "10k Mastermind.evaluate_guess calls"),
+    "parse_guess": (bench_parse_guess, 10**7, "10k parse_guess calls"),
+    "progress": (bench_progress, 10**7, "Evaluator.progress of an 8-guess game"),
+    "knuth_game": (bench_knuth_game, 8**5, "one KnuthSolver game"),
+    "dataset_build_chunk": (
+        bench_dataset_build_chunk,
+        10**7,
+        "create_eval_harness_splits.build_chunk of 200 games in-process, without process pool or Parquet writing",
+    ),
+}
+
+
+def run_benchmarks(configs: List[Tuple[int, int]], names: List[str], repeats: int) -> List[BenchmarkResult]:
+    results = []
+    for code_length, num_colors in configs:
+        for name in names:
+            setup, max_codes, measures = BENCHMARKS[name]
+            result: BenchmarkResult = {"name": name, "config": f"{code_length}x{num_colors}", "measures": measures}
+            if num_colors**code_length > max_codes:
+                result["skipped"] = f"code space larger than {max_codes}"
+            else:
+                random.seed(0)
+                game = Mastermind(code_length=code_length, num_colors=num_colors)
+                try:
+                    fn = setup(game)
+                except ImportError as e:
+                    result["skipped"] = f"missing dependency: {e.name}"
+                else:
+                    result["seconds"], result["peak_memory_bytes"] = measure(fn, repeats)
+            print(json.dumps(result))
+            results.append(result)
+    return results
+
+
+def find_regressions(
+    results: List[BenchmarkResult], baseline: List[BenchmarkResult], threshold: float
+) -> List[Dict[str, object]]:
+    """Benchmarks whose time or peak memory grew by more than `threshold` (relative) over the baseline."""
+    previous = {(r["name"], r["config"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["name"], result["config"]))
+        if before is None or "skipped" in result or "skipped" in before:
+            continue
+        for metric in ("seconds", "peak_memory_bytes"):
+            if result[metric] > before[metric] * (1 + threshold):
+                regressions.append(
+                    {
+                        "name": result["name"],
+                        "config": result["config"],
+                        "metric": metric,
+                        "baseline": before[metric],
+                        "current": result[metric],
+                        "ratio": result[metric] / before[metric] if before[metric] else float("inf"),
+                    }
+                )
+    return regressions
+
+
+def parse_config(value: str) -> Tuple[int, int]:
+    code_length, num_colors = value.lower().split("x")
+    return int(code_length), int(num_colors)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--configs", type=parse_config, nargs="+", default=["4x6", "5x8", "6x10"], help="CODE_LENGTHxNUM_COLORS.")
+    parser.add_argument("--benchmarks", nargs="+", default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per benchmark (the median is reported).")
+    parser.add_argument("--output", type=str, default=None, help="Write results as JSON to this file.")
+    parser.add_argument("--baseline", type=str, default=None, help="Stored results to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown that counts as a regression.")
+    args = parser.parse_args()
+
+    configs = [parse_config(c) if isinstance(c, str) else c for c in args.configs]
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "repeats": args.repeats,
+        },
+        "results": run_benchmarks(configs, args.benchmarks, args.repeats),
+    }
+
+    regressions: Optional[List] = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(report["results"], json.load(f)["results"], args.threshold)
+        report["regressions"] = regressions
+        for regression in regressions:
+            print(f"REGRESSION {regression['name']} [{regression['config']}] {regression['metric']}: x{regression['ratio']:.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    sys.exit(1 if regressions else 0)
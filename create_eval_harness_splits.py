@@ -1,16 +1,29 @@
-import json
 import os
+import random
 import string
-from datasets import Dataset
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
 
-from tqdm import tqdm
-import random
-from itertools import product
 import inflect
+from tqdm import tqdm
+
+from mastermind.code_space import CodeSpace
+from mastermind.corpus import ParquetShardWriter, apply_stages, iter_records, load_shards, select_fields
+from mastermind.feedback import encode_code, is_valid_code
+from mastermind.selfplay import expand_game
 
 p = inflect.engine()
 
 
+@lru_cache(maxsize=None)
+def number_to_words(number):
+    # inflect type-checks every call, which dominated the build time; the numbers involved are tiny
+    return p.number_to_words(number)
+
+
 def format_guesses_detail(guesses):
     formatted_guesses = []
 
@@ -21,16 +34,16 @@ def format_guesses_detail(guesses):
             )
         elif score[0] > 0 and score[1] == 0:
             formatted_guesses.append(
-                f"Guess: {guess}. Hint: {p.number_to_words(score[0])} color{'s are' if score[0] > 1 else ' is'} in the correct position{'s' if score[0] > 1 else ''}."
+                f"Guess: {guess}. Hint: {number_to_words(score[0])} color{'s are' if score[0] > 1 else ' is'} in the correct position{'s' if score[0] > 1 else ''}."
             )
         elif score[0] == 0 and score[1] > 0:
             formatted_guesses.append(
-                f"Guess: {guess}. Hint: {p.number_to_words(score[1])} color{'s are' if score[1] > 1 else ' is'} in the secret code but in the wrong position{'s' if score[1] > 1 else ''}."
+                f"Guess: {guess}. Hint: {number_to_words(score[1])} color{'s are' if score[1] > 1 else ' is'} in the secret code but in the wrong position{'s' if score[1] > 1 else ''}."
             )
         elif score[0] > 0 and score[1] > 0:
             formatted_guesses.append(
-                f"Guess: {guess}. Hint: {p.number_to_words(score[0])} color{'s are' if score[0] > 1 else ' is'} in the correct position{'s' if score[0] > 1 else ''} "
-                f"and {p.number_to_words(score[1])} color{'s are' if score[1] > 1 else ' is'} in the secret code but in the wrong position{'s' if score[0] > 1 else ''}."
+                f"Guess: {guess}. Hint: {number_to_words(score[0])} color{'s are' if score[0] > 1 else ' is'} in the correct position{'s' if score[0] > 1 else ''} "
+                f"and {number_to_words(score[1])} color{'s are' if score[1] > 1 else ' is'} in the secret code but in the wrong position{'s' if score[0] > 1 else ''}."
             )
         else:
             raise ValueError(f"Invalid feedback scores: {score}")
@@ -40,7 +53,7 @@ def format_guesses_detail(guesses):
 
 def instruction_template(code_length: int, possible_colors: list, formatted_guesses: str):
     instruction = (
-        f"Your goal is to find the secret {p.number_to_words(code_length)}-color code. The following colors are possible: {', '.join(possible_colors)}.\n"
+        f"Your goal is to find the secret {number_to_words(code_length)}-color code. The following colors are possible: {', '.join(possible_colors)}.\n"
         f"Some guesses have already been made. I will provide feedback for each guess made with which it is possible to unambigiously determine the secret code.\n\n"
         f"Previous Guesses:\n"
         f"{formatted_guesses}"
@@ -48,13 +61,20 @@ def instruction_template(code_length: int, possible_colors: list, formatted_gues
     return instruction
 
 
-def generate_random_answers(code_length, possible_colors, already_guessed):
-    possible_codes = [tuple(code) for code in product(possible_colors, repeat=code_length)]
-    possible_codes = [code for code in possible_codes if code not in already_guessed]
-    return random.sample(possible_codes, k=3)
+def generate_random_answers(code_length, possible_colors, already_guessed, rng=random):
+    """Sample three distinct codes that were not guessed, by index into the code space.
+
+    Guesses that are not codes of the space (unknown colors or a wrong length, as in model games) cannot collide
+    with a sampled code and are ignored.
+    """
+    space = CodeSpace(code_length, len(possible_colors))
+    encoded = [encode_code(guess, possible_colors) for guess in already_guessed]
+    guessed = [int(space.rank(code)) for code in encoded if is_valid_code(code, code_length, len(possible_colors))]
+    chosen = space.sample(3, rng=rng, exclude=guessed)
+    return [tuple(space.unrank_colors(code_index, possible_colors)) for code_index in chosen]
 
 
-def generate_close_answers(secret_code, possible_colors, guessed_options, num_tuples=3):
+def generate_close_answers(secret_code, possible_colors, guessed_options, num_tuples=3, rng=random):
     """
     Generate close tuples based on a secret color code.
     A close tuple replaces one random entry in the secret code with a random color.
@@ -65,6 +85,7 @@ def generate_close_answers(secret_code, possible_colors, guessed_options, num_tu
         possible_colors (list): List of all possible colors.
         guessed_options (list): List of already guessed tuples to avoid.
         num_tuples (int): Number of tuples to generate.
+        rng (random.Random): Source of randomness.
 
     Returns:
         list of tuples: List containing the generated close tuples.
@@ -76,11 +97,11 @@ def generate_close_answers(secret_code, possible_colors, guessed_options, num_tu
         modified_code = secret_code.copy()
 
         # Randomly choose a position to replace
-        position_to_replace = random.randint(0, len(secret_code) - 1)
+        position_to_replace = rng.randint(0, len(secret_code) - 1)
 
         # Get a random color that is not the current color at that position
         original_color = modified_code[position_to_replace]
-        new_color = random.choice([color for color in possible_colors if color != original_color])
+        new_color = rng.choice([color for color in possible_colors if color != original_color])
 
         # Replace the color in the copied list
         modified_code[position_to_replace] = new_color
@@ -95,12 +116,12 @@ def generate_close_answers(secret_code, possible_colors, guessed_options, num_tu
     return list(close_tuples)
 
 
-def prepare_shuffled_output(secret, options):
+def prepare_shuffled_output(secret, options, rng=random):
     # Combine secret with options and shuffle
     options = [", ".join(option) for option in options]
     secret = ", ".join(secret)
     all_options = options + [secret]
-    random.shuffle(all_options)
+    rng.shuffle(all_options)
 
     # Assign labels (A, B, C, ...) to the options
     labels = list(string.ascii_uppercase[: len(all_options)])
@@ -115,74 +136,111 @@ def prepare_shuffled_output(secret, options):
     return output, correct_label
 
 
-def make_eval_harness(path: str):
-    with open(f"{path}/raw.json") as f:
-        data = json.load(f)
-
-    dataset_easy = {"id": [], "instruction": [], "options": [], "answerKey": []}
-    dataset_difficult = {"id": [], "instruction": [], "options": [], "answerKey": []}
-    for game in tqdm(data, desc="Filtering data."):
-        progress_history = game["progress_history"]
-        if not progress_history[-1] == 1:
-            continue
-
-        game_data = game["game"]
-        guesses = game["guess_history"]
-        hints = game["guess_history"][:-1]
-        secret_code = game_data["secret_code"]
-        possible_colors = game_data["possible_colors"]
-        code_length = game_data["code_length"]
-        random_answer_options = generate_random_answers(
-            code_length, possible_colors, [tuple(guess) for guess, _ in guesses]
-        )
-        close_answer_options = generate_close_answers(
-            secret_code, possible_colors, [tuple(guess) for guess, _ in guesses]
-        )
-        random_answer_options, correct_random_option = prepare_shuffled_output(secret_code, random_answer_options)
-        difficult_answer_options, correct_difficult_option = prepare_shuffled_output(secret_code, close_answer_options)
-        formatted_hints = format_guesses_detail(hints)
-
-        instruction = instruction_template(
-            code_length=code_length,
-            possible_colors=possible_colors,
-            formatted_guesses=formatted_hints,
-        )
-
-        dataset_easy["id"].append(len(dataset_easy["id"]))
-        dataset_easy["instruction"].append(instruction)
-        dataset_easy["options"].append(random_answer_options)
-        dataset_easy["answerKey"].append(correct_random_option)
-
-        dataset_difficult["id"].append(len(dataset_difficult["id"]))
-        dataset_difficult["instruction"].append(instruction)
-        dataset_difficult["options"].append(difficult_answer_options)
-        dataset_difficult["answerKey"].append(correct_difficult_option)
-
-    print(f"Dataset (easy) contains {len(dataset_easy['id'])} instructions.")
-    print(f"Dataset (difficult) contains {len(dataset_difficult['id'])} instructions.")
-
-    with open(f"{path}/harness_easy.json", "w") as f:
-        json.dump(dataset_easy, f, indent=4)
-
-    with open(f"{path}/harness_difficult.json", "w") as f:
-        json.dump(dataset_difficult, f, indent=4)
-
-    return dataset_easy, dataset_difficult
+def solved_by_hints(game):
+    """Keep only games whose hints narrow the code space down to the secret code."""
+    progress_history = game["progress_history"]
+    return game if progress_history and progress_history[-1] == 1 else None
+
+
+def build_instances(game, rng):
+    """The easy and difficult multiple-choice instance of a game (without id)."""
+    game_data = game["game"]
+    guesses = game["guess_history"]
+    hints = game["guess_history"][:-1]
+    secret_code = game_data["secret_code"]
+    possible_colors = game_data["possible_colors"]
+    code_length = game_data["code_length"]
+    random_answer_options = generate_random_answers(
+        code_length, possible_colors, [tuple(guess) for guess, _ in guesses], rng=rng
+    )
+    close_answer_options = generate_close_answers(
+        secret_code, possible_colors, [tuple(guess) for guess, _ in guesses], rng=rng
+    )
+    random_answer_options, correct_random_option = prepare_shuffled_output(secret_code, random_answer_options, rng=rng)
+    difficult_answer_options, correct_difficult_option = prepare_shuffled_output(
+        secret_code, close_answer_options, rng=rng
+    )
+    formatted_hints = format_guesses_detail(hints)
+
+    instruction = instruction_template(
+        code_length=code_length,
+        possible_colors=possible_colors,
+        formatted_guesses=formatted_hints,
+    )
+
+    easy = {"instruction": instruction, "options": random_answer_options, "answerKey": correct_random_option}
+    difficult = {"instruction": instruction, "options": difficult_answer_options, "answerKey": correct_difficult_option}
+    return easy, difficult
+
+
+def build_chunk(chunk_index, games, seed):
+    rng = random.Random(f"{seed}:{chunk_index}")
+    return [build_instances(game, rng) for game in games]
+
+
+def iter_chunks(items, chunk_size):
+    iterator = iter(items)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+def make_eval_harness(path: str, num_workers=None, chunk_size: int = 1000, seed: int = 42, rows_per_shard: int = 10_000):
+    """Build the easy and difficult MCQ splits of a dataset as Parquet shards in `harness_easy/`/`harness_difficult/`.
+
+    `path` is a dataset directory (`raw.json`, JSONL files written by `Evaluator.run` or self-play Parquet shards)
+    or a single such file.
+    Games are streamed in chunks to a process pool and the instances are written in input order as they come
+    back, so memory stays bounded by the number of chunks in flight and the shard size. Each chunk has its own
+    seeded random state, which makes the output independent of the number of workers.
+    """
+    output_dir = Path(path) if Path(path).is_dir() else Path(path).parent
+    stages = [expand_game, solved_by_hints, select_fields("game", "guess_history", "progress_history")]
+    games = apply_stages(iter_records(path), stages)
+    num_instances = 0
+
+    num_workers = num_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=num_workers) as executor, ParquetShardWriter(
+        output_dir / "harness_easy", rows_per_shard=rows_per_shard
+    ) as easy_writer, ParquetShardWriter(output_dir / "harness_difficult", rows_per_shard=rows_per_shard) as difficult_writer:
+        max_in_flight = 2 * num_workers
+        in_flight = deque()
+        chunks = enumerate(iter_chunks(games, chunk_size))
+        progress_bar = tqdm(desc="Filtering data.", unit="chunk")
+
+        def write_next():
+            nonlocal num_instances
+            for easy, difficult in in_flight.popleft().result():
+                easy_writer.write({"id": num_instances, **easy})
+                difficult_writer.write({"id": num_instances, **difficult})
+                num_instances += 1
+            progress_bar.update(1)
+
+        for chunk_index, chunk in chunks:
+            in_flight.append(executor.submit(build_chunk, chunk_index, chunk, seed))
+            if len(in_flight) >= max_in_flight:
+                write_next()
+        while in_flight:
+            write_next()
+        progress_bar.close()
+
+    print(f"Dataset (easy) contains {num_instances} instructions.")
+    print(f"Dataset (difficult) contains {num_instances} instructions.")
+    return easy_writer.output_dir, difficult_writer.output_dir
 
 
 if __name__ == "__main__":
     for setting in ["24", "35", "46"]:
         path = f"datasets/dataset_{setting}_50k"
 
-        dataset_easy, dataset_difficult = make_eval_harness(path)
-        dataset_easy = Dataset.from_dict(dataset_easy)
+        easy_path, difficult_path = make_eval_harness(path)
+        dataset_easy = load_shards(easy_path)
         easy_train_test = dataset_easy.train_test_split(test_size=0.05, seed=42)
         easy_train_val = easy_train_test["train"].train_test_split(test_size=0.1, seed=42)
         easy_train_val["validation"] = easy_train_val.pop("test")
         easy_train_val["test"] = easy_train_test["test"]
         easy_train_val.push_to_hub(f"flair/mastermind_{setting}_mcq_random")
 
-        dataset_difficult = Dataset.from_dict(dataset_difficult)
+        dataset_difficult = load_shards(difficult_path)
         difficult_train_test = dataset_difficult.train_test_split(test_size=0.05, seed=42)
         difficult_train_val = difficult_train_test["train"].train_test_split(test_size=0.1, seed=42)
         difficult_train_val["validation"] = difficult_train_val.pop("test")
@@ -0,0 +1,37 @@
+from argparse import ArgumentParser
+from pathlib import Path
+
+from mastermind.selfplay import generate_corpus
+
+
+def parse_config(value: str):
+    code_length, num_colors = value.lower().split("x")
+    return int(code_length), int(num_colors)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Play KnuthSolver games and store them as Parquet shards.")
+    parser.add_argument("--configs", type=parse_config, nargs="+", default=[(2, 4), (3, 5), (4, 6)], help="CODE_LENGTHxNUM_COLORS.")
+    parser.add_argument("--num_games", type=int, default=50_000, help="Games per configuration.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max_guesses", type=int, default=12)
+    parser.add_argument("--num_workers", type=int, default=None, help="Worker processes (default: all CPUs).")
+    parser.add_argument("--chunk_size", type=int, default=1000, help="Games per task sent to a worker.")
+    parser.add_argument("--rows_per_shard", type=int, default=100_000)
+    parser.add_argument("--output_dir", type=str, default="datasets")
+    args = parser.parse_args()
+
+    for code_length, num_colors in args.configs:
+        output_dir = Path(args.output_dir) / f"selfplay_{code_length}{num_colors}_{args.num_games}"
+        shards = generate_corpus(
+            output_dir,
+            code_length,
+            num_colors,
+            args.num_games,
+            seed=args.seed,
+            max_guesses=args.max_guesses,
+            num_workers=args.num_workers,
+            chunk_size=args.chunk_size,
+            rows_per_shard=args.rows_per_shard,
+        )
+        print(f"Wrote {len(shards)} shard(s) to {output_dir}.")
@@ -1,11 +1,17 @@
+import asyncio
 import json
+import random
 from argparse import ArgumentParser
 from typing import Optional
 
-from mastermind.evaluator import Evaluator
+from mastermind.async_models import AsyncAnthropicModel, AsyncOpenAIModel, AsyncRateLimiter, AsyncVLLMModel
+from mastermind.evaluator import Evaluator, load_run_summary
 from mastermind.game import Mastermind
-from mastermind.models import AnthropicModel, HFModel, OpenAIModel, VLLMModel
+from mastermind.models import AnthropicModel, BatchedHFModel, OpenAIModel, VLLMModel
+from mastermind.response_cache import with_response_cache
 from mastermind.solvers import KnuthSolver
+from mastermind.strategy_tree import StrategyTreeSolver
+from mastermind.transport import Transport
 from mastermind.utils import print_summary
 
 
@@ -40,6 +46,32 @@ if __name__ == "__main__":
     )
     parser.add_argument("--load_in_8bit", action="store_true", help="Load HF model in 8-bit quantization via bitsandbytes.")
     parser.add_argument("--num_parallel", type=int, default=1, help="Number of games to run in parallel (useful with vLLM).")
+    parser.add_argument("--use_processes", action="store_true", help="Run games in worker processes (for CPU-bound solvers).")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the color set and every game, needed to resume a run.")
+    parser.add_argument("--resume_from", type=str, default=None, help="Results JSONL of an interrupted run to continue.")
+    parser.add_argument("--use_prefix_cache", action="store_true", help="Reuse HF past-key-values across turns and games.")
+    parser.add_argument("--batch_size", type=int, default=1, help="Batch turns of concurrent games into one HF generate call.")
+    parser.add_argument("--max_wait_time", type=float, default=0.05, help="Seconds to wait for a full HF batch.")
+    parser.add_argument("--use_async", action="store_true", help="Run games in one event loop with async API clients.")
+    parser.add_argument("--max_concurrency", type=int, default=64, help="Maximum number of games in flight with --use_async.")
+    parser.add_argument(
+        "--continuous_batching",
+        action="store_true",
+        help="With --use_async, keep --max_concurrency requests in flight across games, preferring games close to finishing.",
+    )
+    parser.add_argument(
+        "--stop_at_final_guess",
+        action="store_true",
+        help="Stream replies and stop generating once the FINAL GUESS line is complete.",
+    )
+    parser.add_argument(
+        "--prompt_caching",
+        action="store_true",
+        help="Keep the instruction identical across games and mark it for the provider's prompt cache.",
+    )
+    parser.add_argument("--max_retries", type=int, default=6, help="Retries per API request on rate limits and server errors.")
+    parser.add_argument("--cache_path", type=str, default=None, help="SQLite file to cache model responses in.")
+    parser.add_argument("--requests_per_second", type=float, default=None, help="Rate limit for the async API backend.")
     args = parser.parse_args()
 
     if args.generation_args:
@@ -47,25 +79,84 @@ if __name__ == "__main__":
     else:
         generation_args = None
 
+    if args.resume_from is not None and args.seed is None:
+        # the seed also picks the color set, so it has to be known before the game is created
+        args.seed = (load_run_summary(args.resume_from) or {}).get("seed")
+        if args.seed is None:
+            parser.error("--resume_from needs the --seed of the interrupted run, which its summary does not record.")
+    if args.seed is not None:
+        random.seed(args.seed)
     game = Mastermind(code_length=args.code_length, num_colors=args.num_colors)
 
-    if args.model_type == "hf":
-        model = HFModel(model_name=args.model, generation_args=generation_args, enable_thinking=args.enable_thinking, load_in_8bit=args.load_in_8bit)
+    rate_limiter = AsyncRateLimiter(args.requests_per_second) if args.requests_per_second else None
+    max_connections = args.max_concurrency if args.use_async else args.num_parallel
+    transport = Transport(max_connections=max_connections, max_retries=args.max_retries)
+
+    if args.use_async and args.model_type == "openai":
+        model = AsyncOpenAIModel(model_name=args.model, generation_args=generation_args, rate_limiter=rate_limiter, transport=transport, stop_at_final_guess=args.stop_at_final_guess)
+    elif args.use_async and args.model_type == "anthropic":
+        model = AsyncAnthropicModel(model_name=args.model, generation_args=generation_args, rate_limiter=rate_limiter, transport=transport, stop_at_final_guess=args.stop_at_final_guess, prompt_caching=args.prompt_caching)
+    elif args.use_async and args.model_type == "vllm":
+        model = AsyncVLLMModel(
+            model_name=args.model,
+            generation_args=generation_args,
+            base_url=args.base_url,
+            enable_thinking=args.enable_thinking,
+            rate_limiter=rate_limiter,
+            transport=transport,
+            stop_at_final_guess=args.stop_at_final_guess,
+        )
+    elif args.model_type == "hf":
+        from mastermind.hf_models import HFModel
+
+        model = HFModel(model_name=args.model, generation_args=generation_args, enable_thinking=args.enable_thinking, load_in_8bit=args.load_in_8bit, use_prefix_cache=args.use_prefix_cache, stop_at_final_guess=args.stop_at_final_guess)
+        if args.batch_size > 1:
+            model = BatchedHFModel(model, batch_size=args.batch_size, max_wait_time=args.max_wait_time)
     elif args.model_type == "openai":
-        model = OpenAIModel(model_name=args.model, generation_args=generation_args)
+        model = OpenAIModel(model_name=args.model, generation_args=generation_args, transport=transport, stop_at_final_guess=args.stop_at_final_guess)
     elif args.model_type == "anthropic":
-        model = AnthropicModel(model_name=args.model, generation_args=generation_args)
+        model = AnthropicModel(model_name=args.model, generation_args=generation_args, transport=transport, stop_at_final_guess=args.stop_at_final_guess, prompt_caching=args.prompt_caching)
     elif args.model_type == "vllm":
-        model = VLLMModel(model_name=args.model, generation_args=generation_args, base_url=args.base_url, enable_thinking=args.enable_thinking)
+        model = VLLMModel(model_name=args.model, generation_args=generation_args, base_url=args.base_url, enable_thinking=args.enable_thinking, transport=transport, stop_at_final_guess=args.stop_at_final_guess)
     elif args.model_type == "knuth":
         model = KnuthSolver(game)
+    elif args.model_type == "knuth_tree":
+        model = StrategyTreeSolver(game)
+    if args.model_type not in ("knuth", "knuth_tree"):
+        model = with_response_cache(model, args.cache_path)
 
-    evaluator = Evaluator(game, model, use_cot=args.use_cot, use_fewshot_example=args.use_full_example)
-    result = evaluator.run(
-        num_games=args.num_runs,
-        num_parallel=args.num_parallel,
-        save_results=args.save_results,
-        save_path=args.save_path,
-        compute_progress=True,
-    )
+    evaluator = Evaluator(game, model, use_cot=args.use_cot, use_fewshot_example=args.use_full_example, seed=args.seed, prompt_caching=args.prompt_caching)
+    if args.use_async and args.continuous_batching:
+        result = asyncio.run(
+            evaluator.arun_continuous(
+                num_games=args.num_runs,
+                target_in_flight=args.max_concurrency,
+                save_results=args.save_results,
+                save_path=args.save_path,
+                compute_progress=True,
+                resume_from=args.resume_from,
+            )
+        )
+        print(f"Scheduler: {json.dumps(evaluator.scheduler_stats, indent=2)}")
+    elif args.use_async:
+        result = asyncio.run(
+            evaluator.arun(
+                num_games=args.num_runs,
+                max_concurrency=args.max_concurrency,
+                save_results=args.save_results,
+                save_path=args.save_path,
+                compute_progress=True,
+                resume_from=args.resume_from,
+            )
+        )
+    else:
+        result = evaluator.run(
+            num_games=args.num_runs,
+            num_parallel=args.num_parallel,
+            save_results=args.save_results,
+            save_path=args.save_path,
+            compute_progress=True,
+            resume_from=args.resume_from,
+            use_processes=args.use_processes,
+        )
     print_summary(model, game, result, args.num_runs)
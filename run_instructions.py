@@ -1,14 +1,26 @@
+import asyncio
 import json
 import threading
 from argparse import ArgumentParser
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
 from typing import Optional
 
-from tqdm import tqdm
 from datasets import load_dataset
+from tqdm import tqdm
 
-from mastermind.models import AnthropicModel, HFModel, OpenAIModel, VLLMModel
-from mastermind.utils import parse_guess, make_output_path
+from mastermind.async_models import (
+    AsyncAnthropicModel,
+    AsyncLanguageModel,
+    AsyncOpenAIModel,
+    AsyncRateLimiter,
+    AsyncVLLMModel,
+)
+from mastermind.models import AnthropicModel, OpenAIModel, VLLMModel
+from mastermind.response_cache import request_identity, with_response_cache
+from mastermind.results import ResultWriter, load_results
+from mastermind.transport import Transport
+from mastermind.utils import make_output_path, parse_guess
 
 
 def parse_optional_bool(value: Optional[str]) -> Optional[bool]:
@@ -22,53 +34,119 @@ def parse_optional_bool(value: Optional[str]) -> Optional[bool]:
     raise ValueError(f"Invalid boolean value: {value}")
 
 
+def make_record(model, index, dp, last_output, args, error=None):
+    if error is not None:
+        return {
+            "index": index,
+            "guess": None,
+            "secret_code": dp["secret_code"],
+            "correct": False,
+            "valid": False,
+            "model": model.get_model_info(),
+            "dataset": args.dataset,
+            "error": repr(error),
+        }
+    try:
+        guess = parse_guess(last_output[-1])
+        return {
+            "index": index,
+            "guess": guess,
+            "secret_code": dp["secret_code"],
+            "correct": guess == dp["secret_code"],
+            "valid": len(guess) == len(dp["secret_code"]),
+            "model": model.get_model_info(),
+            "dataset": args.dataset,
+        }
+    except Exception:
+        return {
+            "index": index,
+            "guess": last_output[-1] if last_output else None,
+            "secret_code": dp["secret_code"],
+            "correct": False,
+            "valid": False,
+            "model": model.get_model_info(),
+            "dataset": args.dataset,
+        }
+
+
+def open_log(model, dataset, args):
+    """Open the results file and return the writer, the records already in it and the items still to evaluate.
+
+    Records are appended as soon as they are available, so an interrupted run can be continued with `--resume_from`.
+    Items whose request failed are recorded with an `error` field and evaluated again on resume.
+    """
+    if args.resume_from:
+        results_file = Path(args.resume_from)
+        log = load_results(results_file)
+    else:
+        output_path = make_output_path(base_path=args.save_path, game_type="deductive_reasoning")
+        results_file = output_path / "results.jsonl"
+        log = []
+        with open(output_path / "info.json", "w") as f:
+            json.dump({"model": model.get_model_info(), "dataset": args.dataset}, f)
+
+    log = [item for item in log if "error" not in item]
+    recorded = {item["index"] for item in log if "index" in item}
+    pending = [(index, dp) for index, dp in enumerate(dataset) if index not in recorded]
+    return ResultWriter(results_file), log, pending
+
+
 def evaluate(model, dataset, args):
-    log = []
+    writer, log, pending = open_log(model, dataset, args)
     log_lock = threading.Lock()
 
-    pbar = tqdm(total=len(dataset), desc="Evaluating.")
+    pbar = tqdm(total=len(dataset), initial=len(dataset) - len(pending), desc="Evaluating.")
 
-    def process(dp):
-        last_output = None
+    def process(index, dp):
         try:
-            last_output = model(dp["instruction"])
-            guess = parse_guess(last_output[-1])
-            return {
-                "guess": guess,
-                "secret_code": dp["secret_code"],
-                "correct": guess == dp["secret_code"],
-                "valid": len(guess) == len(dp["secret_code"]),
-                "model": model.get_model_info(),
-                "dataset": args.dataset,
-            }
-        except Exception:
-            return {
-                "guess": last_output[-1] if last_output else None,
-                "secret_code": dp["secret_code"],
-                "correct": False,
-                "valid": False,
-                "model": model.get_model_info(),
-                "dataset": args.dataset,
-            }
-
-    with ThreadPoolExecutor(max_workers=args.num_parallel) as executor:
-        futures = {executor.submit(process, dp): dp for dp in dataset}
+            with request_identity(index):
+                last_output = model(dp["instruction"])
+        except Exception as e:
+            return make_record(model, index, dp, None, args, error=e)
+        return make_record(model, index, dp, last_output, args)
+
+    with writer, ThreadPoolExecutor(max_workers=args.num_parallel) as executor:
+        futures = [executor.submit(process, index, dp) for index, dp in pending]
         for future in as_completed(futures):
             result = future.result()
+            writer.submit(result)
             with log_lock:
                 log.append(result)
             pbar.update(1)
 
     pbar.close()
+    return log
+
+
+async def aevaluate(model, dataset, args):
+    writer, log, pending_items = open_log(model, dataset, args)
+    pending = asyncio.Queue()
+    for item in pending_items:
+        pending.put_nowait(item)
+
+    pbar = tqdm(total=len(dataset), initial=len(dataset) - len(pending_items), desc="Evaluating.")
+
+    async def worker():
+        while not pending.empty():
+            index, dp = pending.get_nowait()
+            try:
+                with request_identity(index):
+                    if isinstance(model, AsyncLanguageModel):
+                        last_output = await model(dp["instruction"])
+                    else:
+                        last_output = await asyncio.to_thread(model, dp["instruction"])
+                result = make_record(model, index, dp, last_output, args)
+            except Exception as e:
+                result = make_record(model, index, dp, None, args, error=e)
+            writer.submit(result)
+            log.append(result)
+            pbar.update(1)
 
-    output_path = make_output_path(base_path=args.save_path, game_type="deductive_reasoning")
-
-    with open(output_path / "results.jsonl", "w") as f:
-        for item in log:
-            f.write(json.dumps(item) + "\n")
+    with writer:
+        await asyncio.gather(*(worker() for _ in range(max(1, min(args.max_concurrency, len(pending_items))))))
 
-    with open(output_path / "info.json", "w") as f:
-        json.dump({"model": model.get_model_info(), "dataset": args.dataset}, f)
+    pbar.close()
+    return log
 
 
 if __name__ == "__main__":
@@ -80,6 +158,12 @@ if __name__ == "__main__":
     parser.add_argument("--base_url", type=str, default=None, help="Base URL for compatible API backends such as vLLM.")
     parser.add_argument("--save_path", type=str, default=None, help="Base directory for saving results.")
     parser.add_argument("--num_parallel", type=int, default=1, help="Number of samples to evaluate in parallel (useful with vLLM).")
+    parser.add_argument("--resume_from", type=str, default=None, help="results.jsonl of an interrupted run to continue.")
+    parser.add_argument("--use_async", action="store_true", help="Evaluate in one event loop with async API clients.")
+    parser.add_argument("--max_concurrency", type=int, default=64, help="Maximum number of requests in flight with --use_async.")
+    parser.add_argument("--requests_per_second", type=float, default=None, help="Rate limit for the async API backend.")
+    parser.add_argument("--max_retries", type=int, default=6, help="Retries per API request on rate limits and server errors.")
+    parser.add_argument("--cache_path", type=str, default=None, help="SQLite file to cache model responses in.")
     parser.add_argument(
         "--enable_thinking",
         type=parse_optional_bool,
@@ -98,15 +182,37 @@ if __name__ == "__main__":
 
     dataset = dataset.map(apply_chat_template)
 
-    if arguments.model_type == "hf":
+    rate_limiter = AsyncRateLimiter(arguments.requests_per_second) if arguments.requests_per_second else None
+    max_connections = arguments.max_concurrency if arguments.use_async else arguments.num_parallel
+    transport = Transport(max_connections=max_connections, max_retries=arguments.max_retries)
+
+    if arguments.use_async and arguments.model_type == "anthropic":
+        model = AsyncAnthropicModel(model_name=arguments.model, rate_limiter=rate_limiter, transport=transport)
+    elif arguments.use_async and arguments.model_type == "openai":
+        model = AsyncOpenAIModel(model_name=arguments.model, rate_limiter=rate_limiter, transport=transport)
+    elif arguments.use_async and arguments.model_type == "vllm":
+        model = AsyncVLLMModel(
+            model_name=arguments.model,
+            base_url=arguments.base_url,
+            enable_thinking=arguments.enable_thinking,
+            rate_limiter=rate_limiter,
+            transport=transport,
+        )
+    elif arguments.model_type == "hf":
+        from mastermind.hf_models import HFModel
+
         model = HFModel(model_name=arguments.model, enable_thinking=arguments.enable_thinking)
     elif arguments.model_type == "anthropic":
-        model = AnthropicModel(model_name=arguments.model)
+        model = AnthropicModel(model_name=arguments.model, transport=transport)
     elif arguments.model_type == "openai":
-        model = OpenAIModel(model_name=arguments.model)
+        model = OpenAIModel(model_name=arguments.model, transport=transport)
     elif arguments.model_type == "vllm":
-        model = VLLMModel(model_name=arguments.model, base_url=arguments.base_url, enable_thinking=arguments.enable_thinking)
+        model = VLLMModel(model_name=arguments.model, base_url=arguments.base_url, enable_thinking=arguments.enable_thinking, transport=transport)
     else:
         raise ValueError(f"Invalid model type: {arguments.model_type}")
+    model = with_response_cache(model, arguments.cache_path)
 
-    evaluate(model, dataset, arguments)
+    if arguments.use_async:
+        asyncio.run(aevaluate(model, dataset, arguments))
+    else:
+        evaluate(model, dataset, arguments)
@@ -1,6 +1,15 @@
 from mastermind.evaluator import Evaluator
 from mastermind.game import Mastermind
-from mastermind.models import AnthropicModel, HFModel, OpenAIModel
+from mastermind.models import AnthropicModel, OpenAIModel
 from mastermind.solvers import KnuthSolver
 
 __all__ = ["Mastermind", "HFModel", "OpenAIModel", "AnthropicModel", "Evaluator", "KnuthSolver"]
+
+
+def __getattr__(name: str):
+    # importing HFModel loads torch and transformers, so it is deferred until first use
+    if name == "HFModel":
+        from mastermind.hf_models import HFModel
+
+        return HFModel
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,210 @@
+import asyncio
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from mastermind.base import ChatHistory, GenerationArgs
+from mastermind.metrics import record_usage
+from mastermind.models import anthropic_request
+from mastermind.streaming import astream_chat_completion, astream_message
+from mastermind.transport import Transport
+
+
+class AsyncRateLimiter:
+    """Token bucket shared by all games that talk to the same backend."""
+
+    def __init__(self, requests_per_second: float, burst: Optional[int] = None):
+        if requests_per_second <= 0:
+            raise ValueError(f"requests_per_second must be positive, got {requests_per_second}")
+        self.rate = requests_per_second
+        self.capacity = burst or max(1, int(requests_per_second))
+        self.tokens = float(self.capacity)
+        self.last_refill = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class AsyncLanguageModel(ABC):
+    rate_limiter: Optional[AsyncRateLimiter] = None
+
+    @abstractmethod
+    async def __call__(self, chat_history: ChatHistory) -> ChatHistory:
+        pass
+
+    @abstractmethod
+    def get_model_info(self) -> str:
+        pass
+
+    async def _throttle(self):
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire()
+
+
+class AsyncOpenAIModel(AsyncLanguageModel):
+    def __init__(
+        self,
+        model_name: str = "gpt-4-turbo-preview",
+        generation_args: Optional[GenerationArgs] = None,
+        rate_limiter: Optional[AsyncRateLimiter] = None,
+        transport: Optional[Transport] = None,
+        stop_at_final_guess: bool = False,
+    ):
+        """Initialize OpenAI model with API key from environment variables."""
+        try:
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+        except ImportError:
+            raise ImportError("Please install the openai package with 'pip install openai'")
+
+        self.model_name = model_name
+        self.stop_at_final_guess = stop_at_final_guess
+        self.transport = transport or Transport()
+        self.client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_retries=0,
+            http_client=self.transport.http_client(DefaultAsyncHttpxClient),
+        )
+        self.rate_limiter = rate_limiter
+
+    async def __call__(self, chat_history: ChatHistory) -> ChatHistory:
+        await self._throttle()
+        if self.stop_at_final_guess:
+            content, usage = await self.transport.acall(
+                astream_chat_completion, self.client, model=self.model_name, messages=chat_history
+            )
+        else:
+            response = await self.transport.acall(
+                self.client.chat.completions.create,
+                model=self.model_name,
+                messages=chat_history,
+            )
+            content, usage = response.choices[0].message.content, response.usage
+
+        record_usage(usage)
+        chat_history.append({"content": content, "role": "assistant"})
+        return chat_history
+
+    def get_model_info(self) -> str:
+        return f"OpenAI Model: {self.model_name}"
+
+
+class AsyncVLLMModel(AsyncLanguageModel):
+    def __init__(
+        self,
+        model_name: str,
+        generation_args: Optional[GenerationArgs] = None,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        enable_thinking: Optional[bool] = None,
+        rate_limiter: Optional[AsyncRateLimiter] = None,
+        transport: Optional[Transport] = None,
+        stop_at_final_guess: bool = False,
+    ):
+        try:
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+        except ImportError:
+            raise ImportError("Please install the openai package with 'pip install openai'")
+
+        self.model_name = model_name
+        self.stop_at_final_guess = stop_at_final_guess
+        self.enable_thinking = enable_thinking
+        self.base_url = base_url or os.getenv("VLLM_BASE_URL", "http://127.0.0.1:8000/v1")
+        self.transport = transport or Transport()
+        self.client = AsyncOpenAI(
+            api_key=api_key or os.getenv("VLLM_API_KEY", "EMPTY"),
+            base_url=self.base_url,
+            max_retries=0,
+            http_client=self.transport.http_client(DefaultAsyncHttpxClient),
+        )
+        self.generation_args = generation_args or GenerationArgs()
+        self.rate_limiter = rate_limiter
+
+    async def __call__(self, chat_history: ChatHistory) -> ChatHistory:
+        extra_body = {}
+        if self.enable_thinking is not None:
+            extra_body["chat_template_kwargs"] = {"enable_thinking": self.enable_thinking}
+
+        request = dict(
+            model=self.model_name,
+            messages=chat_history,
+            max_tokens=self.generation_args.max_tokens,
+            temperature=self.generation_args.temperature,
+            **({"extra_body": extra_body} if extra_body else {}),
+        )
+        await self._throttle()
+        if self.stop_at_final_guess:
+            content, usage = await self.transport.acall(astream_chat_completion, self.client, **request)
+        else:
+            response = await self.transport.acall(self.client.chat.completions.create, **request)
+            content, usage = response.choices[0].message.content, response.usage
+
+        record_usage(usage)
+        chat_history.append({"content": content, "role": "assistant"})
+        return chat_history
+
+    def get_model_info(self) -> str:
+        return f"vLLM Model: {self.model_name} @ {self.base_url}"
+
+
+class AsyncAnthropicModel(AsyncLanguageModel):
+    def __init__(
+        self,
+        model_name: str = "claude-3-opus-20240229",
+        generation_args: Optional[GenerationArgs] = None,
+        rate_limiter: Optional[AsyncRateLimiter] = None,
+        transport: Optional[Transport] = None,
+        stop_at_final_guess: bool = False,
+        prompt_caching: bool = False,
+    ):
+        """Initialize Anthropic model with API key from environment variables."""
+        try:
+            from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+        except ImportError:
+            raise ImportError("Please install the anthropic package with 'pip install anthropic'")
+
+        self.model_name = model_name
+        self.stop_at_final_guess = stop_at_final_guess
+        self.prompt_caching = prompt_caching
+        self.transport = transport or Transport()
+        self.client = AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"),
+            max_retries=0,
+            http_client=self.transport.http_client(DefaultAsyncHttpxClient),
+        )
+        self.generation_args = generation_args or GenerationArgs()
+        self.rate_limiter = rate_limiter
+
+    async def __call__(self, chat_history: ChatHistory) -> ChatHistory:
+        system, messages = anthropic_request(chat_history, self.prompt_caching)
+        request = dict(
+            model=self.model_name,
+            system=system,
+            messages=messages,
+            max_tokens=self.generation_args.max_tokens,
+            temperature=self.generation_args.temperature,
+        )
+        await self._throttle()
+        if self.stop_at_final_guess:
+            content, usage = await self.transport.acall(astream_message, self.client, **request)
+        else:
+            response = await self.transport.acall(self.client.messages.create, **request)
+            content, usage = response.content[0].text, response.usage
+
+        record_usage(usage, prompt_field="input_tokens", completion_field="output_tokens")
+        chat_history.append({"content": content, "role": "assistant"})
+        return chat_history
+
+    def get_model_info(self) -> str:
+        return f"Anthropic Model: {self.model_name}"
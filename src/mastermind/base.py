@@ -0,0 +1,35 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, List
+
+ChatHistory = List[Dict[str, str]]
+
+
+@dataclass
+class GenerationArgs:
+    max_tokens: int = 2048
+    temperature: float = 0.9
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def keys(self):
+        return self.__annotations__.keys()
+
+    def hf_format(self):
+        return {self._to_hf_format(k): v for k, v in self.__dict__.items() if v is not None}
+
+    def _to_hf_format(self, arg):
+        if arg == "max_tokens":
+            return "max_new_tokens"
+        return arg
+
+
+class LanguageModel(ABC):
+    @abstractmethod
+    def __call__(self, chat_history: ChatHistory) -> ChatHistory:
+        pass
+
+    @abstractmethod
+    def get_model_info(self) -> str:
+        pass
@@ -0,0 +1,58 @@
+import random
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from mastermind.feedback import decode_code, encode_code, rank_codes, unrank_codes
+
+
+class CodeSpace:
+    """All codes of a `(code_length, num_colors)` configuration, identified by their index instead of materialized.
+
+    A code's index is its value in base `num_colors` with the first peg as the most significant digit, i.e. its
+    position in `itertools.product` order. Codes are only unranked into palette indices (or color names) when and
+    where they are needed.
+    """
+
+    def __init__(self, code_length: int, num_colors: int):
+        self.code_length = code_length
+        self.num_colors = num_colors
+        self.size = num_colors**code_length
+        # the smallest dtype that holds every index, to keep candidate arrays compact
+        self.index_dtype = np.int32 if self.size <= np.iinfo(np.int32).max else np.int64
+
+    def __len__(self) -> int:
+        return self.size
+
+    def indices(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Index array of the codes in `[start, stop)`, all codes by default."""
+        return np.arange(start, self.size if stop is None else min(stop, self.size), dtype=self.index_dtype)
+
+    def ranges(self, batch_size: int) -> Iterator[Tuple[int, int]]:
+        """Consecutive `(start, stop)` index ranges of at most `batch_size` codes covering the space."""
+        for start in range(0, self.size, batch_size):
+            yield start, min(start + batch_size, self.size)
+
+    def rank(self, codes: np.ndarray) -> np.ndarray:
+        """Index of each code given as palette indices, for a single code or an (N, code_length) array."""
+        return rank_codes(codes, self.num_colors)
+
+    def unrank(self, indices: np.ndarray) -> np.ndarray:
+        """Palette indices of the codes at `indices`, shape (N, code_length) (or (code_length,) for a scalar)."""
+        return unrank_codes(indices, self.code_length, self.num_colors)
+
+    def rank_colors(self, code: Sequence[str], possible_colors: Sequence[str]) -> int:
+        return int(self.rank(encode_code(code, possible_colors)))
+
+    def unrank_colors(self, index: int, possible_colors: Sequence[str]) -> List[str]:
+        return decode_code(self.unrank(index), possible_colors)
+
+    def sample(self, k: int, rng: random.Random = random, exclude: Iterable[int] = ()) -> List[int]:
+        """Draw `k` distinct code indices without replacement, none of them in `exclude`.
+
+        `random.sample` over a `range` never materializes the space. `k + len(exclude)` indices are drawn so that
+        `k` always remain after dropping the excluded ones.
+        """
+        exclude = set(exclude)
+        sampled = rng.sample(range(self.size), k=k + len(exclude))
+        return [index for index in sampled if index not in exclude][:k]
@@ -0,0 +1,174 @@
+import json
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+Record = Dict
+Stage = Callable[[Record], Optional[Record]]
+
+_JSON_SEPARATORS = " \t\r\n,"
+
+
+def iter_json_array(path: Union[str, Path], read_size: int = 1 << 20) -> Iterator[Record]:
+    """Yield the objects of a top-level JSON array one at a time, reading `read_size` characters at once."""
+    decoder = json.JSONDecoder()
+    started = False
+    buffer, pos = "", 0
+    with open(path) as f:
+        while True:
+            while pos < len(buffer) and buffer[pos] in _JSON_SEPARATORS:
+                pos += 1
+            if pos < len(buffer):
+                if not started:
+                    if buffer[pos] != "[":
+                        raise ValueError(f"{path} does not contain a JSON array.")
+                    started, pos = True, pos + 1
+                    continue
+                if buffer[pos] == "]":
+                    return
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    pass  # the item continues beyond the buffer
+                else:
+                    yield item
+                    pos = end
+                    continue
+            data = f.read(read_size)
+            if not data:
+                raise ValueError(f"Unexpected end of the JSON array in {path}.")
+            buffer, pos = buffer[pos:] + data, 0
+
+
+def iter_jsonl(path: Union[str, Path]) -> Iterator[Record]:
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_parquet(path: Union[str, Path], batch_size: int = 10_000) -> Iterator[Record]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Please install the pyarrow package with 'pip install pyarrow'")
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield from batch.to_pylist()
+
+
+def iter_records(path: Union[str, Path]) -> Iterator[Record]:
+    """Stream game records from a JSONL file (as written by `Evaluator.run`), a Parquet shard, a JSON array file,
+    or a directory.
+
+    A directory is read as all of its `*.jsonl` files in name order, else its `*.parquet` shards, else its `raw.json`.
+    """
+    path = Path(path)
+    if path.is_dir():
+        jsonl_files = sorted(p for p in path.glob("*.jsonl") if not p.name.startswith("harness_"))
+        parquet_files = sorted(path.glob("*.parquet"))
+        if jsonl_files:
+            for jsonl_file in jsonl_files:
+                yield from iter_jsonl(jsonl_file)
+        elif parquet_files:
+            for parquet_file in parquet_files:
+                yield from iter_parquet(parquet_file)
+        else:
+            yield from iter_json_array(path / "raw.json")
+    elif path.suffix == ".jsonl":
+        yield from iter_jsonl(path)
+    elif path.suffix == ".parquet":
+        yield from iter_parquet(path)
+    else:
+        yield from iter_json_array(path)
+
+
+def apply_stages(records: Iterable[Record], stages: Iterable[Stage]) -> Iterator[Record]:
+    """Pass every record through the stages in order; a stage returning None drops the record."""
+    stages = list(stages)
+    for record in records:
+        for stage in stages:
+            record = stage(record)
+            if record is None:
+                break
+        else:
+            yield record
+
+
+def select_fields(*keys: str) -> Stage:
+    """A stage that keeps only the given fields, e.g. to drop chat histories early."""
+    return lambda record: {key: record[key] for key in keys if key in record}
+
+
+class ParquetShardWriter:
+    """Write records to numbered Parquet shards of at most `rows_per_shard` rows each.
+
+    Only one shard worth of records is buffered at a time. Existing `{prefix}-*.parquet` shards in `output_dir`
+    are removed on open, so that a rerun writing fewer shards leaves none of the old ones behind. The shards can be
+    loaded memory-mapped with `load_shards` (or `datasets.Dataset.from_parquet`).
+    """
+
+    def __init__(self, output_dir: Union[str, Path], prefix: str = "shard", rows_per_shard: int = 10_000):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("Please install the pyarrow package with 'pip install pyarrow'")
+
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        for stale_shard in self.output_dir.glob(f"{prefix}-*.parquet"):
+            stale_shard.unlink()
+        self.prefix = prefix
+        self.rows_per_shard = rows_per_shard
+        self.shards: List[Path] = []
+        self.num_rows = 0
+        self._buffer: List[Record] = []
+
+    def write(self, record: Record):
+        self._buffer.append(record)
+        if len(self._buffer) >= self.rows_per_shard:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        shard_path = self.output_dir / f"{self.prefix}-{len(self.shards):05d}.parquet"
+        pq.write_table(pa.Table.from_pylist(self._buffer), shard_path)
+        self.shards.append(shard_path)
+        self.num_rows += len(self._buffer)
+        self._buffer = []
+
+    def close(self) -> List[Path]:
+        self.flush()
+        return self.shards
+
+    def __enter__(self) -> "ParquetShardWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_shards(
+    records: Iterable[Record], output_dir: Union[str, Path], prefix: str = "shard", rows_per_shard: int = 10_000
+) -> List[Path]:
+    with ParquetShardWriter(output_dir, prefix=prefix, rows_per_shard=rows_per_shard) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.shards
+
+
+def shard_files(output_dir: Union[str, Path], prefix: str = "shard") -> List[str]:
+    return [str(path) for path in sorted(Path(output_dir).glob(f"{prefix}-*.parquet"))]
+
+
+def load_shards(output_dir: Union[str, Path], prefix: str = "shard"):
+    """Load the shards as a `datasets.Dataset`, backed by a memory-mapped Arrow cache."""
+    try:
+        from datasets import Dataset
+    except ImportError:
+        raise ImportError("Please install the datasets package with 'pip install datasets'")
+
+    return Dataset.from_parquet(shard_files(output_dir, prefix))
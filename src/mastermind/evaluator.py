@@ -1,16 +1,23 @@
+import asyncio
 import json
 import random
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from contextlib import nullcontext
 from enum import Enum, auto
-from itertools import product
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 from tqdm import tqdm
 
+from mastermind.async_models import AsyncLanguageModel
+from mastermind.base import ChatHistory, LanguageModel
 from mastermind.game import Mastermind
-from mastermind.models import ChatHistory, LanguageModel
+from mastermind.metrics import MetricsAggregator, current_turn, record, record_turn, timed
+from mastermind.progress import ProgressTracker
+from mastermind.response_cache import request_identity
+from mastermind.results import ResultWriter, compact_result, load_results
 from mastermind.solvers import Solver
 from mastermind.utils import COLOR_MAP, RESET, make_output_file_paths, parse_guess
 
@@ -25,20 +32,64 @@ RED = COLOR_MAP["red"]
 YELLOW = COLOR_MAP["yellow"]
 
 
+# Summary fields that have to match for a resumed run to continue the same experiment.
+_RESUME_CONFIG = ("code_length", "num_colors", "possible_colors", "max_guesses")
+
+
+def summary_path(results_file: Path) -> Path:
+    results_file = Path(results_file)
+    return results_file.with_name(f"{results_file.stem}_summary.json")
+
+
+def load_run_summary(results_file: Path) -> Optional[Dict]:
+    """The summary written next to a results file, or None if the run did not get to write one."""
+    path = summary_path(results_file)
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
 class GameState(Enum):
     ONGOING = auto()
     WON = auto()
     LOST = auto()
 
 
+class GameSession:
+    """Mutable state of a single game while it is being played."""
+
+    def __init__(
+        self,
+        num_game: int,
+        game: Mastermind,
+        chat_history: ChatHistory,
+        tracker: Optional[ProgressTracker] = None,
+        model: Union[LanguageModel, AsyncLanguageModel, Solver, None] = None,
+    ):
+        self.num_game = num_game
+        self.game = game
+        self.model = model
+        self.chat_history = chat_history
+        self.guess_history: GuessHistory = []
+        self.turn_history: List[Dict] = []
+        self.state = GameState.ONGOING
+        self.attempts = 0
+        self.tracker = tracker
+        self.metrics: Dict[str, float] = {}
+        self.started = time.perf_counter()
+
+
 class Evaluator:
     def __init__(
         self,
         game: Mastermind,
-        model: Union[LanguageModel, Solver],
+        model: Union[LanguageModel, AsyncLanguageModel, Solver],
         use_cot: bool = False,
         use_fewshot_example: bool = False,
         compute_progress: bool = False,
+        seed: Optional[int] = None,
+        prompt_caching: bool = False,
     ):
         self.game = game
         self.model = model
@@ -47,14 +98,19 @@ class Evaluator:
         self.use_cot = use_cot
         self.use_fewshot_example = use_fewshot_example
         self.compute_progress = compute_progress
+        self.seed = seed
+        # keep the instruction byte-identical across the games of a configuration, so that it can be cached
+        self.prompt_caching = prompt_caching
+        self.metrics_summary: Optional[Dict] = None
+        self.scheduler_stats: Optional[Dict] = None
 
-    def _init_chat_history(self) -> ChatHistory:
+    def _init_chat_history(self, rng: Optional[random.Random] = None) -> ChatHistory:
         return [
             {"role": "system", "content": "You are a player in a Mastermind game. Your role is to guess the secret code. You must always respond with a guess."},
-            {"role": "user", "content": f"{self._init_instruction()}\n\n{self._first_guess_template()}"},
+            {"role": "user", "content": f"{self._init_instruction(rng)}\n\n{self._first_guess_template()}"},
         ]
 
-    def _init_instruction(self) -> str:
+    def _init_instruction(self, rng: Optional[random.Random] = None) -> str:
         task_instruction = (
             f"You are playing Mastermind as the guesser. A secret color code has been chosen and your goal is to figure it out through a series of guesses.\n\n"
             f"Game rules:\n"
@@ -71,12 +127,15 @@ class Evaluator:
             f"  FINAL GUESS: ['color1', 'color2', ...]\n"
             f"- Only use colors from the allowed list above.\n"
             f"- Use the feedback from previous guesses to narrow down the secret code.\n"
-            f"{self._example_template()}"
+            f"{self._example_template(rng)}"
         )
         return task_instruction
 
-    def _example_template(self) -> str:
-        sample_guess = random.sample(self.game.possible_colors, k=self.game.code_length)
+    def _example_template(self, rng: Optional[random.Random] = None) -> str:
+        if self.prompt_caching:
+            # the same example guess for every game with this palette, instead of a fresh one per game
+            rng = random.Random(",".join(self.game.possible_colors))
+        sample_guess = (rng or random).sample(self.game.possible_colors, k=self.game.code_length)
         if self.use_fewshot_example:
             example = (
                 "\n### Example game (Secret Code: ['white', 'green', 'red', 'brown']):\n"
@@ -110,67 +169,231 @@ class Evaluator:
             return "Analyze the feedback so far step-by-step (at most ~400 words), then give your next guess."
         return "What is your next guess? Keep your reasoning to at most ~400 words."
 
-    def _run_single_game(self, num_game: int, run_timestamp: Optional[str], compute_progress: bool = False) -> GameResult:
-        game = self.game.clone()
-        chat_history: ChatHistory = self._init_chat_history()
-        guess_history: GuessHistory = []
-        turn_history = []
-        state = GameState.ONGOING
-        attempts = 0
+    def _game_rng(self, num_game: int) -> Optional[random.Random]:
+        """Per-game random state derived from the evaluator seed, so a game is identical in a resumed run."""
+        if self.seed is None:
+            return None
+        return random.Random(f"{self.seed}:{num_game}")
+
+    def _new_session(
+        self, num_game: int, compute_progress: bool = False, queued_at: Optional[float] = None
+    ) -> "GameSession":
+        rng = self._game_rng(num_game)
+        game = self.game.clone(rng)
+        tracker = ProgressTracker(game) if compute_progress else None
+        chat_history = self._init_chat_history(rng)
+        # solvers keep per-game state and need the secret of this game's clone, so every game gets its own
+        model = self.model.for_game(game, rng) if isinstance(self.model, Solver) else self.model
+        session = GameSession(num_game, game, chat_history, tracker, model)
+        if queued_at is not None:
+            session.metrics["queue_wait"] = session.started - queued_at
+        return session
+
+    def _request_identity(self, session: "GameSession"):
+        """Identify the model request of a turn for response caches; only seeded runs are reproducible."""
+        if self.seed is None:
+            return nullcontext()
+        return request_identity(self.seed, session.num_game, session.attempts)
+
+    def _apply_turn(self, session: "GameSession") -> GameState:
+        """Score the model's latest reply, record the turn and either finish the game or ask for the next guess."""
+        game = session.game
+        start = time.perf_counter()
+        guess = parse_guess(session.chat_history[-1])
+        parsed = time.perf_counter()
+        exact_matches, partial_matches, hint = game.evaluate(guess)
+        session.guess_history.append((guess, (exact_matches, partial_matches)))
+        if session.tracker is not None:
+            session.tracker.update(guess, exact_matches, partial_matches)
+        scored = time.perf_counter()
+        turn = {
+            "attempt": session.attempts + 1,
+            "guess": guess,
+            "exact_matches": exact_matches,
+            "partial_matches": partial_matches,
+            "feedback": hint,
+            "assistant_message": session.chat_history[-1]["content"],
+        }
+        metrics = current_turn()
+        if metrics is not None:
+            turn["metrics"] = metrics
+        session.turn_history.append(turn)
+
+        session.attempts += 1
+        if exact_matches == game.code_length:
+            session.state = GameState.WON
+        elif session.attempts >= game.max_guesses:
+            session.state = GameState.LOST
+        else:
+            session.chat_history.append({"role": "user", "content": f"Feedback: {hint}\n{self._guess_template()}"})
+        record(parse_time=parsed - start, scoring_time=scored - parsed, prompt_time=time.perf_counter() - scored)
+        return session.state
+
+    def _session_result(self, session: "GameSession", run_timestamp: Optional[str]) -> GameResult:
+        tracker = session.tracker
+        session.metrics["wall_time"] = time.perf_counter() - session.started
+        return {
+            "run_timestamp": run_timestamp,
+            "game_index": session.num_game,
+            "chat_history": session.chat_history,
+            "turn_history": session.turn_history,
+            "guess_history": session.guess_history,
+            "progress_history": tracker.history[: session.attempts] if tracker is not None else [],
+            "valid": True if not session.attempts == 1 else False,
+            "solved": False if session.state == GameState.LOST else True,
+            "num_guesses": session.attempts,
+            "game": session.game.to_json(),
+            "model": self.model.get_model_info(),
+            "metrics": session.metrics,
+        }
+
+    def _run_single_game(
+        self,
+        num_game: int,
+        run_timestamp: Optional[str],
+        compute_progress: bool = False,
+        queued_at: Optional[float] = None,
+        show_progress: bool = True,
+    ) -> GameResult:
+        session = self._new_session(num_game, compute_progress=compute_progress, queued_at=queued_at)
 
         total_guesses_bar = tqdm(
-            total=game.max_guesses, desc=f"{YELLOW}[Game #{num_game}]{RESET} Attempts", unit="attempt"
+            total=session.game.max_guesses,
+            desc=f"{YELLOW}[Game #{num_game}]{RESET} Attempts",
+            unit="attempt",
+            disable=not show_progress,
         )
 
-        while state == GameState.ONGOING:
-            chat_history = self.model(chat_history)
-            guess = parse_guess(chat_history[-1])
-            exact_matches, partial_matches, hint = game.evaluate(guess)
-            guess_history.append((guess, (exact_matches, partial_matches)))
-            turn_history.append(
-                {
-                    "attempt": attempts + 1,
-                    "guess": guess,
-                    "exact_matches": exact_matches,
-                    "partial_matches": partial_matches,
-                    "feedback": hint,
-                    "assistant_message": chat_history[-1]["content"],
-                }
-            )
-
-            attempts += 1
+        while session.state == GameState.ONGOING:
+            with record_turn():
+                with timed("model_time"), self._request_identity(session):
+                    session.chat_history = session.model(session.chat_history)
+                state = self._apply_turn(session)
             total_guesses_bar.update(1)
 
-            if exact_matches == game.code_length:
+            if state == GameState.WON:
                 total_guesses_bar.desc = f"{GREEN}[Game #{num_game}] Game Solved{RESET}"
                 total_guesses_bar.refresh()
-                state = GameState.WON
                 total_guesses_bar.close()
-            elif attempts >= game.max_guesses:
+            elif state == GameState.LOST:
                 total_guesses_bar.desc = f"{RED}[Game #{num_game}] Game Over{RESET}"
                 total_guesses_bar.refresh()
-                state = GameState.LOST
                 total_guesses_bar.close()
-            else:
-                chat_history.append({"role": "user", "content": f"Feedback: {hint}\n{self._guess_template()}"})
 
-        progress_history = []
+        return self._session_result(session, run_timestamp)
+
+    async def _arun_single_game(
+        self,
+        num_game: int,
+        run_timestamp: Optional[str],
+        compute_progress: bool = False,
+        queued_at: Optional[float] = None,
+    ) -> GameResult:
+        session = await self._anew_session(num_game, compute_progress=compute_progress, queued_at=queued_at)
+        while session.state == GameState.ONGOING:
+            with record_turn():
+                await self._aplay_turn(session)
+        return self._session_result(session, run_timestamp)
+
+    async def _anew_session(
+        self, num_game: int, compute_progress: bool = False, queued_at: Optional[float] = None
+    ) -> "GameSession":
+        # setting up a progress tracker can load (or build) a feedback table, which must not block the event loop
         if compute_progress:
-            progress_history = self.progress(guess_history, game)
+            return await asyncio.to_thread(self._new_session, num_game, compute_progress, queued_at)
+        return self._new_session(num_game, compute_progress, queued_at)
 
-        return {
+    async def _aplay_turn(self, session: "GameSession") -> GameState:
+        with timed("model_time"), self._request_identity(session):
+            if isinstance(session.model, AsyncLanguageModel):
+                session.chat_history = await session.model(session.chat_history)
+            else:
+                session.chat_history = await asyncio.to_thread(session.model, session.chat_history)
+        # progress tracking filters the consistent codes with NumPy; the turn metrics travel with the copied context
+        if session.tracker is not None:
+            return await asyncio.to_thread(self._apply_turn, session)
+        return self._apply_turn(session)
+
+    def _result_writer(
+        self, num_games: int, save_path: Optional[Path] = None, resume_from: Optional[Path] = None, completed=()
+    ) -> ResultWriter:
+        if resume_from is not None:
+            results_file = Path(resume_from)
+            summary_file = summary_path(results_file)
+        else:
+            results_file, summary_file = make_output_file_paths(save_path, prefix="full_game")
+        run_timestamp = results_file.stem.removeprefix("full_game_")
+        summary = {
             "run_timestamp": run_timestamp,
-            "game_index": num_game,
-            "chat_history": chat_history,
-            "turn_history": turn_history,
-            "guess_history": guess_history,
-            "progress_history": progress_history,
-            "valid": True if not attempts == 1 else False,
-            "solved": False if state == GameState.LOST else True,
-            "num_guesses": attempts,
-            "game": game.to_json(),
             "model": self.model.get_model_info(),
+            "game_type": "full_game",
+            "code_length": self.game.code_length,
+            "num_colors": len(self.game.possible_colors),
+            "possible_colors": self.game.possible_colors,
+            "max_guesses": self.game.max_guesses,
+            "num_games_requested": num_games,
+            "num_games_completed": len(completed),
+            "games_solved": sum(r["solved"] for r in completed),
+            "seed": self.seed,
+            "save_results": True,
+            "results_file": str(results_file),
+        }
+        return ResultWriter(results_file, summary_file, summary)
+
+    def _start_run(
+        self,
+        num_games: int,
+        save_results: bool,
+        save_path: Optional[Path],
+        resume_from: Optional[Path],
+        keep_results: bool,
+    ) -> Tuple[Optional[ResultWriter], List[GameResult], List[int]]:
+        """Set up result saving and work out which games still have to be played.
+
+        When resuming, the games already recorded in `resume_from` are loaded and skipped, and new results are
+        appended to the same file.
+        """
+        completed = []
+        writer = None
+        if resume_from is not None:
+            self._check_resume(resume_from)
+            completed = load_results(resume_from, transform=None if keep_results else compact_result)
+            writer = self._result_writer(num_games, resume_from=resume_from, completed=completed)
+        elif save_results:
+            writer = self._result_writer(num_games, save_path=save_path)
+        recorded = {r["game_index"] for r in completed}
+        return writer, completed, [i for i in range(num_games) if i not in recorded]
+
+    def _check_resume(self, resume_from: Path):
+        """Make sure that resuming `resume_from` continues the same experiment.
+
+        Without a seed of its own the evaluator adopts the recorded one. Raises a ValueError if no seed is known or
+        if the seed or the game configuration differ from the recorded run.
+        """
+        summary = load_run_summary(resume_from) or {}
+        if self.seed is None:
+            self.seed = summary.get("seed")
+        if self.seed is None:
+            raise ValueError(f"Cannot resume {resume_from} without a seed: the remaining games would be different ones.")
+        if summary.get("seed", self.seed) != self.seed:
+            raise ValueError(f"Seed {self.seed} differs from the seed {summary['seed']} of the run in {resume_from}.")
+        current = {
+            "code_length": self.game.code_length,
+            "num_colors": len(self.game.possible_colors),
+            "possible_colors": self.game.possible_colors,
+            "max_guesses": self.game.max_guesses,
         }
+        for key in _RESUME_CONFIG:
+            if key in summary and summary[key] != current[key]:
+                raise ValueError(f"{key} {current[key]} differs from {summary[key]} of the run in {resume_from}.")
+
+    def _finish_run(self, writer: Optional[ResultWriter], metrics: MetricsAggregator):
+        """Close the result writer and export the metrics summary of the games played in this run."""
+        self.metrics_summary = metrics.summary()
+        if writer is not None:
+            writer.close()
+            writer.summary["metrics"] = self.metrics_summary
+            writer.write_summary()
 
     def run(
         self,
@@ -179,64 +402,197 @@ class Evaluator:
         save_results: bool = False,
         save_path: Optional[Path] = None,
         compute_progress: bool = False,
+        keep_results: bool = True,
+        resume_from: Optional[Path] = None,
+        use_processes: bool = False,
     ) -> List[GameResult]:
+        """Play `num_games` games on `num_parallel` threads, or worker processes with `use_processes=True`.
+
+        Threads suit models that wait on a server or a GPU. CPU-bound models such as `KnuthSolver` are serialized by
+        the GIL instead and should use processes: every worker receives a copy of the evaluator once and plays whole
+        games, whose results are streamed back to this process. The model must be picklable.
 
-        results = []
+        With `keep_results=False` only a compact record per game (index, solved, valid, number of guesses) is kept
+        in memory; full results are then only available in the results file. With `resume_from`, games already
+        recorded in that results file are skipped and new results are appended to it. The seed is taken over from
+        the recorded run if the evaluator has none; a different seed or game configuration raises a ValueError.
+        """
+        if use_processes and isinstance(self.model, AsyncLanguageModel):
+            raise ValueError("Async models cannot be run in worker processes, use `arun` instead.")
+        writer, results, pending_games = self._start_run(num_games, save_results, save_path, resume_from, keep_results)
         results_lock = threading.Lock()
-        results_file = None
-        summary_file = None
-        run_timestamp = None
-        if save_results:
-            results_file, summary_file = make_output_file_paths(save_path, prefix="full_game")
-            run_timestamp = results_file.stem.removeprefix("full_game_")
+        run_timestamp = writer.summary["run_timestamp"] if writer is not None else None
+        metrics = MetricsAggregator()
+
+        def collect(result: GameResult):
+            if writer is not None:
+                writer.submit(result)
+            with results_lock:
+                metrics.add(result)
+                results.append(result if keep_results else compact_result(result))
 
-        def run_and_collect(num_game: int):
+        def run_and_collect(num_game: int, queued_at: float):
             try:
-                result = self._run_single_game(num_game, run_timestamp, compute_progress=compute_progress)
-                with results_lock:
-                    results.append(result)
-                    if save_results:
-                        with open(results_file, "a") as f:
-                            f.write(json.dumps(result) + "\n")
-                        with open(summary_file, "w") as f:
-                            json.dump(
-                                {
-                                    "run_timestamp": run_timestamp,
-                                    "model": self.model.get_model_info(),
-                                    "game_type": "full_game",
-                                    "code_length": self.game.code_length,
-                                    "num_colors": len(self.game.possible_colors),
-                                    "num_games_requested": num_games,
-                                    "num_games_completed": len(results),
-                                    "games_solved": sum(r["solved"] for r in results),
-                                    "save_results": True,
-                                    "results_file": str(results_file),
-                                },
-                                f,
-                            )
+                collect(
+                    self._run_single_game(
+                        num_game, run_timestamp, compute_progress=compute_progress, queued_at=queued_at
+                    )
+                )
             except Exception as e:
                 print(f"Error in game #{num_game}: {e}")
 
-        with ThreadPoolExecutor(max_workers=num_parallel) as executor:
-            futures = [executor.submit(run_and_collect, i) for i in range(num_games)]
-            for future in as_completed(futures):
-                future.result()
+        try:
+            if use_processes:
+                self._run_in_processes(pending_games, num_parallel, run_timestamp, compute_progress, collect)
+            else:
+                with ThreadPoolExecutor(max_workers=num_parallel) as executor:
+                    futures = [executor.submit(run_and_collect, i, time.perf_counter()) for i in pending_games]
+                    for future in as_completed(futures):
+                        future.result()
+        finally:
+            self._finish_run(writer, metrics)
+
+        results.sort(key=lambda r: r["game_index"])
+        return results
+
+    def _run_in_processes(
+        self,
+        pending_games: List[int],
+        num_workers: int,
+        run_timestamp: Optional[str],
+        compute_progress: bool,
+        collect: Callable[[GameResult], None],
+    ):
+        """Play `pending_games` in a process pool and pass every result to `collect` as soon as it arrives.
+
+        Only a few games per worker are submitted ahead, so the parent never holds more than a handful of
+        pending results.
+        """
+        max_in_flight = 4 * num_workers
+        games_bar = tqdm(total=len(pending_games), desc="Games", unit="game")
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker, initargs=(self,)) as executor:
+            in_flight: Dict = {}
+
+            def collect_finished():
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    num_game = in_flight.pop(future)
+                    try:
+                        collect(future.result())
+                    except Exception as e:
+                        print(f"Error in game #{num_game}: {e}")
+                    games_bar.update(1)
+
+            for num_game in pending_games:
+                if len(in_flight) >= max_in_flight:
+                    collect_finished()
+                future = executor.submit(_play_game, num_game, run_timestamp, compute_progress, time.time())
+                in_flight[future] = num_game
+            while in_flight:
+                collect_finished()
+        games_bar.close()
+
+    async def arun(
+        self,
+        num_games: int = 1,
+        max_concurrency: int = 64,
+        save_results: bool = False,
+        save_path: Optional[Path] = None,
+        compute_progress: bool = False,
+        keep_results: bool = True,
+        resume_from: Optional[Path] = None,
+    ) -> List[GameResult]:
+        """Play all games in the running event loop, with at most `max_concurrency` games in flight.
+
+        Intended for `AsyncLanguageModel` backends; synchronous models are called in worker threads, as are
+        progress tracking and the collection of finished games. Saving and resuming work as in `run`.
+        """
+        writer, results, pending_games = self._start_run(num_games, save_results, save_path, resume_from, keep_results)
+        run_timestamp = writer.summary["run_timestamp"] if writer is not None else None
+
+        pending = asyncio.Queue()
+        for num_game in pending_games:
+            pending.put_nowait(num_game)
+        games_bar = tqdm(total=num_games, initial=num_games - len(pending_games), desc="Games", unit="game")
+        metrics = MetricsAggregator()
+        results_lock = threading.Lock()
+        queued_at = time.perf_counter()
+
+        def collect(result: GameResult):
+            if writer is not None:
+                writer.submit(result)
+            with results_lock:
+                metrics.add(result)
+                results.append(result if keep_results else compact_result(result))
+
+        async def worker():
+            while not pending.empty():
+                num_game = pending.get_nowait()
+                try:
+                    result = await self._arun_single_game(
+                        num_game, run_timestamp, compute_progress=compute_progress, queued_at=queued_at
+                    )
+                    # writing may block on a full queue and summarizing walks the whole result
+                    await asyncio.to_thread(collect, result)
+                except Exception as e:
+                    print(f"Error in game #{num_game}: {e}")
+                games_bar.update(1)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(1, min(max_concurrency, len(pending_games))))))
+        finally:
+            games_bar.close()
+            self._finish_run(writer, metrics)
+
+        results.sort(key=lambda r: r["game_index"])
+        return results
+
+    async def arun_continuous(
+        self,
+        num_games: int = 1,
+        target_in_flight: int = 64,
+        save_results: bool = False,
+        save_path: Optional[Path] = None,
+        compute_progress: bool = False,
+        keep_results: bool = True,
+        resume_from: Optional[Path] = None,
+    ) -> List[GameResult]:
+        """Play all games through a `ContinuousBatchScheduler` that keeps `target_in_flight` requests running.
+
+        Meant for servers that batch concurrent requests, such as vLLM. The scheduler's utilization report is kept
+        in `scheduler_stats` and written to the run summary. Saving and resuming work as in `run`.
+        """
+        from mastermind.scheduler import ContinuousBatchScheduler
+
+        writer, results, pending_games = self._start_run(num_games, save_results, save_path, resume_from, keep_results)
+        run_timestamp = writer.summary["run_timestamp"] if writer is not None else None
+        metrics = MetricsAggregator()
+
+        # called by the scheduler in a worker thread, one finished game at a time
+        def collect(result: GameResult):
+            if writer is not None:
+                writer.submit(result)
+            metrics.add(result)
+            results.append(result if keep_results else compact_result(result))
+
+        scheduler = ContinuousBatchScheduler(self, target_in_flight=target_in_flight)
+        try:
+            await scheduler.run(pending_games, run_timestamp, compute_progress, collect)
+        finally:
+            self.scheduler_stats = scheduler.report()
+            if writer is not None:
+                writer.summary["scheduler"] = self.scheduler_stats
+            self._finish_run(writer, metrics)
 
         results.sort(key=lambda r: r["game_index"])
         return results
 
     def progress(self, guess_history: GuessHistory, game: Optional["Mastermind"] = None) -> ProgressHistory:
-        g = game or self.game
-        all_codes = list(product(g.possible_colors, repeat=g.code_length))
-        progress_history = [len(all_codes)]
-        for i in range(1, len(guess_history)):
-            guesses = guess_history[:i]
-            remaining_states = [
-                possible_code for possible_code in all_codes
-                if all(g.evaluate_guess(guess, possible_code) == feedback for guess, feedback in guesses)
-            ]
-            progress_history.append(len(remaining_states))
-        return progress_history
+        tracker = ProgressTracker(game or self.game)
+        # the count after the final guess is not part of the progress history
+        for guess, (exact_matches, partial_matches) in guess_history[:-1]:
+            tracker.update(guess, exact_matches, partial_matches)
+        return tracker.history[: max(1, len(guess_history))]
 
     def reset(self):
         self.game.reset()
@@ -244,3 +600,22 @@ class Evaluator:
         self.attempts = 0
         if isinstance(self.model, Solver):
             self.model.reset()
+
+
+# Evaluator copy of a worker process, set up once per process by `_init_worker`.
+_worker_evaluator: Optional[Evaluator] = None
+
+
+def _init_worker(evaluator: Evaluator):
+    global _worker_evaluator
+    # forked workers inherit the parent's random state; unseeded runs would otherwise repeat secrets across workers
+    random.seed()
+    _worker_evaluator = evaluator
+
+
+def _play_game(num_game: int, run_timestamp: Optional[str], compute_progress: bool, submitted_at: float) -> GameResult:
+    # `perf_counter` values are not comparable between processes, so the submission time travels as wall clock time
+    queued_at = time.perf_counter() - (time.time() - submitted_at)
+    return _worker_evaluator._run_single_game(
+        num_game, run_timestamp, compute_progress=compute_progress, queued_at=queued_at, show_progress=False
+    )
@@ -0,0 +1,124 @@
+from typing import Dict, Hashable, Sequence, Tuple
+
+import numpy as np
+
+# Sentinel for colors that are not part of the palette (e.g. hallucinated colors in a model guess).
+UNKNOWN_COLOR = 255
+
+# Upper bound for the number of elements of an intermediate (guesses x codes x pegs) array in `score_matrix`.
+_MAX_CHUNK_ELEMENTS = 1 << 24
+
+
+def score(guess: Sequence[Hashable], code: Sequence[Hashable]) -> Tuple[int, int]:
+    """Scalar fast path: (exact, partial) for a single guess, works on color strings and integer codes alike."""
+    exact_matches = sum(g == c for g, c in zip(guess, code))
+    counts: Dict[Hashable, int] = {}
+    for color in code:
+        counts[color] = counts.get(color, 0) + 1
+    total_matches = 0
+    for color in guess:
+        if counts.get(color, 0) > 0:
+            counts[color] -= 1
+            total_matches += 1
+    return exact_matches, total_matches - exact_matches
+
+
+def color_index(possible_colors: Sequence[str]) -> Dict[str, int]:
+    return {color: i for i, color in enumerate(possible_colors)}
+
+
+def encode_code(code: Sequence[str], possible_colors: Sequence[str]) -> np.ndarray:
+    """Encode a list of color names as palette indices. Colors outside the palette map to `UNKNOWN_COLOR`."""
+    index = color_index(possible_colors)
+    return np.array([index.get(color, UNKNOWN_COLOR) for color in code], dtype=np.uint8)
+
+
+def decode_code(code: Sequence[int], possible_colors: Sequence[str]) -> list:
+    return [possible_colors[int(i)] for i in code]
+
+
+def all_codes(code_length: int, num_colors: int) -> np.ndarray:
+    """All codes as a (num_colors ** code_length, code_length) array, in the order of `itertools.product`."""
+    num_codes = num_colors**code_length
+    digits = np.unravel_index(np.arange(num_codes), (num_colors,) * code_length)
+    return np.stack(digits, axis=1).astype(np.uint8)
+
+
+def num_scores(code_length: int) -> int:
+    return (code_length + 1) ** 2
+
+
+def pack_scores(exact: np.ndarray, partial: np.ndarray, code_length: int) -> np.ndarray:
+    """Pack (exact, partial) pairs into a single byte each (valid for code lengths up to 14)."""
+    return (np.asarray(exact) * (code_length + 1) + np.asarray(partial)).astype(np.uint8)
+
+
+def pack_score(exact: int, partial: int, code_length: int) -> int:
+    return exact * (code_length + 1) + partial
+
+
+def unpack_score(packed: int, code_length: int) -> Tuple[int, int]:
+    exact, partial = divmod(int(packed), code_length + 1)
+    return exact, partial
+
+
+def score_batch(guess: np.ndarray, codes: np.ndarray, num_colors: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Score one encoded guess against a batch of encoded codes of shape (N, code_length).
+
+    The guess may contain `UNKNOWN_COLOR` entries or differ in length from the codes; the result then matches
+    `score` on the decoded colors.
+    """
+    guess = np.asarray(guess)
+    codes = np.asarray(codes)
+    overlap = min(len(guess), codes.shape[1])
+    exact = (codes[:, :overlap] == guess[:overlap]).sum(axis=1)
+
+    guess_counts = np.bincount(guess[guess < num_colors], minlength=num_colors)
+    total = np.zeros(len(codes), dtype=np.int64)
+    for color in np.flatnonzero(guess_counts):
+        total += np.minimum((codes == color).sum(axis=1), guess_counts[color])
+    return exact, total - exact
+
+
+def color_counts(codes: np.ndarray, num_colors: int) -> np.ndarray:
+    """Per-color histogram of each code, shape (N, num_colors)."""
+    codes = np.asarray(codes)
+    counts = np.zeros((len(codes), num_colors), dtype=np.uint8)
+    for color in range(num_colors):
+        counts[:, color] = (codes == color).sum(axis=1)
+    return counts
+
+
+def score_matrix(guesses: np.ndarray, codes: np.ndarray, num_colors: int) -> np.ndarray:
+    """Packed scores of every guess against every code, shape (G, N), dtype uint8. Inputs must be valid codes."""
+    guesses = np.asarray(guesses)
+    codes = np.asarray(codes)
+    code_length = codes.shape[1]
+    guess_counts = color_counts(guesses, num_colors)
+    code_counts = color_counts(codes, num_colors)
+
+    result = np.empty((len(guesses), len(codes)), dtype=np.uint8)
+    chunk = max(1, _MAX_CHUNK_ELEMENTS // max(1, len(codes) * max(code_length, num_colors)))
+    for start in range(0, len(guesses), chunk):
+        stop = start + chunk
+        exact = (guesses[start:stop, None, :] == codes[None, :, :]).sum(axis=2)
+        total = np.minimum(guess_counts[start:stop, None, :], code_counts[None, :, :]).sum(axis=2)
+        result[start:stop] = pack_scores(exact, total - exact, code_length)
+    return result
+
+
+def rank_codes(codes: np.ndarray, num_colors: int) -> np.ndarray:
+    """Index of each encoded code in the `itertools.product` order of the full code space."""
+    codes = np.asarray(codes, dtype=np.int64)
+    weights = num_colors ** np.arange(codes.shape[-1] - 1, -1, -1, dtype=np.int64)
+    return codes @ weights
+
+
+def is_valid_code(code: np.ndarray, code_length: int, num_colors: int) -> bool:
+    return len(code) == code_length and bool(np.all(np.asarray(code) < num_colors))
+
+
+def unrank_codes(indices: np.ndarray, code_length: int, num_colors: int) -> np.ndarray:
+    """Inverse of `rank_codes`: the encoded codes for the given code space indices, shape (N, code_length)."""
+    digits = np.unravel_index(np.asarray(indices), (num_colors,) * code_length)
+    return np.stack(digits, axis=-1).astype(np.uint8)
@@ -0,0 +1,134 @@
+import os
+import tempfile
+import threading
+from argparse import ArgumentParser
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+from mastermind import feedback
+from mastermind.code_space import CodeSpace
+
+# Tables above this many entries (64 MiB, i.e. up to 5 pegs x 6 colors) are not built unless the limit is raised with
+# `MASTERMIND_MAX_TABLE_ENTRIES`; callers fall back to batch scoring.
+MAX_TABLE_ENTRIES = 1 << 26
+
+# Number of guess rows scored per chunk while building a table.
+_BUILD_CHUNK_ROWS = 256
+
+# Serializes the check-and-build of missing tables (and the cache lookup) between the threads of a process.
+_load_lock = threading.Lock()
+
+
+def default_cache_dir() -> Path:
+    return Path(os.getenv("MASTERMIND_CACHE_DIR", Path.home() / ".cache" / "mastermind"))
+
+
+def table_path(code_length: int, num_colors: int, cache_dir: Optional[Union[str, Path]] = None) -> Path:
+    cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir()
+    return cache_dir / f"feedback_{code_length}x{num_colors}.npy"
+
+
+def max_table_entries() -> int:
+    return int(os.getenv("MASTERMIND_MAX_TABLE_ENTRIES", MAX_TABLE_ENTRIES))
+
+
+def table_fits(code_length: int, num_colors: int) -> bool:
+    return (num_colors**code_length) ** 2 <= max_table_entries()
+
+
+class FeedbackTable:
+    """Packed (exact, partial) score of every guess against every secret of a `(code_length, num_colors)` space.
+
+    Codes are addressed by their index in `itertools.product` order (see `feedback.rank_codes`), so the table is
+    independent of the concrete color names of a game.
+    """
+
+    def __init__(self, code_length: int, num_colors: int, table: np.ndarray):
+        self.code_length = code_length
+        self.num_colors = num_colors
+        self.table = table
+
+    @property
+    def num_codes(self) -> int:
+        return self.table.shape[0]
+
+    def rank(self, code: np.ndarray) -> Optional[int]:
+        """Index of an encoded code, or None if it is not part of the code space (e.g. an invalid model guess)."""
+        if not feedback.is_valid_code(code, self.code_length, self.num_colors):
+            return None
+        return int(feedback.rank_codes(code, self.num_colors))
+
+    def scores(self, guess_index: int, candidates: Optional[np.ndarray] = None) -> np.ndarray:
+        row = self.table[guess_index]
+        return row if candidates is None else row[candidates]
+
+    def filter(self, candidates: np.ndarray, guess_index: int, exact_matches: int, partial_matches: int) -> np.ndarray:
+        """Keep the candidate indices that would have produced the observed feedback for `guess_index`."""
+        packed = feedback.pack_score(exact_matches, partial_matches, self.code_length)
+        return candidates[self.scores(guess_index, candidates) == packed]
+
+
+def build_feedback_table(code_length: int, num_colors: int, path: Path) -> Path:
+    """Compute the full score matrix and write it as a `.npy` file. The file appears atomically at `path`."""
+    space = CodeSpace(code_length, num_colors)
+    # every row is scored against all codes, so the (small) code array is unranked once
+    codes = space.unrank(space.indices())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f"{path.stem}.", suffix=".tmp.npy")
+    os.close(fd)
+    try:
+        table = np.lib.format.open_memmap(tmp_name, mode="w+", dtype=np.uint8, shape=(space.size, space.size))
+        for start, stop in space.ranges(_BUILD_CHUNK_ROWS):
+            table[start:stop] = feedback.score_matrix(codes[start:stop], codes, num_colors)
+        table.flush()
+        del table
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    return path
+
+
+@lru_cache(maxsize=None)
+def _load_feedback_table(code_length: int, num_colors: int, path: Path) -> FeedbackTable:
+    if not path.exists():
+        build_feedback_table(code_length, num_colors, path)
+    return FeedbackTable(code_length, num_colors, np.load(path, mmap_mode="r"))
+
+
+def get_feedback_table(
+    code_length: int, num_colors: int, cache_dir: Optional[Union[str, Path]] = None
+) -> Optional[FeedbackTable]:
+    """Return the memory-mapped table for a configuration, building it on first use.
+
+    Returns None if the configuration is too large for a full table (see `MAX_TABLE_ENTRIES`). Tables are shared between processes through
+    the cache directory (`MASTERMIND_CACHE_DIR`, default `~/.cache/mastermind`) and loaded once per process.
+    """
+    if not table_fits(code_length, num_colors):
+        return None
+    with _load_lock:
+        return _load_feedback_table(code_length, num_colors, table_path(code_length, num_colors, cache_dir))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Precompute feedback tables, e.g. before launching evaluation workers.")
+    parser.add_argument("--code_length", type=int, nargs="+", default=[4], help="Code length(s) of the game.")
+    parser.add_argument("--num_colors", type=int, nargs="+", default=[6], help="Number of colors in the game.")
+    parser.add_argument("--cache_dir", type=str, default=None, help="Directory to store the tables in.")
+    parser.add_argument(
+        "--max_entries", type=int, default=None, help="Build tables up to this many entries (bytes), e.g. 1073741824 for 5x8."
+    )
+    args = parser.parse_args()
+    if args.max_entries is not None:
+        os.environ["MASTERMIND_MAX_TABLE_ENTRIES"] = str(args.max_entries)
+
+    for code_length in args.code_length:
+        for num_colors in args.num_colors:
+            table = get_feedback_table(code_length, num_colors, args.cache_dir)
+            if table is None:
+                print(f"Skipping {code_length}x{num_colors}: the table would exceed {max_table_entries()} entries.")
+            else:
+                print(f"Feedback table for {code_length}x{num_colors}: {table_path(code_length, num_colors, args.cache_dir)}")
@@ -1,5 +1,7 @@
 import random
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+
+from mastermind.feedback import score
 
 COLORS = [
     "red",
@@ -32,13 +34,11 @@ class Mastermind:
         self.possible_colors: List[str] = random.sample(COLORS, k=num_colors)
         self.secret_code = self._generate_secret_code()
 
-    def _generate_secret_code(self) -> List[str]:
-        return random.sample(self.possible_colors, k=self.code_length)
+    def _generate_secret_code(self, rng: Optional[random.Random] = None) -> List[str]:
+        return (rng or random).sample(self.possible_colors, k=self.code_length)
 
     def evaluate_guess(self, guess: List[str], code: List[str]) -> Tuple[int, int]:
-        exact_matches = sum(s == g for s, g in zip(code, guess))
-        partial_matches = sum(min(code.count(color), guess.count(color)) for color in set(code)) - exact_matches
-        return exact_matches, partial_matches
+        return score(guess, code)
 
     def evaluate(self, guess: List[str]) -> Tuple[ExactMatches, PartialMatches, Hint]:
         exact_matches, partial_matches = self.evaluate_guess(guess, self.secret_code)
@@ -48,14 +48,17 @@ class Mastermind:
             f"Correct color and position: {exact_matches}. Correct color but wrong position: {partial_matches}.",
         )
 
-    def clone(self) -> "Mastermind":
-        """Create an independent copy with the same color set but a freshly generated secret code."""
+    def clone(self, rng: Optional[random.Random] = None) -> "Mastermind":
+        """Create an independent copy with the same color set but a freshly generated secret code.
+
+        Pass a seeded `rng` to make the secret code reproducible.
+        """
         new_game = Mastermind.__new__(Mastermind)
         new_game.code_length = self.code_length
         new_game.num_colors = self.num_colors
         new_game.max_guesses = self.max_guesses
         new_game.possible_colors = list(self.possible_colors)
-        new_game.secret_code = new_game._generate_secret_code()
+        new_game.secret_code = new_game._generate_secret_code(rng)
         return new_game
 
     def reset(self):
@@ -0,0 +1,267 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from transformers import (
+    AutoModelForCausalLM,
+    AutoTokenizer,
+    BitsAndBytesConfig,
+    Cache,
+    StoppingCriteria,
+    StoppingCriteriaList,
+)
+
+from mastermind.base import ChatHistory, GenerationArgs, LanguageModel
+from mastermind.metrics import record
+from mastermind.utils import final_guess_end
+
+# A new game's prompt is only stored as a shared prefix if no stored prefix covers at least this fraction of it.
+_MIN_SHARED_PREFIX = 0.5
+
+
+class FinalGuessStoppingCriteria(StoppingCriteria):
+    """Stops every row of a `generate` call once its new text contains a complete `FINAL GUESS: [...]` line.
+
+    Rows are only decoded when their last token contains a closing bracket. `time_to_first_token` is the time until
+    the criteria are first checked, i.e. after the prefill and the first decoding step.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.time_to_first_token: Optional[float] = None
+        self._start = time.perf_counter()
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self._start
+        done = torch.zeros(len(input_ids), dtype=torch.bool, device=input_ids.device)
+        for row, last_token in enumerate(self.tokenizer.batch_decode(input_ids[:, -1:])):
+            if "]" in last_token:
+                text = self.tokenizer.decode(input_ids[row, self.prompt_length :], skip_special_tokens=True)
+                done[row] = final_guess_end(text) is not None
+        return done
+
+
+class HFModel(LanguageModel):
+    def __init__(
+        self,
+        model_name: str,
+        device: str = "cuda",
+        generation_args: Optional[GenerationArgs] = None,
+        enable_thinking: Optional[bool] = None,
+        load_in_8bit: bool = False,
+        use_prefix_cache: bool = False,
+        max_cached_games: int = 64,
+        stop_at_final_guess: bool = False,
+        **kwargs,
+    ):
+        self.model_name = model_name
+        self.stop_at_final_guess = stop_at_final_guess
+        self.enable_thinking = enable_thinking
+        # past-key-values of running games (keyed by chat history) and of the first prompts of earlier games
+        self.use_prefix_cache = use_prefix_cache
+        self.max_cached_games = max_cached_games
+        self._game_caches: "OrderedDict[int, Tuple[torch.Tensor, Cache]]" = OrderedDict()
+        self._prefix_caches: List[Tuple[torch.Tensor, Cache]] = []
+        self._cache_lock = threading.Lock()
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
+        if self.tokenizer.pad_token_id is None and self.tokenizer.eos_token_id is not None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        # decoder-only generation needs left padding when several chats are batched
+        self.tokenizer.padding_side = "left"
+
+        if load_in_8bit:
+            kwargs["quantization_config"] = BitsAndBytesConfig(load_in_8bit=True)
+            kwargs.setdefault("device_map", "auto")
+        elif "torch_dtype" not in kwargs and device.startswith("cuda") and torch.cuda.is_available():
+            kwargs["torch_dtype"] = torch.bfloat16
+
+        self.model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True, **kwargs)
+        if "device_map" not in kwargs:
+            self.model = self.model.to(device)
+        self.model.eval()
+        self.generation_args = generation_args or GenerationArgs().hf_format()
+
+    def __call__(self, chat_history: ChatHistory, **kwargs) -> ChatHistory:
+        model_inputs = self._prepare_inputs(chat_history)
+        generation_args = self._generation_args(**kwargs)
+        input_ids = model_inputs["input_ids"][0]
+
+        past_key_values = self._reusable_cache(chat_history, input_ids) if self.use_prefix_cache else None
+        if past_key_values is not None:
+            generation_args["past_key_values"] = past_key_values
+            record(cached_tokens=past_key_values.get_seq_length())
+        stopping = self._stopping_criteria(model_inputs, generation_args)
+
+        with torch.inference_mode():
+            outputs = self.model.generate(
+                **model_inputs, **generation_args, return_dict_in_generate=self.use_prefix_cache
+            )
+
+        if self.use_prefix_cache:
+            self._store_cache(chat_history, input_ids, outputs.sequences[0], outputs.past_key_values)
+            outputs = outputs.sequences
+
+        input_length = model_inputs["input_ids"].shape[-1]
+        generated_tokens = outputs[0][input_length:]
+        generated_text = self._cut_after_final_guess(
+            self.tokenizer.decode(generated_tokens, skip_special_tokens=True).strip()
+        )
+        record(prompt_tokens=input_length, completion_tokens=len(generated_tokens))
+        if stopping is not None:
+            record(time_to_first_token=stopping.time_to_first_token)
+        chat_history.append({"role": "assistant", "content": generated_text})
+        return chat_history
+
+    def generate_batch(self, chat_histories: List[ChatHistory], **kwargs) -> List[str]:
+        """Generate one reply per chat history with a single left-padded `generate` call.
+
+        The (prompt, completion) token counts of every row are left in `last_batch_usage`.
+        """
+        if self._uses_chat_template():
+            rendered = [
+                self.tokenizer.apply_chat_template(
+                    chat_history, tokenize=False, add_generation_prompt=True, **self._template_kwargs()
+                )
+                for chat_history in chat_histories
+            ]
+            model_inputs = self.tokenizer(rendered, return_tensors="pt", padding=True, add_special_tokens=False)
+        else:
+            rendered = [self._render_chat_history(chat_history) for chat_history in chat_histories]
+            model_inputs = self.tokenizer(rendered, return_tensors="pt", padding=True)
+        model_inputs = {key: value.to(self.model.device) for key, value in model_inputs.items()}
+
+        generation_args = self._generation_args(**kwargs)
+        self._stopping_criteria(model_inputs, generation_args)
+        with torch.inference_mode():
+            outputs = self.model.generate(**model_inputs, **generation_args)
+
+        input_length = model_inputs["input_ids"].shape[-1]
+        generated = outputs[:, input_length:]
+        # padding (and the end-of-sequence token, which doubles as padding) is not counted as completion tokens
+        completion_tokens = (generated != generation_args.get("pad_token_id", -1)).sum(dim=1)
+        self.last_batch_usage = list(zip(model_inputs["attention_mask"].sum(dim=1).tolist(), completion_tokens.tolist()))
+        generated_texts = self.tokenizer.batch_decode(generated, skip_special_tokens=True)
+        return [self._cut_after_final_guess(text.strip()) for text in generated_texts]
+
+    def _stopping_criteria(self, model_inputs: Dict, generation_args: Dict) -> Optional[FinalGuessStoppingCriteria]:
+        """Add a `FinalGuessStoppingCriteria` to `generation_args` if `stop_at_final_guess` is set."""
+        if not self.stop_at_final_guess:
+            return None
+        stopping = FinalGuessStoppingCriteria(self.tokenizer, model_inputs["input_ids"].shape[-1])
+        generation_args["stopping_criteria"] = StoppingCriteriaList(
+            [*generation_args.get("stopping_criteria", []), stopping]
+        )
+        return stopping
+
+    def _cut_after_final_guess(self, text: str) -> str:
+        # the token that closed the guess may carry more text, and rows of a batch keep going until all are done
+        end = final_guess_end(text) if self.stop_at_final_guess else None
+        if end is None:
+            return text
+        record(stopped_early=True)
+        return text[:end]
+
+    def _reusable_cache(self, chat_history: ChatHistory, input_ids: torch.Tensor) -> Optional[Cache]:
+        """Past-key-values covering the longest already encoded prefix of `input_ids`, cropped to that prefix.
+
+        Looks first for the cache of this game's previous turn, then for the stored prompt of an earlier game that
+        shares the longest token prefix, e.g. the instruction up to a per-game example guess.
+        """
+        with self._cache_lock:
+            entry = self._game_caches.pop(id(chat_history), None)
+            if entry is None:
+                shared = self._longest_shared_prefix(input_ids)
+                entry = (shared[0], copy.deepcopy(shared[1])) if shared is not None else None
+        if entry is None:
+            return None
+
+        cached_ids, cache = entry
+        # at least one token has to be left for the forward pass that produces the first new token
+        reusable = min(_common_prefix_length(cached_ids, input_ids), len(input_ids) - 1, cache.get_seq_length())
+        if reusable <= 0:
+            return None
+        _crop_cache(cache, reusable)
+        return cache
+
+    def _store_cache(self, chat_history: ChatHistory, input_ids: torch.Tensor, sequence: torch.Tensor, cache: Cache):
+        with self._cache_lock:
+            # prompts that mostly match a stored one (later turns, or games that only differ in details) add nothing
+            shared = self._longest_shared_prefix(input_ids)
+            if shared is None or _common_prefix_length(shared[0], input_ids) < _MIN_SHARED_PREFIX * len(input_ids):
+                prefix_cache = copy.deepcopy(cache)
+                _crop_cache(prefix_cache, len(input_ids))
+                self._prefix_caches.append((input_ids, prefix_cache))
+                if len(self._prefix_caches) > self.max_cached_games:
+                    self._prefix_caches.pop(0)
+            self._game_caches[id(chat_history)] = (sequence[: cache.get_seq_length()], cache)
+            if len(self._game_caches) > self.max_cached_games:
+                self._game_caches.popitem(last=False)
+
+    def _longest_shared_prefix(self, input_ids: torch.Tensor) -> Optional[Tuple[torch.Tensor, Cache]]:
+        """The stored prompt sharing the longest token prefix with `input_ids`, if any shares one. Needs the lock."""
+        lengths = [_common_prefix_length(cached_ids, input_ids) for cached_ids, _ in self._prefix_caches]
+        if not lengths or max(lengths) == 0:
+            return None
+        return self._prefix_caches[lengths.index(max(lengths))]
+
+    def _generation_args(self, **kwargs) -> Dict:
+        generation_args = {**self.generation_args, **kwargs}
+        if "do_sample" not in generation_args and "temperature" in generation_args:
+            generation_args["do_sample"] = generation_args["temperature"] > 0
+        if self.tokenizer.eos_token_id is not None:
+            generation_args.setdefault("pad_token_id", self.tokenizer.eos_token_id)
+        return generation_args
+
+    def _uses_chat_template(self) -> bool:
+        return hasattr(self.tokenizer, "apply_chat_template") and bool(self.tokenizer.chat_template)
+
+    def _template_kwargs(self) -> Dict:
+        template_kwargs = {}
+        if self.enable_thinking is not None:
+            template_kwargs["enable_thinking"] = self.enable_thinking
+        return template_kwargs
+
+    def _prepare_inputs(self, chat_history: ChatHistory) -> Dict[str, torch.Tensor]:
+        if self._uses_chat_template():
+            model_inputs = self.tokenizer.apply_chat_template(
+                chat_history,
+                tokenize=True,
+                add_generation_prompt=True,
+                return_dict=True,
+                return_tensors="pt",
+                **self._template_kwargs(),
+            )
+        else:
+            rendered_history = self._render_chat_history(chat_history)
+            model_inputs = self.tokenizer(rendered_history, return_tensors="pt")
+
+        return {key: value.to(self.model.device) for key, value in model_inputs.items()}
+
+    def _render_chat_history(self, chat_history: ChatHistory) -> str:
+        rendered_turns = []
+        for turn in chat_history:
+            role = turn["role"].capitalize()
+            rendered_turns.append(f"{role}: {turn['content']}")
+        rendered_turns.append("Assistant:")
+        return "\n".join(rendered_turns)
+
+    def get_model_info(self) -> str:
+        return f"HF Model: {self.model_name}"
+
+
+def _common_prefix_length(a: torch.Tensor, b: torch.Tensor) -> int:
+    length = min(len(a), len(b))
+    mismatches = torch.nonzero(a[:length].to(b.device) != b[:length])
+    return int(mismatches[0]) if len(mismatches) else length
+
+
+def _crop_cache(cache: Cache, length: int):
+    # negative values drop tokens from the end, which works across transformers versions
+    excess = cache.get_seq_length() - length
+    if excess > 0:
+        cache.crop(-excess)
@@ -0,0 +1,162 @@
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+# Metrics of the turn being played in the current thread or task. Models report into it via `record`.
+_current_turn: ContextVar[Optional[Dict]] = ContextVar("mastermind_turn_metrics", default=None)
+
+PERCENTILES = (50, 90, 99)
+
+
+def current_turn() -> Optional[Dict]:
+    return _current_turn.get()
+
+
+def record(**values):
+    """Add values to the metrics of the current turn; a no-op outside of `record_turn`. None values are skipped."""
+    turn = _current_turn.get()
+    if turn is not None:
+        turn.update({key: value for key, value in values.items() if value is not None})
+
+
+def record_usage(usage, prompt_field: str = "prompt_tokens", completion_field: str = "completion_tokens"):
+    """Record the token counts of an API response's `usage` object, if the backend returned one.
+
+    Prompt-cache hits are recorded as `cached_tokens` (OpenAI-compatible `prompt_tokens_details.cached_tokens` or
+    Anthropic's `cache_read_input_tokens`) and Anthropic cache writes as `cache_write_tokens`. Anthropic does not
+    count either in `input_tokens`, so they are added to `prompt_tokens` to make it the full prompt length.
+    """
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, prompt_field, None)
+    cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+    cache_write_tokens = None
+    if hasattr(usage, "cache_read_input_tokens"):
+        cached_tokens = usage.cache_read_input_tokens or 0
+        cache_write_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+        if prompt_tokens is not None:
+            prompt_tokens += cached_tokens + cache_write_tokens
+    record(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=getattr(usage, completion_field, None),
+        cached_tokens=cached_tokens,
+        cache_write_tokens=cache_write_tokens,
+    )
+
+
+@contextmanager
+def record_turn() -> Iterator[Dict]:
+    """Collect the metrics of one turn; `wall_time` is added when the block exits."""
+    metrics: Dict = {}
+    token = _current_turn.set(metrics)
+    start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        metrics["wall_time"] = time.perf_counter() - start
+        _current_turn.reset(token)
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(**{name: time.perf_counter() - start})
+
+
+class Histogram:
+    """Count, sum, extremes and log-spaced buckets of a stream of non-negative values, in bounded memory.
+
+    Bucket `i` holds the values in `[(1 + precision) ** i, (1 + precision) ** (i + 1))`, so percentiles are exact up
+    to the relative `precision`; zero (and negative) values share one extra bucket. The number of buckets only
+    depends on the range of the values, not on how many were added.
+    """
+
+    def __init__(self, precision: float = 0.01):
+        self.log_base = math.log1p(precision)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.zeros = 0
+        self.buckets: Dict[int, int] = {}
+
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value > 0:
+            bucket = math.floor(math.log(value) / self.log_base)
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        else:
+            self.zeros += 1
+
+    def percentile(self, q: float) -> float:
+        rank = q / 100 * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return min(self.min, 0.0)
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if rank < seen:
+                # the geometric middle of the bucket, which is never off by more than half the precision
+                return min(max(math.exp((bucket + 0.5) * self.log_base), self.min), self.max)
+        return self.max
+
+    def describe(self) -> Dict[str, float]:
+        summary = {"count": self.count, "mean": self.sum / self.count, "max": self.max}
+        summary.update({f"p{q}": self.percentile(q) for q in PERCENTILES})
+        return summary
+
+
+class MetricsAggregator:
+    """Collects turn and game metrics of finished games and summarizes them with percentiles.
+
+    Values go into a `Histogram` per metric, so memory does not grow with the number of games or turns.
+    """
+
+    def __init__(self):
+        self.turn_values: Dict[str, Histogram] = {}
+        self.game_values: Dict[str, Histogram] = {}
+
+    def add(self, result: Dict):
+        for turn in result.get("turn_history", []):
+            self._add_values(self.turn_values, turn.get("metrics", {}))
+        self._add_values(self.game_values, result.get("metrics", {}))
+
+    @staticmethod
+    def _add_values(values: Dict[str, Histogram], metrics: Dict):
+        for key, value in metrics.items():
+            if isinstance(value, (int, float)):
+                if key not in values:
+                    values[key] = Histogram()
+                values[key].add(float(value))
+
+    def summary(self) -> Dict:
+        # turns cut off after the final guess only have an estimate of their completion tokens (and, for
+        # OpenAI-compatible backends, no prompt tokens), which is kept apart from the reported counts
+        totals = {
+            key: self.turn_values[key].sum
+            for key in (
+                "prompt_tokens",
+                "completion_tokens",
+                "estimated_completion_tokens",
+                "cached_tokens",
+                "cache_write_tokens",
+            )
+            if key in self.turn_values
+        }
+        if "stopped_early" in self.turn_values:
+            totals["stopped_early_turns"] = self.turn_values["stopped_early"].sum
+        if totals.get("prompt_tokens") and "cached_tokens" in totals:
+            totals["cache_hit_rate"] = totals["cached_tokens"] / totals["prompt_tokens"]
+        return {
+            "turn": {key: values.describe() for key, values in sorted(self.turn_values.items())},
+            "game": {key: values.describe() for key, values in sorted(self.game_values.items())},
+            "totals": totals,
+        }
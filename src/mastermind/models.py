@@ -1,138 +1,159 @@
 import os
-from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+
+from mastermind.base import ChatHistory, GenerationArgs, LanguageModel
+from mastermind.metrics import current_turn, record_usage
+from mastermind.streaming import stream_chat_completion, stream_message
+from mastermind.transport import Transport
+
+if TYPE_CHECKING:
+    from mastermind.hf_models import HFModel
+
+ANTHROPIC_SYSTEM_PROMPT = (
+    "You are the codebreaker in a game of Mastermind. Find out the secret code based on the instructions given by the user."
+)
+_CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def __getattr__(name: str):
+    # torch and transformers are only imported once the HF backend is actually used
+    if name == "HFModel":
+        from mastermind.hf_models import HFModel
+
+        return HFModel
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class HFBatchScheduler:
+    """Collects pending turns from concurrent games and runs them through `HFModel.generate_batch` together.
+
+    A batch is dispatched once `batch_size` requests are queued or the oldest request has waited `max_wait_time`
+    seconds. Each caller blocks on a future that receives its own decoded reply. `batch_size_counts[n]` counts the
+    dispatched batches of `n` requests.
+    """
+
+    def __init__(self, model: "HFModel", batch_size: int = 8, max_wait_time: float = 0.05):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_wait_time = max_wait_time
+        self.requests: "queue.Queue[Tuple[ChatHistory, Future, Optional[Dict], float]]" = queue.Queue()
+        self.batch_size_counts: List[int] = [0] * (batch_size + 1)
+        self._worker = threading.Thread(target=self._loop, name="hf-batch-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, chat_history: ChatHistory) -> Future:
+        # the caller's turn metrics travel with the request, since the batch runs on the scheduler thread
+        future = Future()
+        self.requests.put((chat_history, future, current_turn(), time.perf_counter()))
+        return future
+
+    def _collect_batch(self) -> List[Tuple[ChatHistory, Future, Optional[Dict], float]]:
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait_time
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect_batch()
+            self.batch_size_counts[len(batch)] += 1
+            start = time.perf_counter()
+            try:
+                replies = self.model.generate_batch([chat_history for chat_history, *_ in batch])
+            except Exception as e:
+                for _, future, *_ in batch:
+                    future.set_exception(e)
+                continue
+            generate_time = time.perf_counter() - start
+            usage = getattr(self.model, "last_batch_usage", None) or [(None, None)] * len(batch)
+            for (_, future, metrics, submitted), reply, (prompt_tokens, completion_tokens) in zip(batch, replies, usage):
+                if metrics is not None:
+                    metrics.update(queue_wait=start - submitted, generate_time=generate_time, batch_size=len(batch))
+                    if prompt_tokens is not None:
+                        metrics.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+                future.set_result(reply)
+
+    @property
+    def num_batches(self) -> int:
+        return sum(self.batch_size_counts)
+
+    @property
+    def mean_batch_size(self) -> float:
+        num_batches = self.num_batches
+        return sum(size * count for size, count in enumerate(self.batch_size_counts)) / num_batches if num_batches else 0.0
+
+
+class BatchedHFModel(LanguageModel):
+    """`LanguageModel` front end that routes every turn through a shared `HFBatchScheduler`.
+
+    Use it with `Evaluator.run(num_parallel=...)` of at least `batch_size` so that enough games wait concurrently.
+    """
+
+    def __init__(self, model: "HFModel", batch_size: int = 8, max_wait_time: float = 0.05):
+        self.model = model
+        self.scheduler = HFBatchScheduler(model, batch_size=batch_size, max_wait_time=max_wait_time)
 
-import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
-
-ChatHistory = List[Dict[str, str]]
-
-
-@dataclass
-class GenerationArgs:
-    max_tokens: int = 2048
-    temperature: float = 0.9
-
-    def __getitem__(self, key):
-        return getattr(self, key)
-
-    def keys(self):
-        return self.__annotations__.keys()
-
-    def hf_format(self):
-        return {self._to_hf_format(k): v for k, v in self.__dict__.items() if v is not None}
-
-    def _to_hf_format(self, arg):
-        if arg == "max_tokens":
-            return "max_new_tokens"
-        return arg
-
-
-class LanguageModel(ABC):
-    @abstractmethod
     def __call__(self, chat_history: ChatHistory) -> ChatHistory:
-        pass
+        generated_text = self.scheduler.submit(chat_history).result()
+        chat_history.append({"role": "assistant", "content": generated_text})
+        return chat_history
 
-    @abstractmethod
     def get_model_info(self) -> str:
-        pass
+        return self.model.get_model_info()
 
 
-class HFModel(LanguageModel):
+class OpenAIModel(LanguageModel):
     def __init__(
         self,
-        model_name: str,
-        device: str = "cuda",
+        model_name: str = "gpt-4-turbo-preview",
         generation_args: Optional[GenerationArgs] = None,
-        enable_thinking: Optional[bool] = None,
-        load_in_8bit: bool = False,
-        **kwargs,
+        transport: Optional[Transport] = None,
+        stop_at_final_guess: bool = False,
     ):
-        self.model_name = model_name
-        self.enable_thinking = enable_thinking
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        if self.tokenizer.pad_token_id is None and self.tokenizer.eos_token_id is not None:
-            self.tokenizer.pad_token = self.tokenizer.eos_token
-
-        if load_in_8bit:
-            kwargs["quantization_config"] = BitsAndBytesConfig(load_in_8bit=True)
-            kwargs.setdefault("device_map", "auto")
-        elif "torch_dtype" not in kwargs and device.startswith("cuda") and torch.cuda.is_available():
-            kwargs["torch_dtype"] = torch.bfloat16
-
-        self.model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True, **kwargs)
-        if "device_map" not in kwargs:
-            self.model = self.model.to(device)
-        self.model.eval()
-        self.generation_args = generation_args or GenerationArgs().hf_format()
-
-    def __call__(self, chat_history: ChatHistory, **kwargs) -> ChatHistory:
-        model_inputs = self._prepare_inputs(chat_history)
-        generation_args = {**self.generation_args, **kwargs}
-        if "do_sample" not in generation_args and "temperature" in generation_args:
-            generation_args["do_sample"] = generation_args["temperature"] > 0
-        if self.tokenizer.eos_token_id is not None:
-            generation_args.setdefault("pad_token_id", self.tokenizer.eos_token_id)
-
-        with torch.inference_mode():
-            outputs = self.model.generate(**model_inputs, **generation_args)
-
-        input_length = model_inputs["input_ids"].shape[-1]
-        generated_tokens = outputs[0][input_length:]
-        generated_text = self.tokenizer.decode(generated_tokens, skip_special_tokens=True).strip()
-        chat_history.append({"role": "assistant", "content": generated_text})
-        return chat_history
-
-    def _prepare_inputs(self, chat_history: ChatHistory) -> Dict[str, torch.Tensor]:
-        if hasattr(self.tokenizer, "apply_chat_template") and self.tokenizer.chat_template:
-            template_kwargs = {}
-            if self.enable_thinking is not None:
-                template_kwargs["enable_thinking"] = self.enable_thinking
-            model_inputs = self.tokenizer.apply_chat_template(
-                chat_history,
-                tokenize=True,
-                add_generation_prompt=True,
-                return_dict=True,
-                return_tensors="pt",
-                **template_kwargs,
-            )
-        else:
-            rendered_history = self._render_chat_history(chat_history)
-            model_inputs = self.tokenizer(rendered_history, return_tensors="pt")
-
-        return {key: value.to(self.model.device) for key, value in model_inputs.items()}
-
-    def _render_chat_history(self, chat_history: ChatHistory) -> str:
-        rendered_turns = []
-        for turn in chat_history:
-            role = turn["role"].capitalize()
-            rendered_turns.append(f"{role}: {turn['content']}")
-        rendered_turns.append("Assistant:")
-        return "\n".join(rendered_turns)
-
-    def get_model_info(self) -> str:
-        return f"HF Model: {self.model_name}"
+        """Initialize OpenAI model with API key from environment variables.
 
-
-class OpenAIModel(LanguageModel):
-    def __init__(self, model_name: str = "gpt-4-turbo-preview", generation_args: Optional[GenerationArgs] = None):
-        """Initialize OpenAI model with API key from environment variables."""
+        With `stop_at_final_guess`, replies are streamed and cut off once their `FINAL GUESS: [...]` line is complete.
+        """
         try:
-            from openai import OpenAI
+            from openai import DefaultHttpxClient, OpenAI
         except ImportError:
             raise ImportError("Please install the openai package with 'pip install openai'")
 
         self.model_name = model_name
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.stop_at_final_guess = stop_at_final_guess
+        self.transport = transport or Transport()
+        self.client = OpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_retries=0,
+            http_client=self.transport.http_client(DefaultHttpxClient),
+        )
 
     def __call__(self, chat_history: ChatHistory) -> ChatHistory:
-        response = self.client.chat.completions.create(
-            model=self.model_name,
-            messages=chat_history,
-        )
+        if self.stop_at_final_guess:
+            content, usage = self.transport.call(
+                stream_chat_completion, self.client, model=self.model_name, messages=chat_history
+            )
+        else:
+            response = self.transport.call(
+                self.client.chat.completions.create,
+                model=self.model_name,
+                messages=chat_history,
+            )
+            content, usage = response.choices[0].message.content, response.usage
 
-        chat_history.append({"content": response.choices[0].message.content, "role": "assistant"})
+        record_usage(usage)
+        chat_history.append({"content": content, "role": "assistant"})
 
         return chat_history
 
@@ -148,18 +169,24 @@ class VLLMModel(LanguageModel):
         base_url: Optional[str] = None,
         api_key: Optional[str] = None,
         enable_thinking: Optional[bool] = None,
+        transport: Optional[Transport] = None,
+        stop_at_final_guess: bool = False,
     ):
         try:
-            from openai import OpenAI
+            from openai import DefaultHttpxClient, OpenAI
         except ImportError:
             raise ImportError("Please install the openai package with 'pip install openai'")
 
         self.model_name = model_name
+        self.stop_at_final_guess = stop_at_final_guess
         self.enable_thinking = enable_thinking
         self.base_url = base_url or os.getenv("VLLM_BASE_URL", "http://127.0.0.1:8000/v1")
+        self.transport = transport or Transport()
         self.client = OpenAI(
             api_key=api_key or os.getenv("VLLM_API_KEY", "EMPTY"),
             base_url=self.base_url,
+            max_retries=0,
+            http_client=self.transport.http_client(DefaultHttpxClient),
         )
         self.generation_args = generation_args or GenerationArgs()
 
@@ -168,47 +195,95 @@ class VLLMModel(LanguageModel):
         if self.enable_thinking is not None:
             extra_body["chat_template_kwargs"] = {"enable_thinking": self.enable_thinking}
 
-        response = self.client.chat.completions.create(
+        request = dict(
             model=self.model_name,
             messages=chat_history,
             max_tokens=self.generation_args.max_tokens,
             temperature=self.generation_args.temperature,
             **({"extra_body": extra_body} if extra_body else {}),
         )
+        if self.stop_at_final_guess:
+            # closing the stream aborts the request on the server, freeing its slot in the batch
+            content, usage = self.transport.call(stream_chat_completion, self.client, **request)
+        else:
+            response = self.transport.call(self.client.chat.completions.create, **request)
+            content, usage = response.choices[0].message.content, response.usage
 
-        chat_history.append({"content": response.choices[0].message.content, "role": "assistant"})
+        record_usage(usage)
+        chat_history.append({"content": content, "role": "assistant"})
         return chat_history
 
     def get_model_info(self) -> str:
         return f"vLLM Model: {self.model_name} @ {self.base_url}"
 
 
+def anthropic_request(chat_history: ChatHistory, prompt_caching: bool = False) -> Tuple[Union[str, List[Dict]], List[Dict]]:
+    """Split a chat history into the `system` and `messages` arguments of the Anthropic API.
+
+    System messages are moved into `system`, falling back to `ANTHROPIC_SYSTEM_PROMPT`. With `prompt_caching`,
+    cache breakpoints are set on the system prompt, on the first user message (the game instruction, identical for
+    all games of a configuration with `Evaluator(prompt_caching=True)`) and on the latest message, so that every
+    turn reads the conversation up to the previous turn from the cache.
+    """
+    system = "\n\n".join(turn["content"] for turn in chat_history if turn["role"] == "system") or ANTHROPIC_SYSTEM_PROMPT
+    messages = [{"role": turn["role"], "content": turn["content"]} for turn in chat_history if turn["role"] != "system"]
+    if not prompt_caching:
+        return system, messages
+
+    for index in sorted({0, len(messages) - 1}):
+        if 0 <= index < len(messages):
+            text = messages[index]["content"]
+            messages[index]["content"] = [{"type": "text", "text": text, "cache_control": _CACHE_CONTROL}]
+    return [{"type": "text", "text": system, "cache_control": _CACHE_CONTROL}], messages
+
+
 class AnthropicModel(LanguageModel):
-    def __init__(self, model_name: str = "claude-3-opus-20240229", generation_args: Optional[GenerationArgs] = None):
-        """Initialize Anthropic model with API key from environment variables."""
+    def __init__(
+        self,
+        model_name: str = "claude-3-opus-20240229",
+        generation_args: Optional[GenerationArgs] = None,
+        transport: Optional[Transport] = None,
+        stop_at_final_guess: bool = False,
+        prompt_caching: bool = False,
+    ):
+        """Initialize Anthropic model with API key from environment variables.
+
+        With `prompt_caching`, requests carry cache breakpoints (see `anthropic_request`).
+        """
         try:
-            from anthropic import Anthropic
+            from anthropic import Anthropic, DefaultHttpxClient
         except ImportError:
             raise ImportError("Please install the anthropic package with 'pip install anthropic'")
 
         self.model_name = model_name
-        self.client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        self.stop_at_final_guess = stop_at_final_guess
+        self.prompt_caching = prompt_caching
+        self.transport = transport or Transport()
+        self.client = Anthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"),
+            max_retries=0,
+            http_client=self.transport.http_client(DefaultHttpxClient),
+        )
         self.generation_args = generation_args or GenerationArgs()
 
     def __call__(self, chat_history: ChatHistory) -> ChatHistory:
         """Convert chat history to Anthropic format and make API call."""
-
-        # NOTE: Anthropic model requires the system message to be explicitly set,
-        # so we have to fill the first message with a user message, as empty messages are not allowed
-        response = self.client.messages.create(
+        system, messages = anthropic_request(chat_history, self.prompt_caching)
+        request = dict(
             model=self.model_name,
-            system="You are the codebreaker in a game of Mastermind. Find out the secret code based on the instructions given by the user.",
-            messages=chat_history,
+            system=system,
+            messages=messages,
             max_tokens=self.generation_args.max_tokens,
             temperature=self.generation_args.temperature,
         )
+        if self.stop_at_final_guess:
+            content, usage = self.transport.call(stream_message, self.client, **request)
+        else:
+            response = self.transport.call(self.client.messages.create, **request)
+            content, usage = response.content[0].text, response.usage
 
-        chat_history.append({"content": response.content[0].text, "role": "assistant"})
+        record_usage(usage, prompt_field="input_tokens", completion_field="output_tokens")
+        chat_history.append({"content": content, "role": "assistant"})
 
         return chat_history
 
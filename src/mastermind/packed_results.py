@@ -0,0 +1,265 @@
+"""Compact binary storage for game results.
+
+A packed results directory holds one fixed-size record per game and one row per turn as raw little-endian arrays,
+with codes stored as palette indices (one byte per peg) and feedback packed into one byte per turn:
+
+    games.bin     GAME_DTYPE record per game
+    secrets.bin   uint8 (num_games, code_length)
+    guesses.bin   uint8 (num_turns, code_length), UNKNOWN_COLOR for colors outside the palette or missing pegs
+    feedback.bin  uint8 (num_turns,), exact * (code_length + 1) + partial
+    progress.bin  int32 (num_turns,), consistent codes before each guess, -1 if progress was not computed
+    chat.jsonl    the chat history of each game, one line per game
+    meta.json     code length, palettes and run information
+
+The games.bin record of a game is written after its turns and chat history, so it commits the game: readers ignore
+records whose data did not fully reach the other files, e.g. after a crash, and a writer continuing the directory
+drops that partial data first.
+"""
+
+import json
+import os
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from mastermind.corpus import iter_jsonl
+from mastermind.feedback import UNKNOWN_COLOR, color_index, decode_code, pack_score, unpack_score
+
+FORMAT_VERSION = 1
+
+GAME_DTYPE = np.dtype(
+    [
+        ("game_index", "<i8"),
+        ("palette", "<u2"),
+        ("num_turns", "<u2"),
+        ("solved", "u1"),
+        ("valid", "u1"),
+        ("chat_offset", "<i8"),
+    ]
+)
+
+
+class PackedResultWriter:
+    """Append game results (as produced by `Evaluator`) to a packed results directory.
+
+    Writing to an existing directory continues it, so the writer can be used like the JSONL results file.
+    `meta.json` is rewritten before the first record that needs a new palette or run, so the records of an
+    interrupted writer can still be read.
+    """
+
+    # games.bin comes last, so that `flush` writes out a game's data before the record that commits it
+    FILES = ("secrets.bin", "guesses.bin", "feedback.bin", "progress.bin", "chat.jsonl", "games.bin")
+
+    def __init__(self, path: Union[str, Path], code_length: Optional[int] = None):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta_file = self.path / "meta.json"
+        if meta_file.exists():
+            with open(meta_file) as f:
+                self.meta = json.load(f)
+        else:
+            self.meta = {"format_version": FORMAT_VERSION, "code_length": code_length, "palettes": [], "runs": []}
+        self._palette_ids = {tuple(palette): i for i, palette in enumerate(self.meta["palettes"])}
+        if self.meta["code_length"] is not None and all((self.path / name).exists() for name in self.FILES):
+            for name, size in committed_sizes(self.path, self.meta["code_length"]).items():
+                os.truncate(self.path / name, size)
+        self._files = {name: open(self.path / name, "ab") for name in self.FILES}
+
+    def write(self, result: Dict):
+        game = result["game"]
+        code_length = game["code_length"]
+        meta_changed = False
+        if self.meta["code_length"] is None:
+            self.meta["code_length"] = code_length
+            meta_changed = True
+        elif self.meta["code_length"] != code_length:
+            raise ValueError(f"Cannot store code length {code_length} with code length {self.meta['code_length']}.")
+
+        palette = tuple(game["possible_colors"])
+        if palette not in self._palette_ids:
+            self._palette_ids[palette] = len(self.meta["palettes"])
+            self.meta["palettes"].append(list(palette))
+            meta_changed = True
+        run = {"run_timestamp": result.get("run_timestamp"), "model": result.get("model")}
+        if run not in self.meta["runs"]:
+            self.meta["runs"].append(run)
+            meta_changed = True
+        if meta_changed:
+            self._write_meta()
+
+        guess_history = result["guess_history"]
+        num_turns = len(guess_history)
+        progress_history = list(result.get("progress_history") or [])
+        progress = progress_history + [-1] * (num_turns - len(progress_history))
+
+        chat_file = self._files["chat.jsonl"]
+        record = np.zeros(1, dtype=GAME_DTYPE)
+        record["game_index"] = result["game_index"]
+        record["palette"] = self._palette_ids[palette]
+        record["num_turns"] = num_turns
+        record["solved"] = bool(result.get("solved"))
+        record["valid"] = bool(result.get("valid"))
+        record["chat_offset"] = chat_file.tell()
+
+        encode_codes([game["secret_code"]], palette, code_length).tofile(self._files["secrets.bin"])
+        encode_codes([guess for guess, _ in guess_history], palette, code_length).tofile(self._files["guesses.bin"])
+        feedback = [pack_score(exact, partial, code_length) for _, (exact, partial) in guess_history]
+        np.array(feedback, dtype=np.uint8).tofile(self._files["feedback.bin"])
+        np.array(progress[:num_turns], dtype="<i4").tofile(self._files["progress.bin"])
+        chat_file.write((json.dumps(result.get("chat_history", [])) + "\n").encode())
+        record.tofile(self._files["games.bin"])
+
+    def _write_meta(self):
+        tmp_file = self.path / "meta.json.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_file, self.path / "meta.json")
+
+    def flush(self):
+        """Make the records written so far readable by `PackedResults`."""
+        for f in self._files.values():
+            f.flush()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._write_meta()
+
+    def __enter__(self) -> "PackedResultWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def encode_codes(codes: List[List[str]], palette: Tuple[str, ...], code_length: int) -> np.ndarray:
+    """Palette indices of the codes, padded or cut to `code_length`, with `UNKNOWN_COLOR` for unknown colors."""
+    index = color_index(palette)
+    encoded = np.full((len(codes), code_length), UNKNOWN_COLOR, dtype=np.uint8)
+    for row, code in enumerate(codes):
+        for position, color in enumerate(code[:code_length]):
+            encoded[row, position] = index.get(color, UNKNOWN_COLOR)
+    return encoded
+
+
+def committed_sizes(path: Union[str, Path], code_length: int) -> Dict[str, int]:
+    """Size in bytes of every file of a packed results directory up to the last completely written game."""
+    path = Path(path)
+    games = _read_array(path / "games.bin", GAME_DTYPE)
+    turn_offsets = np.concatenate([[0], np.cumsum(games["num_turns"], dtype=np.int64)])
+    num_secrets = os.path.getsize(path / "secrets.bin") // code_length
+    num_turns = min(
+        os.path.getsize(path / "guesses.bin") // code_length,
+        os.path.getsize(path / "feedback.bin"),
+        os.path.getsize(path / "progress.bin") // 4,
+    )
+    num_games = min(len(games), num_secrets)
+    chat_end = 0
+    with open(path / "chat.jsonl", "rb") as f:
+        while num_games > 0:
+            if turn_offsets[num_games] <= num_turns:
+                f.seek(int(games["chat_offset"][num_games - 1]))
+                line = f.readline()
+                if line.endswith(b"\n"):
+                    chat_end = int(games["chat_offset"][num_games - 1]) + len(line)
+                    break
+            num_games -= 1
+    num_turns = int(turn_offsets[num_games])
+    return {
+        "secrets.bin": num_games * code_length,
+        "guesses.bin": num_turns * code_length,
+        "feedback.bin": num_turns,
+        "progress.bin": num_turns * 4,
+        "chat.jsonl": chat_end,
+        "games.bin": num_games * GAME_DTYPE.itemsize,
+    }
+
+
+def _read_array(file: Path, dtype, size: Optional[int] = None) -> np.ndarray:
+    """The first `size` bytes of `file` (all of it by default), cut to whole items of `dtype`."""
+    dtype = np.dtype(dtype)
+    size = os.path.getsize(file) if size is None else size
+    return np.fromfile(file, dtype=dtype, count=size // dtype.itemsize)
+
+
+class PackedResults:
+    """Packed results loaded as NumPy arrays; turn arrays are indexed through `turn_offsets`.
+
+    Only completely written games are loaded (see `committed_sizes`), so a directory can be read while, or after,
+    a writer was interrupted.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path / "meta.json") as f:
+            self.meta = json.load(f)
+        self.code_length: int = self.meta["code_length"]
+        self.palettes: List[List[str]] = self.meta["palettes"]
+
+        sizes = committed_sizes(self.path, self.code_length)
+        self.games = _read_array(self.path / "games.bin", GAME_DTYPE, sizes["games.bin"])
+        self.secrets = _read_array(self.path / "secrets.bin", np.uint8, sizes["secrets.bin"]).reshape(-1, self.code_length)
+        self.guesses = _read_array(self.path / "guesses.bin", np.uint8, sizes["guesses.bin"]).reshape(-1, self.code_length)
+        self.feedback = _read_array(self.path / "feedback.bin", np.uint8, sizes["feedback.bin"])
+        self.progress = _read_array(self.path / "progress.bin", "<i4", sizes["progress.bin"])
+        self.turn_offsets = np.concatenate([[0], np.cumsum(self.games["num_turns"], dtype=np.int64)])
+
+    def __len__(self) -> int:
+        return len(self.games)
+
+    @property
+    def exact_matches(self) -> np.ndarray:
+        return self.feedback // (self.code_length + 1)
+
+    @property
+    def partial_matches(self) -> np.ndarray:
+        return self.feedback % (self.code_length + 1)
+
+    @property
+    def turn_games(self) -> np.ndarray:
+        """Row in `games` of every turn."""
+        return np.repeat(np.arange(len(self.games)), self.games["num_turns"])
+
+    def turns(self, game: int) -> slice:
+        return slice(int(self.turn_offsets[game]), int(self.turn_offsets[game + 1]))
+
+    def chat_history(self, game: int) -> List[Dict]:
+        with open(self.path / "chat.jsonl", "rb") as f:
+            f.seek(int(self.games["chat_offset"][game]))
+            return json.loads(f.readline())
+
+    def guess_history(self, game: int) -> List:
+        """The guess history of a game with color names (unknown colors come back as None)."""
+        palette = self.palettes[self.games["palette"][game]]
+        turns = self.turns(game)
+        return [
+            ([palette[i] if i < len(palette) else None for i in guess], unpack_score(packed, self.code_length))
+            for guess, packed in zip(self.guesses[turns], self.feedback[turns])
+        ]
+
+    def secret_code(self, game: int) -> List[str]:
+        return decode_code(self.secrets[game], self.palettes[self.games["palette"][game]])
+
+
+def load_packed_results(path: Union[str, Path]) -> PackedResults:
+    return PackedResults(path)
+
+
+def convert_jsonl(results_file: Union[str, Path], output_dir: Union[str, Path]) -> Path:
+    """Convert a results JSONL file written by `Evaluator.run` into a packed results directory."""
+    with PackedResultWriter(output_dir) as writer:
+        for result in iter_jsonl(results_file):
+            writer.write(result)
+    return writer.path
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Convert a results JSONL file into the packed results format.")
+    parser.add_argument("results_file", type=str)
+    parser.add_argument("output_dir", type=str, nargs="?", default=None, help="Defaults to the results file without suffix.")
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or str(Path(args.results_file).with_suffix(""))
+    print(f"Wrote {len(load_packed_results(convert_jsonl(args.results_file, output_dir)))} games to {output_dir}.")
@@ -0,0 +1,40 @@
+from typing import List
+
+from mastermind import feedback
+from mastermind.code_space import CodeSpace
+from mastermind.feedback_table import get_feedback_table
+from mastermind.game import Mastermind
+
+
+class ProgressTracker:
+    """Narrows the set of codes consistent with a game's feedback one guess at a time.
+
+    Each `update` is a single filter pass over the surviving candidates, so tracking a whole game costs about as
+    much as one pass over the code space. `history` holds the number of consistent codes before the first guess
+    and after every update.
+    """
+
+    def __init__(self, game: Mastermind):
+        self.code_length = game.code_length
+        self.num_colors = len(game.possible_colors)
+        self.possible_colors = list(game.possible_colors)
+        self.space = CodeSpace(self.code_length, self.num_colors)
+        self.table = get_feedback_table(self.code_length, self.num_colors)
+        self.candidates = self.space.indices()
+        self.history: List[int] = [len(self.candidates)]
+
+    @property
+    def num_remaining(self) -> int:
+        return len(self.candidates)
+
+    def update(self, guess: List[str], exact_matches: int, partial_matches: int) -> int:
+        guess_code = feedback.encode_code(guess, self.possible_colors)
+        guess_index = self.table.rank(guess_code) if self.table is not None else None
+        if guess_index is not None:
+            self.candidates = self.table.filter(self.candidates, guess_index, exact_matches, partial_matches)
+        else:
+            codes = self.space.unrank(self.candidates)
+            exact, partial = feedback.score_batch(guess_code, codes, self.num_colors)
+            self.candidates = self.candidates[(exact == exact_matches) & (partial == partial_matches)]
+        self.history.append(len(self.candidates))
+        return len(self.candidates)
@@ -0,0 +1,191 @@
+import dataclasses
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Hashable, Iterator, Optional, Tuple, Union
+
+from mastermind.async_models import AsyncLanguageModel
+from mastermind.base import ChatHistory, LanguageModel
+from mastermind.metrics import record
+
+# Fraction of `max_size_bytes` that eviction frees up at once, so that a full cache does not evict on every insert.
+_EVICTION_SLACK = 0.1
+
+# Model attributes besides the generation args that change the responses, e.g. by cutting them off early.
+_MODEL_SETTINGS = ("stop_at_final_guess", "enable_thinking")
+
+# Stable identity of the request being made in the current thread or task, set by the caller via `request_identity`.
+_request_identity: ContextVar[Optional[Tuple]] = ContextVar("mastermind_request_identity", default=None)
+
+
+@contextmanager
+def request_identity(*identity: Hashable) -> Iterator[None]:
+    """Identify the model requests made inside the block for `ResponseCache`, e.g. by (run seed, game index, turn)."""
+    token = _request_identity.set(identity)
+    try:
+        yield
+    finally:
+        _request_identity.reset(token)
+
+
+def model_settings(model) -> Dict[str, Any]:
+    """The settings of `model` that change its responses and are not part of its generation args."""
+    return {name: getattr(model, name) for name in _MODEL_SETTINGS if hasattr(model, name)}
+
+
+class ResponseCache:
+    """On-disk SQLite store of model responses with least-recently-used eviction above `max_size_bytes`.
+
+    A response is keyed by the model info, the generation args, the other settings that change the response (see
+    `model_settings`) and the chat history it answers, plus the identity
+    set with `request_identity` (the evaluator uses the run seed, game index and turn). Identical prompts within a
+    run (e.g. the first turn of games with the same colors) therefore still get independent samples, and a rerun or
+    resumed run replays every game's responses regardless of the order in which requests complete. Requests without
+    an identity fall back to the number of times the same request was already made by this cache object. The cache
+    can be shared between threads.
+    """
+
+    def __init__(self, path: Union[str, Path], max_size_bytes: int = 1 << 30):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self._occurrences: Counter = Counter()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=60)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, size INTEGER, last_used REAL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.size_bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def request_key(
+        self,
+        model_info: str,
+        generation_args: Any,
+        chat_history: ChatHistory,
+        settings: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        if dataclasses.is_dataclass(generation_args):
+            generation_args = dataclasses.asdict(generation_args)
+        request = json.dumps(
+            {
+                "model": model_info,
+                "generation_args": generation_args,
+                "settings": settings or {},
+                "chat_history": chat_history,
+            },
+            sort_keys=True,
+        )
+        identity = _request_identity.get()
+        if identity is not None:
+            return hashlib.sha256(f"{json.dumps(list(identity))}:{request}".encode()).hexdigest()
+        digest = hashlib.sha256(request.encode()).digest()
+        with self._lock:
+            occurrence = self._occurrences[digest]
+            self._occurrences[digest] += 1
+        return hashlib.sha256(f"{occurrence}:{request}".encode()).hexdigest()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            row = self._connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None
+            with self._connection:
+                self._connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return True, json.loads(row[0])
+
+    def put(self, key: str, response: Any):
+        data = json.dumps(response)
+        size = len(data.encode())
+        with self._lock, self._connection:
+            previous = self._connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, data, size, time.time())
+            )
+            self.size_bytes += size - (previous[0] if previous else 0)
+            if self.size_bytes > self.max_size_bytes:
+                self._evict(self.max_size_bytes * (1 - _EVICTION_SLACK))
+
+    def _evict(self, target_size: float):
+        rows = self._connection.execute("SELECT key, size FROM responses ORDER BY last_used")
+        evicted = []
+        for key, size in rows:
+            if self.size_bytes <= target_size:
+                break
+            evicted.append((key,))
+            self.size_bytes -= size
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class CachedModel(LanguageModel):
+    """Wrap a model so that its responses are answered from (and saved to) a `ResponseCache`."""
+
+    def __init__(self, model: LanguageModel, cache: ResponseCache):
+        self.model = model
+        self.cache = cache
+
+    def __call__(self, chat_history: ChatHistory) -> ChatHistory:
+        key = self.cache.request_key(
+            self.get_model_info(), getattr(self.model, "generation_args", None), chat_history, model_settings(self.model)
+        )
+        hit, content = self.cache.get(key)
+        record(cache_hit=hit)
+        if hit:
+            chat_history.append({"role": "assistant", "content": content})
+            return chat_history
+        chat_history = self.model(chat_history)
+        self.cache.put(key, chat_history[-1]["content"])
+        return chat_history
+
+    def get_model_info(self) -> str:
+        return self.model.get_model_info()
+
+
+class AsyncCachedModel(AsyncLanguageModel):
+    """`CachedModel` for async backends; the rate limiter of the wrapped model only applies to cache misses."""
+
+    def __init__(self, model: AsyncLanguageModel, cache: ResponseCache):
+        self.model = model
+        self.cache = cache
+
+    async def __call__(self, chat_history: ChatHistory) -> ChatHistory:
+        key = self.cache.request_key(
+            self.get_model_info(), getattr(self.model, "generation_args", None), chat_history, model_settings(self.model)
+        )
+        hit, content = self.cache.get(key)
+        record(cache_hit=hit)
+        if hit:
+            chat_history.append({"role": "assistant", "content": content})
+            return chat_history
+        chat_history = await self.model(chat_history)
+        self.cache.put(key, chat_history[-1]["content"])
+        return chat_history
+
+    def get_model_info(self) -> str:
+        return self.model.get_model_info()
+
+
+def with_response_cache(model, cache_path: Optional[Union[str, Path]]):
+    """Wrap `model` in the matching cached model if `cache_path` is given."""
+    if cache_path is None:
+        return model
+    cache = ResponseCache(cache_path)
+    if isinstance(model, AsyncLanguageModel):
+        return AsyncCachedModel(model, cache)
+    return CachedModel(model, cache)
@@ -0,0 +1,125 @@
+import json
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+_STOP = object()
+
+
+class ResultWriter:
+    """Background writer that appends game results to a JSONL file and keeps a summary file up to date.
+
+    Records are buffered in a bounded queue, so producers only block if the writer falls behind by more than
+    `max_pending` records. Buffered records are written in batches of up to `flush_size` records, or after
+    `flush_interval` seconds, whichever comes first. The summary is rewritten after every batch from counters,
+    never from the full list of results.
+    """
+
+    def __init__(
+        self,
+        results_file: Path,
+        summary_file: Optional[Path] = None,
+        summary: Optional[Dict] = None,
+        flush_size: int = 64,
+        flush_interval: float = 1.0,
+        max_pending: int = 4096,
+    ):
+        self.results_file = Path(results_file)
+        self.summary_file = Path(summary_file) if summary_file is not None else None
+        self.summary = dict(summary or {})
+        self.summary.setdefault("num_games_completed", 0)
+        self.summary.setdefault("games_solved", 0)
+        self.summary.setdefault("write_time", 0.0)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._loop, name="result-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, result: Dict):
+        if self._error is not None:
+            raise RuntimeError("Result writer failed") from self._error
+        self._queue.put(result)
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self._error is not None:
+            raise RuntimeError("Result writer failed") from self._error
+
+    def __enter__(self) -> "ResultWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _loop(self):
+        stopped = False
+        try:
+            while not stopped:
+                batch: List[Dict] = []
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.flush_size:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopped = True
+                        break
+                    batch.append(item)
+                if batch:
+                    self._flush(batch)
+        except BaseException as e:
+            self._error = e
+            # keep draining so that producers blocked on a full queue are released
+            while not stopped:
+                stopped = self._queue.get() is _STOP
+
+    def _flush(self, batch: List[Dict]):
+        start = time.perf_counter()
+        with open(self.results_file, "a") as f:
+            f.write("".join(json.dumps(result) + "\n" for result in batch))
+        self.summary["num_games_completed"] += len(batch)
+        self.summary["games_solved"] += sum(bool(result.get("solved")) for result in batch)
+        self.summary["write_time"] += time.perf_counter() - start
+        self.write_summary()
+
+    def write_summary(self):
+        """Rewrite the summary file; called by the writer thread, or by the owner once the writer is closed."""
+        if self.summary_file is not None:
+            with open(self.summary_file, "w") as f:
+                json.dump(self.summary, f)
+
+
+def compact_result(result: Dict) -> Dict:
+    """The fields of a game result that are needed for summaries, without chat and turn histories."""
+    return {key: result[key] for key in ("game_index", "solved", "valid", "num_guesses") if key in result}
+
+
+def load_results(results_file: Path, transform: Optional[Callable[[Dict], Dict]] = None) -> List[Dict]:
+    """Read the records of a results JSONL file in order to resume a run.
+
+    A trailing partial line, left behind when a run died mid-write, is cut off the file so that new records can
+    be appended safely. `transform` is applied to every record as it is read (e.g. `compact_result`).
+    """
+    results_file = Path(results_file)
+    records = []
+    valid_size = 0
+    with open(results_file, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            valid_size += len(line)
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records.append(transform(record) if transform is not None else record)
+    if valid_size < results_file.stat().st_size:
+        with open(results_file, "rb+") as f:
+            f.truncate(valid_size)
+    return records
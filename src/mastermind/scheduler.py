@@ -0,0 +1,147 @@
+import asyncio
+import heapq
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from mastermind.evaluator import Evaluator, GameResult, GameSession, GameState
+from mastermind.metrics import record, record_turn
+
+
+class InFlightMonitor:
+    """Time-weighted statistics of the number of requests in flight against a target."""
+
+    def __init__(self, target: int):
+        self.target = target
+        self.in_flight = 0
+        self.requests = 0
+        self._start = self._last = time.perf_counter()
+        self._area = 0.0
+        self._time_at_target = 0.0
+
+    def _advance(self):
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._area += self.in_flight * elapsed
+        if self.in_flight >= self.target:
+            self._time_at_target += elapsed
+        self._last = now
+
+    def started(self):
+        self._advance()
+        self.in_flight += 1
+        self.requests += 1
+
+    def finished(self):
+        self._advance()
+        self.in_flight -= 1
+
+    def report(self) -> Dict[str, float]:
+        self._advance()
+        elapsed = self._last - self._start
+        mean_in_flight = self._area / elapsed if elapsed > 0 else 0.0
+        return {
+            "target_in_flight": self.target,
+            "requests": self.requests,
+            "elapsed": elapsed,
+            "requests_per_second": self.requests / elapsed if elapsed > 0 else 0.0,
+            "mean_in_flight": mean_in_flight,
+            "utilization": mean_in_flight / self.target,
+            "time_at_target": self._time_at_target / elapsed if elapsed > 0 else 0.0,
+        }
+
+
+class ContinuousBatchScheduler:
+    """Keeps `target_in_flight` model requests running across all active games of an `Evaluator`.
+
+    Every request is a single turn. As soon as a reply arrives the turn is scored and the game's next turn becomes
+    ready. Ready games with the most attempts are sent first, since they are closest to finishing and free their
+    memory on the server; a new game is only started when no started game is waiting. `report` tells how well the
+    target was kept: `utilization` is the time-weighted mean number of requests in flight divided by the target.
+    """
+
+    def __init__(self, evaluator: Evaluator, target_in_flight: int = 64):
+        self.evaluator = evaluator
+        self.target_in_flight = target_in_flight
+        self.monitor = InFlightMonitor(target_in_flight)
+
+    async def _play_turn(self, session: GameSession, ready_at: float):
+        with record_turn():
+            record(schedule_wait=time.perf_counter() - ready_at)
+            await self.evaluator._aplay_turn(session)
+
+    async def run(
+        self,
+        pending_games: List[int],
+        run_timestamp: Optional[str],
+        compute_progress: bool,
+        on_result: Callable[[GameResult], None],
+    ):
+        """Play `pending_games` and pass every finished game's result to `on_result`.
+
+        `on_result` and the progress bar run in a worker thread, one game at a time, so a blocking result writer
+        does not hold up the requests of the other games.
+        """
+        self.monitor = InFlightMonitor(self.target_in_flight)
+        games = iter(pending_games)
+        # (-attempts, game index, time the turn became ready, session)
+        ready: List[Tuple[int, int, float, GameSession]] = []
+        in_flight: Dict[asyncio.Task, GameSession] = {}
+        games_bar = tqdm(total=len(pending_games), desc="Games", unit="game")
+        # results of finished games, None for failed games and `stop` once all games are done
+        finished: asyncio.Queue = asyncio.Queue()
+        stop = object()
+
+        def collect(result: Optional[GameResult]):
+            if result is not None:
+                try:
+                    on_result(result)
+                except Exception as e:
+                    print(f"Error in game #{result['game_index']}: {e}")
+            games_bar.update(1)
+
+        async def consume():
+            while (result := await finished.get()) is not stop:
+                await asyncio.to_thread(collect, result)
+
+        consumer = asyncio.create_task(consume())
+        started = time.perf_counter()
+        try:
+            while True:
+                while len(in_flight) < self.target_in_flight:
+                    if ready:
+                        _, _, ready_at, session = heapq.heappop(ready)
+                    else:
+                        num_game = next(games, None)
+                        if num_game is None:
+                            break
+                        session = await self.evaluator._anew_session(num_game, compute_progress, queued_at=started)
+                        ready_at = time.perf_counter()
+                    in_flight[asyncio.create_task(self._play_turn(session, ready_at))] = session
+                    self.monitor.started()
+                if not in_flight:
+                    break
+
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    session = in_flight.pop(task)
+                    self.monitor.finished()
+                    try:
+                        task.result()
+                        if session.state == GameState.ONGOING:
+                            heapq.heappush(ready, (-session.attempts, session.num_game, time.perf_counter(), session))
+                            continue
+                        finished.put_nowait(self.evaluator._session_result(session, run_timestamp))
+                    except Exception as e:
+                        print(f"Error in game #{session.num_game}: {e}")
+                        finished.put_nowait(None)
+        finally:
+            for task in in_flight:
+                task.cancel()
+            finished.put_nowait(stop)
+            await consumer
+            games_bar.close()
+
+    def report(self) -> Dict[str, float]:
+        return self.monitor.report()
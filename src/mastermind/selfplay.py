@@ -0,0 +1,157 @@
+import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
+from mastermind.code_space import CodeSpace
+from mastermind.corpus import ParquetShardWriter, Record
+from mastermind.feedback import decode_code, unpack_score
+from mastermind.game import COLORS
+from mastermind.solvers import KnuthSearch
+
+_worker: Optional["SelfPlayWorker"] = None
+
+
+class SelfPlayWorker:
+    """Plays `KnuthSearch` games on code indices, without any colors, prompts or chat histories.
+
+    Knuth's algorithm is deterministic given the initial guess and the feedback so far, so the decision for every
+    visited path is memoized (up to `max_tree_nodes` paths). Once the tree is warm, a game costs a handful of
+    lookups; on a miss, the search state is replayed along the game's own path before computing the next guess.
+    """
+
+    def __init__(self, code_length: int, num_colors: int, max_tree_nodes: int = 1_000_000):
+        self.code_length = code_length
+        self.num_colors = num_colors
+        self.search = KnuthSearch(code_length, num_colors)
+        self.max_tree_nodes = max_tree_nodes
+        self._tree: Dict[Tuple[int, ...], Tuple[int, int]] = {}
+
+    def feedback(self, guess: int, secret: int) -> int:
+        if self.search.table is not None:
+            return int(self.search.table.table[guess, secret])
+        return int(self.search.scores(np.array([guess]), np.array([secret]))[0, 0])
+
+    def play(self, secret: int, initial_guess: int, max_guesses: int) -> Tuple[List[int], List[int], List[int]]:
+        """Guesses (code indices), packed feedback per guess, and the number of consistent codes before each guess."""
+        self.search.reset()
+        observed = 0
+        guesses, feedback, progress = [initial_guess], [], [self.search.num_codes]
+        while True:
+            feedback.append(self.feedback(guesses[-1], secret))
+            if guesses[-1] == secret or len(guesses) == max_guesses:
+                return guesses, feedback, progress
+            path = (initial_guess, *feedback)
+            decision = self._tree.get(path)
+            if decision is None:
+                for guess, packed in zip(guesses[observed:], feedback[observed:]):
+                    self.search.observe(guess, *unpack_score(packed, self.code_length))
+                observed = len(guesses)
+                decision = (len(self.search.remaining_states), self.search.next_guess())
+                if len(self._tree) < self.max_tree_nodes:
+                    self._tree[path] = decision
+            progress.append(decision[0])
+            guesses.append(decision[1])
+
+    def play_game(self, game_index: int, seed: int, max_guesses: int) -> Record:
+        # colors, secret and initial guess are drawn the way `Mastermind` and `KnuthSolver` draw them
+        rng = random.Random(f"{seed}:{game_index}")
+        palette = rng.sample(range(len(COLORS)), k=self.num_colors)
+        secret = rng.sample(range(self.num_colors), k=self.code_length)
+        initial_guess = rng.sample(range(self.num_colors), k=self.code_length)
+        secret_index, initial_index = self.search.space.rank(np.array([secret, initial_guess])).tolist()
+        guesses, feedback, progress = self.play(secret_index, initial_index, max_guesses)
+        return {
+            "game_index": game_index,
+            "code_length": self.code_length,
+            "num_colors": self.num_colors,
+            "palette": bytes(palette),
+            "secret": secret_index,
+            "guesses": guesses,
+            "feedback": bytes(feedback),
+            "progress_history": progress,
+            "solved": guesses[-1] == secret_index,
+        }
+
+
+def _init_worker(code_length: int, num_colors: int):
+    global _worker
+    _worker = SelfPlayWorker(code_length, num_colors)
+
+
+def _play_chunk(start: int, stop: int, seed: int, max_guesses: int) -> List[Record]:
+    return [_worker.play_game(game_index, seed, max_guesses) for game_index in range(start, stop)]
+
+
+def generate_corpus(
+    output_dir: Path,
+    code_length: int,
+    num_colors: int,
+    num_games: int,
+    seed: int = 0,
+    max_guesses: int = 12,
+    num_workers: Optional[int] = None,
+    chunk_size: int = 1000,
+    rows_per_shard: int = 100_000,
+) -> List[Path]:
+    """Play `num_games` solver games and write them as Parquet shards to `output_dir`.
+
+    Every game is seeded with `seed` and its index, so the corpus does not depend on the number of workers or the
+    chunk size. Chunks are written in order with a bounded number in flight.
+    """
+    if code_length > num_colors:
+        raise ValueError("Codes without repeated colors need at least as many colors as positions.")
+
+    num_workers = num_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        max_workers=num_workers, initializer=_init_worker, initargs=(code_length, num_colors)
+    ) as executor, ParquetShardWriter(output_dir, prefix="selfplay", rows_per_shard=rows_per_shard) as writer:
+        in_flight = deque()
+        progress_bar = tqdm(total=num_games, desc=f"Self-play {code_length}x{num_colors}", unit="game")
+
+        def write_next():
+            rows = in_flight.popleft().result()
+            for row in rows:
+                writer.write(row)
+            progress_bar.update(len(rows))
+
+        for start in range(0, num_games, chunk_size):
+            in_flight.append(executor.submit(_play_chunk, start, min(start + chunk_size, num_games), seed, max_guesses))
+            if len(in_flight) >= 2 * num_workers:
+                write_next()
+        while in_flight:
+            write_next()
+        progress_bar.close()
+    return writer.shards
+
+
+def expand_game(record: Record) -> Record:
+    """Stage that turns a self-play row into the game record layout written by `Evaluator.run`.
+
+    Records that already have that layout are passed through unchanged.
+    """
+    if "guess_history" in record:
+        return record
+    code_length, num_colors = record["code_length"], record["num_colors"]
+    possible_colors = [COLORS[i] for i in record["palette"]]
+    codes = CodeSpace(code_length, num_colors).unrank(np.array([record["secret"], *record["guesses"]]))
+    guess_history = [
+        [decode_code(code, possible_colors), list(unpack_score(packed, code_length))]
+        for code, packed in zip(codes[1:], record["feedback"])
+    ]
+    return {
+        "game_index": record["game_index"],
+        "game": {
+            "code_length": code_length,
+            "possible_colors": possible_colors,
+            "secret_code": decode_code(codes[0], possible_colors),
+        },
+        "guess_history": guess_history,
+        "progress_history": list(record["progress_history"]),
+        "solved": record["solved"],
+    }
@@ -1,10 +1,24 @@
 import random
 from abc import ABC, abstractmethod
-from itertools import product
-from typing import List
+from typing import List, Optional
 
+import numpy as np
+
+from mastermind.base import ChatHistory
+from mastermind.code_space import CodeSpace
+from mastermind.feedback import num_scores, pack_score, score_matrix
+from mastermind.feedback_table import get_feedback_table
 from mastermind.game import Mastermind
-from mastermind.models import ChatHistory
+
+# Upper bound for the number of (guess, state) scores materialized at once when partitioning the remaining states.
+# `np.bincount` works on a platform-int copy of the block, so this is ~8 MB of transient memory per block.
+_MAX_BLOCK_ELEMENTS = 1 << 20
+
+# Upper bound for the number of (code, position class, color) counts materialized at once for the symmetry classes.
+_MAX_SYMMETRY_ELEMENTS = 1 << 20
+
+# Below this many remaining states, scoring all candidates is cheaper than finding the symmetry classes.
+_MIN_SYMMETRY_STATES = 64
 
 
 class Solver(ABC):
@@ -15,84 +29,183 @@ class Solver(ABC):
     def __call__(self, chat_history: ChatHistory) -> ChatHistory:
         raise NotImplementedError
 
+    @abstractmethod
+    def for_game(self, game: Mastermind, rng: Optional[random.Random] = None) -> "Solver":
+        """A fresh solver of the same kind bound to `game`, so that games played in parallel never share state.
+
+        Subclasses pass on their own constructor arguments; `rng` is the game's random state.
+        """
+        raise NotImplementedError
+
+
+class KnuthSearch:
+    """Index-level state of Knuth's minimax algorithm over a `(code_length, num_colors)` code space.
+
+    Codes are identified by their index in `itertools.product` order. `unused_guesses` is a boolean mask over
+    all codes and `remaining_states` a sorted array with the indices of the codes consistent with all feedback.
+    """
+
+    def __init__(
+        self, code_length: int, num_colors: int, use_feedback_table: bool = True, use_symmetry: bool = True
+    ):
+        self.code_length = code_length
+        self.num_colors = num_colors
+        self.space = CodeSpace(code_length, num_colors)
+        self.num_codes = self.space.size
+        self.use_feedback_table = use_feedback_table
+        self.use_symmetry = use_symmetry
+        self._load_table()
+        self.reset()
+
+    def _load_table(self):
+        self.table = get_feedback_table(self.code_length, self.num_colors) if self.use_feedback_table else None
+
+    def __getstate__(self):
+        # the feedback table is memory-mapped; a copy sent to another process reopens it instead of pickling it
+        state = self.__dict__.copy()
+        state["table"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._load_table()
+
+    def reset(self):
+        self.unused_guesses = np.ones(self.num_codes, dtype=bool)
+        self.remaining_states = self.space.indices()
+
+    def scores(self, guess_indices: np.ndarray, code_indices: np.ndarray) -> np.ndarray:
+        """Packed scores of the given guesses against the given codes, shape (len(guesses), len(codes))."""
+        if self.table is not None:
+            return self.table.table[np.ix_(guess_indices, code_indices)]
+        return score_matrix(self.space.unrank(guess_indices), self.space.unrank(code_indices), self.num_colors)
+
+    def observe(self, guess_index: int, exact_matches: int, partial_matches: int):
+        self.unused_guesses[guess_index] = False
+        scores = self.scores(np.array([guess_index]), self.remaining_states)[0]
+        packed = pack_score(exact_matches, partial_matches, self.code_length)
+        self.remaining_states = self.remaining_states[scores == packed]
+
+    def minimax_scores(self, guess_indices: np.ndarray) -> np.ndarray:
+        """Number of remaining states each guess is guaranteed to eliminate, via batched partition histograms."""
+        remaining = self.remaining_states
+        possible_scores = num_scores(self.code_length)
+        minimax_scores = np.empty(len(guess_indices), dtype=np.int64)
+        chunk = max(1, _MAX_BLOCK_ELEMENTS // max(1, len(remaining)))
+        for start in range(0, len(guess_indices), chunk):
+            block = self.scores(guess_indices[start : start + chunk], remaining).astype(np.int64)
+            # offset every row into its own range of bins, so a single bincount yields all partition sizes
+            block += np.arange(len(block))[:, None] * possible_scores
+            hit_counter = np.bincount(block.ravel(), minlength=len(block) * possible_scores)
+            minimax_scores[start : start + len(block)] = len(remaining) - hit_counter.reshape(-1, possible_scores).max(1)
+        return minimax_scores
+
+    def symmetry_representatives(self, candidates: np.ndarray) -> np.ndarray:
+        """The smallest code of every class of candidates that the guesses so far cannot tell apart.
+
+        Permuting the colors that no guess used, or positions on which every guess has the same color, leaves all
+        guesses unchanged. It therefore maps the remaining states onto themselves and keeps both a guess's minimax
+        score and its membership in them. Two codes are in the same class iff they have the same number of each
+        used color per class of positions and the same multiset of per-position-class counts of their unused colors.
+        """
+        guesses = self.space.unrank(np.flatnonzero(~self.unused_guesses)).reshape(-1, self.code_length)
+        used_colors = np.unique(guesses)
+        free_colors = np.setdiff1d(np.arange(self.num_colors), used_colors)
+        if len(guesses):
+            _, position_class = np.unique(guesses.T, axis=0, return_inverse=True)
+            position_class = position_class.ravel()
+        else:
+            position_class = np.zeros(self.code_length, dtype=np.int64)
+        num_classes = int(position_class.max()) + 1
+        if len(free_colors) < 2 and num_classes == self.code_length:
+            return candidates
+
+        # the classes are found per chunk of candidates and then merged, so memory does not grow with the code space
+        keys, firsts = [], []
+        chunk = max(1, _MAX_SYMMETRY_ELEMENTS // (num_classes * self.num_colors))
+        for start in range(0, len(candidates), chunk):
+            key = self._symmetry_keys(candidates[start : start + chunk], position_class, used_colors, free_colors)
+            # `candidates` is sorted, so the first occurrence of every key is the smallest code of its class
+            _, first = np.unique(key, axis=0, return_index=True)
+            keys.append(key[first])
+            firsts.append(first + start)
+        _, first = np.unique(np.concatenate(keys), axis=0, return_index=True)
+        return candidates[np.sort(np.concatenate(firsts)[first])]
+
+    def _symmetry_keys(
+        self, candidates: np.ndarray, position_class: np.ndarray, used_colors: np.ndarray, free_colors: np.ndarray
+    ) -> np.ndarray:
+        """One row per candidate that is equal for two candidates iff they are in the same symmetry class."""
+        num_classes = int(position_class.max()) + 1
+        codes = self.space.unrank(candidates)
+        # a count never exceeds the code length
+        counts = np.zeros((len(codes), num_classes, self.num_colors), dtype=np.uint8)
+        rows = np.arange(len(codes))
+        for position in range(self.code_length):
+            counts[rows, position_class[position], codes[:, position]] += 1
+        # the class counts of every unused color as one number, sorted so that relabeling these colors does not matter
+        weights = (self.code_length + 1) ** np.arange(num_classes, dtype=np.int64)
+        free_counts = counts[:, :, free_colors].transpose(0, 2, 1) @ weights
+        used_counts = counts[:, :, used_colors].reshape(len(codes), -1)
+        return np.concatenate([used_counts, np.sort(free_counts, axis=1)], axis=1)
+
+    def next_guess(self) -> int:
+        candidates = np.flatnonzero(self.unused_guesses)
+        if self.use_symmetry and len(self.remaining_states) >= _MIN_SYMMETRY_STATES:
+            # every class scores the same, so the smallest best guess is the smallest of the best representatives
+            candidates = self.symmetry_representatives(candidates)
+        minimax_scores = self.minimax_scores(candidates)
+        # all unused guesses with the max score, in code order
+        best = candidates[minimax_scores == minimax_scores.max()]
+        # if any of them is a member of S, use the smallest such guess, else the smallest guess overall
+        in_remaining = np.isin(best, self.remaining_states, assume_unique=True)
+        return int(best[in_remaining][0]) if in_remaining.any() else int(best[0])
+
 
 class KnuthSolver(Solver):
-    def __init__(self, game: Mastermind):
+    def __init__(self, game: Mastermind, use_feedback_table: bool = True, rng: Optional[random.Random] = None):
         super().__init__(game)
-        self.initial_guess = random.sample(self.game.possible_colors, k=self.game.code_length)
+        self.search = KnuthSearch(game.code_length, game.num_colors, use_feedback_table=use_feedback_table)
+        self.initial_guess = (rng or random).sample(self.game.possible_colors, k=self.game.code_length)
         self.guesses = []
-        self.all_possible_scores = self._compute_all_possible_scores(game)
-        self.unused_guesses = [list(code) for code in product(self.game.possible_colors, repeat=self.game.code_length)]
-        self.remaining_states = [
-            list(code) for code in product(self.game.possible_colors, repeat=self.game.code_length)
-        ]
-
-    def _compute_all_possible_scores(self, game: Mastermind) -> List[List[int]]:
-        all_possible_scores = [
-            (black, white)
-            for black in range(game.code_length + 1)  # `black` can range from 0 to `code_length`
-            for white in range(game.code_length - black + 1)  # `white` depends on remaining slots
-            if black + white <= game.code_length  # Total feedback must not exceed `code_length`
-        ]
-        return all_possible_scores
+
+    def for_game(self, game: Mastermind, rng: Optional[random.Random] = None) -> "KnuthSolver":
+        return type(self)(game, use_feedback_table=self.search.use_feedback_table, rng=rng)
+
+    @property
+    def unused_guesses(self) -> np.ndarray:
+        return self.search.unused_guesses
+
+    @property
+    def remaining_states(self) -> np.ndarray:
+        return self.search.remaining_states
 
     def __call__(self, chat_history: ChatHistory) -> ChatHistory:
         current_guess = sum(["assistant" in x['role'] for x in chat_history])
         if current_guess == 0:
-            self.guesses.append(self.initial_guess)
-            chat_history.append({'role': 'assistant', 'content': self.initial_guess})
-            self.unused_guesses.remove(self.initial_guess)
+            guess = self.initial_guess
         else:
             guess = self._step()
-            self.guesses.append(guess)
-            chat_history.append({"role": "assistant", "content": guess})
-            self.unused_guesses.remove(guess)
+        self.guesses.append(guess)
+        chat_history.append({"role": "assistant", "content": guess})
         return chat_history
 
     def _step(self) -> List[str]:
         last_guess = self.guesses[-1]
         exact_matches, partial_matches = self.game.evaluate_guess(last_guess, self.game.secret_code)
+        self.search.observe(self._code_index(last_guess), exact_matches, partial_matches)
+        return self._decode(self.search.next_guess())
 
-        temp = []
-        for possible_next_guess in self.remaining_states:
-            if self.game.evaluate_guess(last_guess, possible_next_guess) == (exact_matches, partial_matches):
-                temp.append(possible_next_guess)
-        self.remaining_states = temp[:]
-
-        minimax_scores = [] * len(self.unused_guesses)
-        for possible_next_guess in self.unused_guesses:
-            hit_counter = [0] * len(self.all_possible_scores)
-            # for all guesses in S, calculate its peg score if the unused guess in allP
-            # is the answer. Increase the corresponding position in hitCount by 1
-            for logical_guess in self.remaining_states:
-                hit_counter[
-                    self.all_possible_scores.index(self.game.evaluate_guess(logical_guess, possible_next_guess))
-                ] += 1
-            # calculate the score for the current unused guess
-            minimax_scores.append(len(self.remaining_states) - max(hit_counter))
-        # find all indices with the max score
-        max_score = max(minimax_scores)
-        indices = [i for i, x in enumerate(minimax_scores) if x == max_score]
-        # if any guesses corresponds to the indices is a member of S, use that as the next guess
-        change = False
-        for i in range(len(indices)):
-            if self.unused_guesses[indices[i]] in self.remaining_states:
-                guess = self.unused_guesses[indices[i]]
-                change = True
-                break
-        # else use the smallest guess as next guess
-        if change is False:
-            guess = self.unused_guesses[indices[0]]
-        self.guesses.append(guess)
-        return guess
+    def _code_index(self, guess: List[str]) -> int:
+        return self.search.space.rank_colors(guess, self.game.possible_colors)
+
+    def _decode(self, code_index: int) -> List[str]:
+        return self.search.space.unrank_colors(code_index, self.game.possible_colors)
 
     def get_model_info(self) -> str:
         return "KnuthSolver"
 
     def reset(self):
         self.guesses = []
-        self.unused_guesses = [list(code) for code in product(self.game.possible_colors, repeat=self.game.code_length)]
-        self.remaining_states = [
-            list(code) for code in product(self.game.possible_colors, repeat=self.game.code_length)
-        ]
+        self.search.reset()
         self.initial_guess = random.sample(self.game.possible_colors, k=self.game.code_length)
@@ -0,0 +1,279 @@
+import os
+import random
+import tempfile
+import threading
+from argparse import ArgumentParser
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from mastermind.code_space import CodeSpace
+from mastermind.feedback import encode_code, num_scores, pack_score
+from mastermind.feedback_table import default_cache_dir
+from mastermind.game import Mastermind
+from mastermind.solvers import KnuthSearch, KnuthSolver
+
+# Serializes the check-and-build of missing trees (and the cache lookup) between the threads of a process.
+_load_lock = threading.Lock()
+
+
+class StrategyTree:
+    """Knuth's strategy for one `(code_length, num_colors, initial guess)` as a decision tree over code indices.
+
+    Node 0 holds the initial guess. `children[node, packed_score]` is the node reached after that feedback (-1 if
+    the feedback is impossible or wins), `num_remaining` the number of consistent codes before the node's guess and
+    `solves` whether the guess is itself one of them, i.e. whether some secret is found by it at `depths + 1`.
+    """
+
+    root = 0
+
+    def __init__(
+        self,
+        code_length: int,
+        num_colors: int,
+        guesses: np.ndarray,
+        num_remaining: np.ndarray,
+        depths: np.ndarray,
+        solves: np.ndarray,
+        children: np.ndarray,
+    ):
+        self.code_length = code_length
+        self.num_colors = num_colors
+        self.guesses = guesses
+        self.num_remaining = num_remaining
+        self.depths = depths
+        self.solves = solves
+        self.children = children
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.guesses)
+
+    @property
+    def initial_guess(self) -> int:
+        return int(self.guesses[self.root])
+
+    def child(self, node: int, exact_matches: int, partial_matches: int) -> int:
+        child = int(self.children[node, pack_score(exact_matches, partial_matches, self.code_length)])
+        if child < 0:
+            raise ValueError(f"No move for feedback ({exact_matches}, {partial_matches}) at node {node}.")
+        return child
+
+    def guess_counts(self) -> np.ndarray:
+        """Number of secrets solved with exactly `i` guesses at index `i`, read off the tree without playing."""
+        return np.bincount(self.depths[self.solves].astype(np.int64) + 1)
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """Write the tree as a compressed `.npz` file. The file appears atomically at `path`."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f"{path.stem}.", suffix=".tmp.npz")
+        os.close(fd)
+        try:
+            np.savez_compressed(
+                tmp_name,
+                code_length=self.code_length,
+                num_colors=self.num_colors,
+                guesses=self.guesses,
+                num_remaining=self.num_remaining,
+                depths=self.depths,
+                solves=self.solves,
+                children=self.children,
+            )
+            os.replace(tmp_name, path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "StrategyTree":
+        with np.load(path) as data:
+            return cls(
+                int(data["code_length"]),
+                int(data["num_colors"]),
+                data["guesses"],
+                data["num_remaining"],
+                data["depths"],
+                data["solves"],
+                data["children"],
+            )
+
+
+def build_strategy_tree(
+    code_length: int, num_colors: int, initial_guess: int, use_feedback_table: bool = True
+) -> StrategyTree:
+    """Expand Knuth's strategy from `initial_guess` for every possible secret, with the same choices as `KnuthSolver`."""
+    search = KnuthSearch(code_length, num_colors, use_feedback_table=use_feedback_table)
+    winning_score = pack_score(code_length, 0, code_length)
+    guesses: List[int] = []
+    num_remaining: List[int] = []
+    depths: List[int] = []
+    solves: List[bool] = []
+    children: List[np.ndarray] = []
+
+    def add_node(guess: int, remaining: np.ndarray, depth: int) -> int:
+        guesses.append(guess)
+        num_remaining.append(len(remaining))
+        depths.append(depth)
+        position = np.searchsorted(remaining, guess)
+        solves.append(bool(position < len(remaining) and remaining[position] == guess))
+        children.append(np.full(num_scores(code_length), -1, dtype=np.int32))
+        return len(guesses) - 1
+
+    def expand(node: int, remaining: np.ndarray):
+        guess = guesses[node]
+        search.unused_guesses[guess] = False
+        scores = search.scores(np.array([guess]), remaining)[0]
+        for packed in np.unique(scores):
+            if packed == winning_score:
+                continue
+            subset = remaining[scores == packed]
+            if len(subset) == 1:
+                # the only consistent code has not been guessed yet, so the minimax search would pick it as well
+                next_guess = int(subset[0])
+            else:
+                search.remaining_states = subset
+                next_guess = search.next_guess()
+            child = add_node(next_guess, subset, depths[node] + 1)
+            children[node][packed] = child
+            expand(child, subset)
+        search.unused_guesses[guess] = True
+
+    all_states = search.space.indices()
+    expand(add_node(initial_guess, all_states, 0), all_states)
+    return StrategyTree(
+        code_length,
+        num_colors,
+        np.array(guesses, dtype=np.int32),
+        np.array(num_remaining, dtype=np.int32),
+        np.array(depths, dtype=np.uint8),
+        np.array(solves, dtype=bool),
+        np.stack(children),
+    )
+
+
+def tree_path(
+    code_length: int, num_colors: int, initial_guess: int, cache_dir: Optional[Union[str, Path]] = None
+) -> Path:
+    cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir()
+    return cache_dir / f"strategy_{code_length}x{num_colors}_{initial_guess}.npz"
+
+
+@lru_cache(maxsize=None)
+def _load_strategy_tree(code_length: int, num_colors: int, initial_guess: int, path: Path) -> StrategyTree:
+    if not path.exists():
+        build_strategy_tree(code_length, num_colors, initial_guess).save(path)
+    return StrategyTree.load(path)
+
+
+def get_strategy_tree(
+    code_length: int, num_colors: int, initial_guess: int, cache_dir: Optional[Union[str, Path]] = None
+) -> StrategyTree:
+    """Return the strategy tree for a configuration and initial guess (a code index), building it on first use.
+
+    Trees are stored next to the feedback tables (`MASTERMIND_CACHE_DIR`) and loaded once per process.
+    """
+    path = tree_path(code_length, num_colors, initial_guess, cache_dir)
+    with _load_lock:
+        return _load_strategy_tree(code_length, num_colors, initial_guess, path)
+
+
+def canonical_form(code: np.ndarray, num_colors: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Representative of a code under permutations of colors and positions, and the permutations mapping it back.
+
+    Colors are renamed 0, 1, ... by decreasing multiplicity (ties by first occurrence) and positions sorted by the
+    new color, so `[2, 5, 5, 2]` becomes `[0, 0, 1, 1]`. Returns `(canonical, positions, colors)` such that
+    `code[positions[i]] == colors[canonical[i]]`; unused colors fill up `colors` in order. Scores are invariant
+    under these permutations, so a strategy for the canonical code plays any code with the same multiplicities.
+    """
+    code = np.asarray(code)
+    used, first, counts = np.unique(code, return_index=True, return_counts=True)
+    used = used[np.lexsort((first, -counts))]
+    renamed = np.empty(num_colors, dtype=np.int64)
+    renamed[used] = np.arange(len(used))
+    positions = np.argsort(renamed[code], kind="stable")
+    colors = np.concatenate([used, np.setdiff1d(np.arange(num_colors), used)])
+    return renamed[code][positions].astype(code.dtype), positions, colors.astype(code.dtype)
+
+
+def canonical_initial_guess(code_length: int) -> List[int]:
+    """Knuth's `1122`-style opening for any code length: pairs of colors, as color indices."""
+    return [position // 2 for position in range(code_length)]
+
+
+class StrategyTreeSolver(KnuthSolver):
+    """`KnuthSolver` that plays by walking a precomputed strategy tree instead of searching every turn.
+
+    The initial guess is drawn like `KnuthSolver`'s unless one is given. Trees are built for its `canonical_form`
+    and the tree's guesses are mapped back, so all openings with the same color multiplicities (e.g. every opening
+    without duplicates) share one tree per configuration. Ties between equally good guesses can then be broken
+    differently than in `KnuthSolver`, which picks the smallest code index.
+    """
+
+    def __init__(
+        self,
+        game: Mastermind,
+        use_feedback_table: bool = True,
+        rng: Optional[random.Random] = None,
+        initial_guess: Optional[List[str]] = None,
+    ):
+        super().__init__(game, use_feedback_table=use_feedback_table, rng=rng)
+        self.fixed_initial_guess = initial_guess
+        if initial_guess is not None:
+            self.initial_guess = list(initial_guess)
+        self.tree: Optional[StrategyTree] = None
+        self.node = StrategyTree.root
+        self._positions: Optional[np.ndarray] = None
+        self._colors: Optional[np.ndarray] = None
+
+    def for_game(self, game: Mastermind, rng: Optional[random.Random] = None) -> "StrategyTreeSolver":
+        return type(self)(
+            game, use_feedback_table=self.search.use_feedback_table, rng=rng, initial_guess=self.fixed_initial_guess
+        )
+
+    def _step(self) -> List[str]:
+        if self.tree is None:
+            canonical, self._positions, self._colors = canonical_form(
+                encode_code(self.initial_guess, self.game.possible_colors), self.game.num_colors
+            )
+            initial_guess = int(self.search.space.rank(canonical))
+            self.tree = get_strategy_tree(self.game.code_length, self.game.num_colors, initial_guess)
+        exact_matches, partial_matches = self.game.evaluate_guess(self.guesses[-1], self.game.secret_code)
+        self.node = self.tree.child(self.node, exact_matches, partial_matches)
+        guess = np.empty(self.game.code_length, dtype=np.int64)
+        guess[self._positions] = self._colors[self.search.space.unrank(int(self.tree.guesses[self.node]))]
+        return [self.game.possible_colors[color] for color in guess]
+
+    def get_model_info(self) -> str:
+        return "StrategyTreeSolver"
+
+    def reset(self):
+        super().reset()
+        if self.fixed_initial_guess is not None:
+            self.initial_guess = list(self.fixed_initial_guess)
+        self.tree = None
+        self.node = StrategyTree.root
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Build Knuth strategy trees and print their exact guess-count distribution.")
+    parser.add_argument("--code_length", type=int, default=4, help="Code length of the game.")
+    parser.add_argument("--num_colors", type=int, default=6, help="Number of colors in the game.")
+    parser.add_argument(
+        "--initial_guess", type=int, nargs="+", default=None, help="Initial guess as color indices (default: 1122-style)."
+    )
+    parser.add_argument("--cache_dir", type=str, default=None, help="Directory to store the trees in.")
+    args = parser.parse_args()
+
+    initial_guess = args.initial_guess or canonical_initial_guess(args.code_length)
+    initial_guess = int(CodeSpace(args.code_length, args.num_colors).rank(np.array(initial_guess)))
+    tree = get_strategy_tree(args.code_length, args.num_colors, initial_guess, args.cache_dir)
+    counts = tree.guess_counts()
+    print(f"Strategy tree: {tree_path(args.code_length, args.num_colors, initial_guess, args.cache_dir)} ({tree.num_nodes} nodes)")
+    for num_guesses, count in enumerate(counts):
+        if count:
+            print(f"{num_guesses} guesses: {count}")
+    print(f"Average: {np.dot(np.arange(len(counts)), counts) / counts.sum():.4f} guesses, worst case: {len(counts) - 1}")
@@ -0,0 +1,111 @@
+import copy
+import time
+from typing import Any, List, Optional, Tuple
+
+from mastermind.metrics import record
+from mastermind.utils import final_guess_end
+
+# Rough length of a token in characters, to estimate the completion tokens of replies that were cut off.
+_CHARS_PER_TOKEN = 4
+
+
+class StreamCollector:
+    """Accumulates the text deltas of a streamed reply and tells when it can be cut off after its final guess.
+
+    Records `time_to_first_token` on the first non-empty delta and `stopped_early` when the final guess closed
+    before the backend finished. Backends only report the completion tokens of a cut off reply at its end, so
+    these turns record `estimated_completion_tokens` for what was received instead of `completion_tokens`.
+    """
+
+    def __init__(self, stop_at_final_guess: bool = True):
+        self.stop_at_final_guess = stop_at_final_guess
+        self.parts: List[str] = []
+        self.stopped = False
+        self._start = time.perf_counter()
+        self._text: Optional[str] = None
+
+    def add(self, delta: Optional[str]) -> bool:
+        """Add a text delta; returns True once generation can be cancelled."""
+        if not delta:
+            return False
+        if not self.parts:
+            record(time_to_first_token=time.perf_counter() - self._start)
+        self.parts.append(delta)
+        # a guess can only have closed in a delta that contains the closing bracket
+        if self.stop_at_final_guess and "]" in delta:
+            text = "".join(self.parts)
+            end = final_guess_end(text)
+            if end is not None:
+                self._text = text[:end]
+                self.stopped = True
+                record(stopped_early=True, estimated_completion_tokens=self.estimated_tokens())
+        return self.stopped
+
+    def estimated_tokens(self) -> int:
+        """Tokens received so far: at least one per delta, or one per `_CHARS_PER_TOKEN` characters."""
+        return max(len(self.parts), round(sum(len(part) for part in self.parts) / _CHARS_PER_TOKEN))
+
+    @property
+    def text(self) -> str:
+        return self._text if self._text is not None else "".join(self.parts)
+
+
+def stream_chat_completion(client, **kwargs) -> Tuple[str, Any]:
+    """Stream an OpenAI-compatible chat completion and close the stream once the final guess is complete.
+
+    Closing the stream drops the connection, which makes servers like vLLM abort the request. Returns the text and
+    the usage, which is None if the stream was cut off before the final usage chunk.
+    """
+    collector = StreamCollector()
+    usage = None
+    with client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **kwargs) as stream:
+        for chunk in stream:
+            usage = chunk.usage or usage
+            if chunk.choices and collector.add(chunk.choices[0].delta.content):
+                break
+    return collector.text, usage
+
+
+async def astream_chat_completion(client, **kwargs) -> Tuple[str, Any]:
+    collector = StreamCollector()
+    usage = None
+    stream = await client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **kwargs)
+    async with stream:
+        async for chunk in stream:
+            usage = chunk.usage or usage
+            if chunk.choices and collector.add(chunk.choices[0].delta.content):
+                break
+    return collector.text, usage
+
+
+def stream_message(client, **kwargs) -> Tuple[str, Any]:
+    """Stream an Anthropic message and close the stream once the final guess is complete.
+
+    The usage is taken from the message snapshot. Its input and cache counts arrive with the first event, but its
+    output tokens only with the last one, so they are dropped from the usage of a cut off reply.
+    """
+    collector = StreamCollector()
+    with client.messages.stream(**kwargs) as stream:
+        for delta in stream.text_stream:
+            if collector.add(delta):
+                break
+        usage = _received_usage(stream.current_message_snapshot.usage, collector)
+    return collector.text, usage
+
+
+async def astream_message(client, **kwargs) -> Tuple[str, Any]:
+    collector = StreamCollector()
+    async with client.messages.stream(**kwargs) as stream:
+        async for delta in stream.text_stream:
+            if collector.add(delta):
+                break
+        usage = _received_usage(stream.current_message_snapshot.usage, collector)
+    return collector.text, usage
+
+
+def _received_usage(usage, collector: StreamCollector):
+    if not collector.stopped or usage is None:
+        return usage
+    usage = copy.copy(usage)
+    usage.output_tokens = None
+    return usage
@@ -0,0 +1,197 @@
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional
+
+from mastermind.metrics import record
+
+# Status codes worth retrying: timeouts, lock conflicts, rate limits, server errors and Anthropic's "overloaded".
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+THROTTLE_STATUS_CODES = {429, 529}
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+
+def is_retryable(error: BaseException) -> bool:
+    status = status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    # the OpenAI and Anthropic SDKs both raise (subclasses of) an `APIConnectionError` for timeouts and network errors
+    return isinstance(error, (TimeoutError, ConnectionError)) or any(
+        cls.__name__ == "APIConnectionError" for cls in type(error).__mro__
+    )
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds to wait as requested by the server via `retry-after-ms` or `retry-after`, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, never waiting less than the server asked for."""
+
+    def __init__(self, max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, error: BaseException) -> float:
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        requested = retry_after(error)
+        return max(backoff, requested) if requested is not None else backoff
+
+
+class _AIMDLimit:
+    """Additive-increase/multiplicative-decrease concurrency limit.
+
+    Every successful call raises the limit by about one per limit's worth of calls; a throttled call cuts it by
+    `decrease_factor`. Calls that were started before the last cut do not cut it again, so one burst of 429s
+    halves the limit once instead of once per failed request.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, decrease_factor: float = 0.5):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.decrease_factor = decrease_factor
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._epoch = 0
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def _update(self, epoch: int, throttled: bool):
+        self.in_flight -= 1
+        if not throttled:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        elif epoch == self._epoch:
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            self._epoch += 1
+
+
+class AdaptiveConcurrencyLimiter(_AIMDLimit):
+    def __init__(self, max_limit: int, min_limit: int = 1, decrease_factor: float = 0.5):
+        super().__init__(max_limit, min_limit, decrease_factor)
+        self._condition = threading.Condition()
+
+    def acquire(self) -> int:
+        with self._condition:
+            self._condition.wait_for(self._has_capacity)
+            self.in_flight += 1
+            return self._epoch
+
+    def release(self, epoch: int, throttled: bool = False):
+        with self._condition:
+            self._update(epoch, throttled)
+            self._condition.notify_all()
+
+
+class AsyncAdaptiveConcurrencyLimiter(_AIMDLimit):
+    def __init__(self, max_limit: int, min_limit: int = 1, decrease_factor: float = 0.5):
+        super().__init__(max_limit, min_limit, decrease_factor)
+        self._condition: Optional[asyncio.Condition] = None
+
+    async def acquire(self) -> int:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(self._has_capacity)
+            self.in_flight += 1
+            return self._epoch
+
+    async def release(self, epoch: int, throttled: bool = False):
+        async with self._condition:
+            self._update(epoch, throttled)
+            self._condition.notify_all()
+
+
+class Transport:
+    """HTTP connection pool settings, retries and adaptive concurrency shared by the API models of a run.
+
+    Size `max_connections` to the number of games played in parallel. The SDK clients are created with their own
+    retries disabled and an HTTP client from `http_client`; every request then goes through `call`/`acall`.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 16,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        timeout: float = 600.0,
+        adaptive_concurrency: bool = True,
+    ):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retry_policy = RetryPolicy(max_retries=max_retries, base_delay=base_delay, max_delay=max_delay)
+        self.limiter = AdaptiveConcurrencyLimiter(max_connections) if adaptive_concurrency else None
+        self.async_limiter = AsyncAdaptiveConcurrencyLimiter(max_connections) if adaptive_concurrency else None
+        self.num_retries = 0
+        self.num_throttled = 0
+        self._stats_lock = threading.Lock()
+
+    def http_client(self, client_class: Callable[..., Any]):
+        """Build an SDK HTTP client (e.g. `openai.DefaultHttpxClient`) with a pool of `max_connections`."""
+        import httpx
+
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+        return client_class(limits=limits, timeout=self.timeout)
+
+    def _should_retry(self, error: BaseException, attempt: int) -> bool:
+        throttled = status_code(error) in THROTTLE_STATUS_CODES
+        retry = attempt < self.retry_policy.max_retries and is_retryable(error)
+        with self._stats_lock:
+            self.num_throttled += throttled
+            self.num_retries += retry
+        return retry
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        for attempt in range(self.retry_policy.max_retries + 1):
+            epoch = self.limiter.acquire() if self.limiter is not None else 0
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if self.limiter is not None:
+                    self.limiter.release(epoch, throttled=status_code(e) in THROTTLE_STATUS_CODES)
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self.retry_policy.delay(attempt, e))
+            else:
+                if self.limiter is not None:
+                    self.limiter.release(epoch)
+                record(retries=attempt)
+                return result
+
+    async def acall(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        for attempt in range(self.retry_policy.max_retries + 1):
+            epoch = await self.async_limiter.acquire() if self.async_limiter is not None else 0
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                if self.async_limiter is not None:
+                    await self.async_limiter.release(epoch, throttled=status_code(e) in THROTTLE_STATUS_CODES)
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self.retry_policy.delay(attempt, e))
+            else:
+                if self.async_limiter is not None:
+                    await self.async_limiter.release(epoch)
+                record(retries=attempt)
+                return result
@@ -64,6 +64,24 @@ def parse_guess(turn: Dict[str, str]) -> List[str]:
         return []
 
 
+FINAL_GUESS_PATTERN = re.compile(r"FINAL GUESS:\s*\[[^\]\n]*\]")
+
+
+def final_guess_end(text: str) -> Optional[int]:
+    """End offset of the first complete `FINAL GUESS: [...]` line, or None while the guess is still missing.
+
+    Guesses inside an unfinished `<think>` block are ignored, since the model is still reasoning.
+    """
+    start = 0
+    think = text.rfind("<think>")
+    if think >= 0:
+        start = text.find("</think>", think)
+        if start < 0:
+            return None
+    match = FINAL_GUESS_PATTERN.search(text, start)
+    return match.end() if match else None
+
+
 def colorize_code(code):
     return [f"{COLOR_MAP.get(color, '')}{color}{RESET}" for color in code]
 
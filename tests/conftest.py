@@ -17,6 +17,14 @@ class DummyModel(LanguageModel):
         return self.model_name
 
 
+@pytest.fixture(autouse=True)
+def feedback_cache(tmp_path, monkeypatch):
+    """Keep feedback tables and strategy trees in a fresh directory per test."""
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("MASTERMIND_CACHE_DIR", str(cache_dir))
+    return cache_dir
+
+
 @pytest.fixture(scope="module")
 def dummy_model():
     return DummyModel(model_name="dummy")
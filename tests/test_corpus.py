@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from mastermind.corpus import apply_stages, iter_json_array, iter_records, load_shards, select_fields, write_shards
+
+
+def test_iter_json_array_reads_items_across_buffer_boundaries(tmp_path):
+    """Test that a JSON array is read item by item even when items span several reads."""
+    items = [{"index": i, "text": "x" * (i * 7), "nested": [[i, "]"], {"a": "[,"}]} for i in range(50)]
+    path = tmp_path / "raw.json"
+    path.write_text(json.dumps(items, indent=2))
+    assert list(iter_json_array(path, read_size=16)) == items
+
+
+def test_iter_records_and_stages(tmp_path):
+    """Test that JSONL files are streamed in order and stages filter and transform records."""
+    for name, indices in [("b.jsonl", range(5, 10)), ("a.jsonl", range(5))]:
+        with open(tmp_path / name, "w") as f:
+            for i in indices:
+                f.write(json.dumps({"game_index": i, "solved": i % 2 == 0, "chat_history": []}) + "\n")
+
+    records = apply_stages(
+        iter_records(tmp_path), [lambda r: r if r["solved"] else None, select_fields("game_index")]
+    )
+    assert list(records) == [{"game_index": i} for i in range(0, 10, 2)]
+
+
+def test_write_and_load_shards(tmp_path):
+    """Test that records are split into Parquet shards that load back as one dataset."""
+    pytest.importorskip("pyarrow")
+    pytest.importorskip("datasets")
+    records = [{"id": i, "options": {"text": ["a", "b"], "label": ["A", "B"]}} for i in range(25)]
+    shards = write_shards(iter(records), tmp_path / "shards", rows_per_shard=10)
+    assert len(shards) == 3
+    dataset = load_shards(tmp_path / "shards")
+    assert dataset.to_list() == records
+
+    assert len(write_shards(iter(records[:5]), tmp_path / "shards", rows_per_shard=10)) == 1
+    assert load_shards(tmp_path / "shards").to_list() == records[:5]
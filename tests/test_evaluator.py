@@ -1,5 +1,17 @@
+import asyncio
+import json
+import threading
+import time
+from itertools import product
+
+import numpy as np
+import pytest
+
+from mastermind.async_models import AsyncLanguageModel, AsyncRateLimiter
 from mastermind.evaluator import Evaluator
 from mastermind.game import Mastermind
+from mastermind.metrics import PERCENTILES, Histogram
+from mastermind.scheduler import ContinuousBatchScheduler
 
 
 def test_task_instruction_format(dummy_model):
@@ -12,3 +24,200 @@ def test_task_instruction_format(dummy_model):
     assert f"- The following colors are allowed: {game.possible_colors}." in chat_history[0]["content"]
     assert "- Duplicates are not allowed." in chat_history[0]["content"]
     assert "Guess:" in chat_history[1]["content"]
+
+
+def test_progress_matches_brute_force():
+    """Test incremental progress tracking against filtering the full code space."""
+    game = Mastermind(code_length=3, num_colors=4)
+    game.secret_code = game.possible_colors[:3]
+    guess_history = []
+    for guess in (game.possible_colors[1:4], ["cyan"] + game.possible_colors[:2], game.possible_colors[:3]):
+        exact_matches, partial_matches, _ = game.evaluate(guess)
+        guess_history.append((guess, (exact_matches, partial_matches)))
+
+    all_codes = [list(code) for code in product(game.possible_colors, repeat=game.code_length)]
+    expected = [len(all_codes)]
+    for i in range(1, len(guess_history)):
+        expected.append(
+            sum(all(game.evaluate_guess(guess, code) == fb for guess, fb in guess_history[:i]) for code in all_codes)
+        )
+    assert Evaluator(game, None).progress(guess_history, game) == expected
+
+
+def test_progress_tracked_during_game(dummy_model):
+    """Test that progress is tracked live while a game is played."""
+    game = Mastermind(code_length=3, num_colors=4, max_guesses=3)
+    result = Evaluator(game, dummy_model)._run_single_game(0, None, compute_progress=True)
+    assert result["progress_history"] == [4**3] * 3
+
+
+class AsyncDummyModel(AsyncLanguageModel):
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, chat_history):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0)
+        self.in_flight -= 1
+        chat_history.append({"role": "assistant", "content": "This is a dummy response."})
+        return chat_history
+
+    def get_model_info(self) -> str:
+        return "async-dummy"
+
+
+def test_arun_respects_concurrency_limit():
+    """Test that the async engine plays all games with a bounded number in flight."""
+    model = AsyncDummyModel()
+    game = Mastermind(code_length=3, num_colors=4, max_guesses=2)
+    results = asyncio.run(Evaluator(game, model).arun(num_games=20, max_concurrency=4))
+    assert [r["game_index"] for r in results] == list(range(20))
+    assert all(r["num_guesses"] == 2 for r in results)
+    assert 1 < model.max_in_flight <= 4
+
+
+def test_continuous_scheduler_keeps_target_in_flight(tmp_path):
+    """Test that the continuous scheduler plays all games with the target number of requests in flight."""
+    model = AsyncDummyModel()
+    game = Mastermind(code_length=3, num_colors=4, max_guesses=3)
+    evaluator = Evaluator(game, model)
+    results = asyncio.run(
+        evaluator.arun_continuous(num_games=20, target_in_flight=4, save_results=True, save_path=tmp_path)
+    )
+    assert [r["game_index"] for r in results] == list(range(20))
+    assert all(r["num_guesses"] == 3 for r in results)
+    assert model.max_in_flight == 4
+    assert "schedule_wait" in results[0]["turn_history"][1]["metrics"]
+
+    stats = evaluator.scheduler_stats
+    assert stats["requests"] == 60
+    assert 0 < stats["utilization"] <= 1
+    with open(next(tmp_path.glob("*_summary.json"))) as f:
+        assert json.load(f)["scheduler"] == stats
+
+
+def test_continuous_scheduler_collects_results_off_the_event_loop():
+    """Test that the continuous scheduler hands finished games to `on_result` in a worker thread."""
+    game = Mastermind(code_length=3, num_colors=4, max_guesses=2)
+    scheduler = ContinuousBatchScheduler(Evaluator(game, AsyncDummyModel()), target_in_flight=4)
+    collected = []
+
+    def on_result(result):
+        time.sleep(0.01)
+        collected.append((result["game_index"], threading.current_thread()))
+
+    asyncio.run(scheduler.run(list(range(8)), None, False, on_result))
+    assert sorted(index for index, _ in collected) == list(range(8))
+    assert all(thread is not threading.main_thread() for _, thread in collected)
+
+
+def test_async_rate_limiter():
+    """Test that the token bucket spaces out requests beyond the burst size."""
+
+    async def acquire_all(limiter, n):
+        start = time.monotonic()
+        for _ in range(n):
+            await limiter.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(acquire_all(AsyncRateLimiter(requests_per_second=50, burst=1), 6)) >= 0.09
+
+
+def test_run_streams_results_to_disk(dummy_model, tmp_path):
+    """Test that results are streamed to JSONL with an incrementally updated summary."""
+    game = Mastermind(code_length=3, num_colors=4, max_guesses=2)
+    results = Evaluator(game, dummy_model).run(
+        num_games=5, num_parallel=2, save_results=True, save_path=tmp_path, keep_results=False
+    )
+    assert [r["game_index"] for r in results] == list(range(5))
+    assert "chat_history" not in results[0]
+
+    results_file = next(tmp_path.glob("*.jsonl"))
+    with open(results_file) as f:
+        records = [json.loads(line) for line in f]
+    assert sorted(r["game_index"] for r in records) == list(range(5))
+    with open(next(tmp_path.glob("*_summary.json"))) as f:
+        summary = json.load(f)
+    assert summary["num_games_completed"] == 5
+    assert summary["games_solved"] == 0
+
+
+def test_run_resumes_from_results_file(dummy_model, tmp_path):
+    """Test that a resumed run skips recorded games, drops a torn last line and replays identical games."""
+    game = Mastermind(code_length=3, num_colors=4, max_guesses=2)
+    first = Evaluator(game, dummy_model, seed=7).run(num_games=3, save_results=True, save_path=tmp_path)
+    results_file = next(tmp_path.glob("*.jsonl"))
+    with open(results_file) as f:
+        lines = f.readlines()
+    with open(results_file, "w") as f:
+        f.write(lines[0] + lines[1][:20])
+
+    resumed = Evaluator(game, dummy_model, seed=7).run(num_games=4, resume_from=results_file)
+    assert [r["game_index"] for r in resumed] == list(range(4))
+    assert [r["game"]["secret_code"] for r in resumed[:3]] == [r["game"]["secret_code"] for r in first]
+    assert resumed[1]["chat_history"][1] == first[1]["chat_history"][1]
+    with open(results_file) as f:
+        assert sorted(json.loads(line)["game_index"] for line in f) == list(range(4))
+
+
+def test_resume_checks_seed_and_config(dummy_model, tmp_path):
+    """Test that resuming adopts the recorded seed and refuses a different seed or game configuration."""
+    game = Mastermind(code_length=3, num_colors=4, max_guesses=2)
+    Evaluator(game, dummy_model, seed=7).run(num_games=2, save_results=True, save_path=tmp_path)
+    results_file = next(tmp_path.glob("*.jsonl"))
+
+    evaluator = Evaluator(game, dummy_model)
+    evaluator.run(num_games=3, resume_from=results_file)
+    assert evaluator.seed == 7
+    with pytest.raises(ValueError, match="Seed"):
+        Evaluator(game, dummy_model, seed=8).run(num_games=3, resume_from=results_file)
+    longer_game = game.clone()
+    longer_game.max_guesses = 5
+    with pytest.raises(ValueError, match="max_guesses"):
+        Evaluator(longer_game, dummy_model, seed=7).run(num_games=3, resume_from=results_file)
+    with pytest.raises(ValueError, match="possible_colors"):
+        Evaluator(Mastermind(code_length=3, num_colors=4, max_guesses=2), dummy_model, seed=7).run(
+            num_games=3, resume_from=results_file
+        )
+
+    unseeded_dir = tmp_path / "unseeded"
+    unseeded_dir.mkdir()
+    Evaluator(game, dummy_model).run(num_games=1, save_results=True, save_path=unseeded_dir)
+    with pytest.raises(ValueError, match="without a seed"):
+        Evaluator(game, dummy_model).run(num_games=2, resume_from=next(unseeded_dir.glob("*.jsonl")))
+
+
+def test_run_records_turn_metrics_and_summary(dummy_model, tmp_path):
+    """Test that turn and game metrics are attached to results and summarized with percentiles."""
+    game = Mastermind(code_length=3, num_colors=4, max_guesses=2)
+    evaluator = Evaluator(game, dummy_model)
+    results = evaluator.run(num_games=3, num_parallel=2, save_results=True, save_path=tmp_path)
+
+    turn_metrics = results[0]["turn_history"][0]["metrics"]
+    assert {"model_time", "parse_time", "scoring_time", "prompt_time", "wall_time"} <= set(turn_metrics)
+    assert turn_metrics["wall_time"] >= turn_metrics["model_time"]
+    assert {"queue_wait", "wall_time"} <= set(results[0]["metrics"])
+
+    summary = evaluator.metrics_summary
+    assert summary["turn"]["model_time"]["count"] == 6
+    assert summary["game"]["wall_time"]["p50"] <= summary["game"]["wall_time"]["max"]
+    with open(next(tmp_path.glob("*_summary.json"))) as f:
+        assert json.load(f)["metrics"] == summary
+
+
+def test_metrics_histogram_is_bounded_and_close_to_exact_percentiles():
+    """Test that the metrics histogram keeps a bounded number of buckets and percentiles within its precision."""
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(mean=-3, sigma=1, size=50_000)
+    histogram = Histogram()
+    for value in values:
+        histogram.add(float(value))
+    assert len(histogram.buckets) < 1000
+    summary = histogram.describe()
+    assert summary["count"] == len(values)
+    assert summary["max"] == values.max()
+    assert summary["mean"] == pytest.approx(values.mean())
+    for q in PERCENTILES:
+        assert summary[f"p{q}"] == pytest.approx(np.percentile(values, q), rel=0.01)
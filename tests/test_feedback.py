@@ -0,0 +1,100 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+
+import numpy as np
+
+from mastermind import feedback
+from mastermind.code_space import CodeSpace
+from mastermind.feedback_table import get_feedback_table, table_fits, table_path
+from mastermind.game import Mastermind
+
+
+def reference_score(guess, code):
+    exact_matches = sum(s == g for s, g in zip(code, guess))
+    partial_matches = sum(min(code.count(color), guess.count(color)) for color in set(code)) - exact_matches
+    return exact_matches, partial_matches
+
+
+def test_score_matches_reference():
+    """Test the scalar fast path against the original list based implementation."""
+    rng = random.Random(0)
+    colors = ["red", "blue", "green", "yellow", "orange"]
+    for _ in range(500):
+        guess = rng.choices(colors + ["magenta"], k=rng.randint(0, 5))
+        code = rng.choices(colors, k=4)
+        assert feedback.score(guess, code) == reference_score(guess, code)
+
+
+def test_evaluate_guess_wrapper():
+    """Test that the string API delegates to the feedback engine."""
+    game = Mastermind(code_length=4, num_colors=4)
+    assert game.evaluate_guess(["red", "yellow", "green", "blue"], ["red", "blue", "green", "yellow"]) == (2, 2)
+
+
+def test_all_codes_order():
+    """Test that encoded code spaces follow `itertools.product` order."""
+    codes = feedback.all_codes(3, 4)
+    assert codes.tolist() == [list(code) for code in product(range(4), repeat=3)]
+
+
+def test_code_space_rank_unrank_and_sampling():
+    """Test that code indices follow `itertools.product` order and are sampled without replacement."""
+    space = CodeSpace(3, 4)
+    codes = [list(code) for code in product(range(4), repeat=3)]
+    assert space.unrank(space.indices()).tolist() == codes
+    assert space.rank(np.array(codes)).tolist() == list(range(len(space)))
+    assert space.unrank_colors(6, ["a", "b", "c", "d"]) == ["a", "b", "c"]
+    assert [stop - start for start, stop in space.ranges(30)] == [30, 30, 4]
+
+    sampled = space.sample(60, rng=random.Random(0), exclude=[0, 1, 2])
+    assert len(set(sampled)) == 60 and not {0, 1, 2} & set(sampled)
+    assert CodeSpace(6, 10).indices(999_990).tolist() == list(range(999_990, 10**6))
+
+
+def test_score_batch_matches_scalar():
+    """Test batched scoring, including guesses with unknown colors and wrong lengths."""
+    colors = ["red", "blue", "green", "yellow", "orange", "purple"]
+    codes = feedback.all_codes(4, len(colors))
+    decoded = [feedback.decode_code(code, colors) for code in codes]
+    for guess in (["red", "red", "blue", "green"], ["cyan", "red", "blue"], ["blue"] * 5, []):
+        exact, partial = feedback.score_batch(feedback.encode_code(guess, colors), codes, len(colors))
+        assert list(zip(exact.tolist(), partial.tolist())) == [feedback.score(guess, code) for code in decoded]
+
+
+def test_score_matrix_matches_score_batch():
+    """Test that the packed score matrix agrees with per-guess batch scoring."""
+    codes = feedback.all_codes(3, 5)
+    matrix = feedback.score_matrix(codes, codes, 5)
+    for i in np.random.default_rng(0).choice(len(codes), size=20, replace=False):
+        exact, partial = feedback.score_batch(codes[i], codes, 5)
+        assert np.array_equal(matrix[i], feedback.pack_scores(exact, partial, 3))
+    assert feedback.unpack_score(feedback.pack_score(2, 1, 4), 4) == (2, 1)
+
+
+def test_feedback_table(tmp_path):
+    """Test building, memory-mapping and filtering with a precomputed feedback table."""
+    table = get_feedback_table(3, 4, cache_dir=tmp_path)
+    assert table_path(3, 4, tmp_path).exists()
+    assert isinstance(table.table, np.memmap)
+
+    codes = feedback.all_codes(3, 4)
+    assert np.array_equal(table.table, feedback.score_matrix(codes, codes, 4))
+    assert table.rank(np.array([0, 1, 2], dtype=np.uint8)) == 6
+    assert table.rank(np.array([0, 1, feedback.UNKNOWN_COLOR], dtype=np.uint8)) is None
+
+    candidates = table.filter(np.arange(table.num_codes), 6, 3, 0)
+    assert candidates.tolist() == [6]
+    assert get_feedback_table(8, 10, cache_dir=tmp_path) is None
+
+
+def test_feedback_table_concurrent_first_use(tmp_path, monkeypatch):
+    """Test that threads needing a missing table at once build it once and all get it."""
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        tables = list(executor.map(lambda _: get_feedback_table(3, 5, cache_dir=tmp_path), range(8)))
+    assert all(table is tables[0] for table in tables)
+    assert [path.name for path in tmp_path.iterdir()] == ["feedback_3x5.npy"]
+
+    assert get_feedback_table(5, 8, cache_dir=tmp_path) is None
+    monkeypatch.setenv("MASTERMIND_MAX_TABLE_ENTRIES", str(1 << 30))
+    assert table_fits(5, 8)
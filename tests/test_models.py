@@ -0,0 +1,144 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mastermind.models import BatchedHFModel, HFModel
+
+
+class EchoBatchModel:
+    """Stand-in for `HFModel` that answers every chat with its last message."""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def generate_batch(self, chat_histories):
+        with self.lock:
+            self.calls.append(len(chat_histories))
+        return [f"echo: {chat_history[-1]['content']}" for chat_history in chat_histories]
+
+    def get_model_info(self) -> str:
+        return "echo"
+
+
+def test_batched_model_routes_replies_to_their_games():
+    """Test that concurrent turns are batched and every reply reaches the game it belongs to."""
+    backend = EchoBatchModel()
+    model = BatchedHFModel(backend, batch_size=4, max_wait_time=0.2)
+
+    def play(i):
+        return model([{"role": "user", "content": f"game {i}"}])[-1]["content"]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        replies = list(executor.map(play, range(8)))
+
+    assert replies == [f"echo: game {i}" for i in range(8)]
+    assert sum(backend.calls) == 8
+    assert max(backend.calls) == 4
+    assert model.scheduler.num_batches == len(backend.calls)
+    assert model.scheduler.mean_batch_size == 8 / len(backend.calls)
+    assert model.get_model_info() == "echo"
+
+
+@pytest.fixture(scope="module")
+def tiny_model_path(tmp_path_factory):
+    """A randomly initialized two-layer GPT-2 with a small byte-level BPE tokenizer, saved locally."""
+    tokenizers = pytest.importorskip("tokenizers")
+    import torch
+    from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+
+    path = tmp_path_factory.mktemp("tiny_model")
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.BPE(unk_token="<unk>"))
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = tokenizers.decoders.ByteLevel()
+    trainer = tokenizers.trainers.BpeTrainer(
+        vocab_size=300,
+        special_tokens=["<unk>", "<eos>"],
+        initial_alphabet=tokenizers.pre_tokenizers.ByteLevel.alphabet(),
+    )
+    tokenizer.train_from_iterator(["FINAL GUESS: ['red', 'blue', 'green', 'yellow'] feedback"] * 10, trainer)
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="<eos>", unk_token="<unk>")
+    tokenizer.chat_template = (
+        "{% for m in messages %}<|{{ m['role'] }}|>{{ m['content'] }}<eos>{% endfor %}"
+        "{% if add_generation_prompt %}<|assistant|>{% endif %}"
+    )
+    tokenizer.save_pretrained(path)
+    torch.manual_seed(0)
+    config = GPT2Config(vocab_size=len(tokenizer), n_positions=512, n_embd=32, n_layer=2, n_head=2, eos_token_id=1)
+    GPT2LMHeadModel(config).save_pretrained(path)
+    return str(path)
+
+
+def test_prefix_cache_reproduces_uncached_generation(tiny_model_path):
+    """Test that reusing past-key-values across turns and games leaves greedy generations unchanged."""
+    generation_args = {"max_new_tokens": 8, "do_sample": False}
+    plain = HFModel(tiny_model_path, device="cpu", generation_args=dict(generation_args))
+    cached = HFModel(tiny_model_path, device="cpu", generation_args=dict(generation_args), use_prefix_cache=True)
+
+    def play(model, num_game):
+        chat_history = [{"role": "system", "content": "Mastermind " * 10}, {"role": "user", "content": "rules " * 20}]
+        replies = []
+        for turn in range(3):
+            chat_history = model(chat_history)
+            replies.append(chat_history[-1]["content"])
+            chat_history.append({"role": "user", "content": f"Feedback {num_game} {turn}"})
+        return replies
+
+    for num_game in range(2):
+        assert play(cached, num_game) == play(plain, num_game)
+    assert len(cached._prefix_caches) == 1
+
+
+def test_prefix_cache_shares_instruction_across_example_guesses(tiny_model_path):
+    """Test that games whose instructions differ only in the example guess share one cached prefix."""
+    from mastermind.metrics import record_turn
+
+    generation_args = {"max_new_tokens": 8, "do_sample": False}
+    plain = HFModel(tiny_model_path, device="cpu", generation_args=dict(generation_args))
+    cached = HFModel(tiny_model_path, device="cpu", generation_args=dict(generation_args), use_prefix_cache=True)
+
+    def first_turn(model, example_guess):
+        chat_history = [
+            {"role": "system", "content": "Mastermind " * 10},
+            {"role": "user", "content": "rules " * 20 + f"Example: FINAL GUESS: {example_guess}\nMake a guess."},
+        ]
+        with record_turn() as metrics:
+            reply = model(chat_history)[-1]["content"]
+        return reply, metrics
+
+    for example_guess in (["red", "blue"], ["green", "yellow"]):
+        reply, metrics = first_turn(cached, example_guess)
+        assert reply == first_turn(plain, example_guess)[0]
+    assert metrics["cached_tokens"] > 20
+    assert len(cached._prefix_caches) == 1
+
+
+def test_batched_model_reports_turn_metrics():
+    """Test that the scheduler thread records queue wait and batch size into the caller's turn metrics."""
+    from mastermind.metrics import record_turn
+
+    model = BatchedHFModel(EchoBatchModel(), batch_size=2, max_wait_time=0.01)
+    with record_turn() as metrics:
+        model([{"role": "user", "content": "game"}])
+    assert metrics["batch_size"] == 1
+    assert metrics["queue_wait"] >= 0
+    assert metrics["wall_time"] >= metrics["generate_time"]
+
+
+def test_stopping_criteria_stop_at_closed_final_guess(tiny_model_path):
+    """Test that HF generation stops at the token that closes the final guess, not before."""
+    import torch
+    from transformers import AutoTokenizer
+
+    from mastermind.hf_models import FinalGuessStoppingCriteria
+
+    tokenizer = AutoTokenizer.from_pretrained(tiny_model_path)
+    prompt = tokenizer("feedback ")["input_ids"]
+    reply = tokenizer("FINAL GUESS: ['red', 'blue'] feedback")["input_ids"]
+    criteria = FinalGuessStoppingCriteria(tokenizer, prompt_length=len(prompt))
+    stops = [bool(criteria(torch.tensor([prompt + reply[:i]]), None)[0]) for i in range(1, len(reply) + 1)]
+    closed = next(i for i in range(1, len(reply) + 1) if "]" in tokenizer.decode(reply[:i]))
+    # generate keeps a row finished once a criterion fired, so later steps do not matter
+    assert stops[:closed] == [False] * (closed - 1) + [True]
+    assert criteria.time_to_first_token is not None
@@ -0,0 +1,80 @@
+import json
+import os
+
+import numpy as np
+
+from mastermind.evaluator import Evaluator
+from mastermind.game import Mastermind
+from mastermind.models import ChatHistory, LanguageModel
+from mastermind.packed_results import PackedResultWriter, convert_jsonl, load_packed_results
+
+
+class FixedGuessModel(LanguageModel):
+    def __call__(self, chat_history: ChatHistory) -> ChatHistory:
+        chat_history.append({"role": "assistant", "content": "FINAL GUESS: [red, blue, magenta]"})
+        return chat_history
+
+    def get_model_info(self) -> str:
+        return "fixed"
+
+
+def test_convert_and_load_packed_results(tmp_path):
+    """Test that converted JSONL results load back as arrays with the same games, guesses and feedback."""
+    game = Mastermind(code_length=3, num_colors=4, max_guesses=3)
+    Evaluator(game, FixedGuessModel(), seed=3).run(
+        num_games=4, save_results=True, save_path=tmp_path, compute_progress=True
+    )
+    results_file = next(tmp_path.glob("*.jsonl"))
+    with open(results_file) as f:
+        records = sorted((json.loads(line) for line in f), key=lambda r: r["game_index"])
+
+    packed = load_packed_results(convert_jsonl(results_file, tmp_path / "packed"))
+    order = np.argsort(packed.games["game_index"])
+    assert packed.games["game_index"][order].tolist() == list(range(4))
+    assert packed.guesses.shape == (12, 3)
+    for row, record in zip(order, records):
+        assert packed.secret_code(row) == record["game"]["secret_code"]
+        assert packed.chat_history(row) == record["chat_history"]
+        assert packed.progress[packed.turns(row)].tolist() == record["progress_history"]
+        for (guess, score), (expected_guess, expected_score) in zip(packed.guess_history(row), record["guess_history"]):
+            assert list(score) == expected_score
+            assert guess == [color if color in record["game"]["possible_colors"] else None for color in expected_guess]
+    assert packed.exact_matches.max() <= 3
+
+
+def test_packed_results_readable_before_close(tmp_path):
+    """Test that the records of a writer that was never closed can be read with their palettes."""
+    game = Mastermind(code_length=3, num_colors=4, max_guesses=2)
+    results = Evaluator(game, FixedGuessModel(), seed=5).run(num_games=2)
+    writer = PackedResultWriter(tmp_path / "packed")
+    for result in results:
+        writer.write(result)
+    writer.flush()
+
+    packed = load_packed_results(tmp_path / "packed")
+    assert len(packed) == 2
+    assert packed.secret_code(0) == results[0]["game"]["secret_code"]
+    writer.close()
+
+
+def test_partially_written_game_is_dropped_and_overwritten(tmp_path):
+    """Test that a game whose turns did not reach disk is not loaded and that a continuing writer replaces it."""
+    game = Mastermind(code_length=3, num_colors=4, max_guesses=2)
+    results = Evaluator(game, FixedGuessModel(), seed=7).run(num_games=4)
+    with PackedResultWriter(tmp_path / "packed") as writer:
+        for result in results[:3]:
+            writer.write(result)
+    guesses_file = tmp_path / "packed" / "guesses.bin"
+    os.truncate(guesses_file, os.path.getsize(guesses_file) - 1)
+
+    packed = load_packed_results(tmp_path / "packed")
+    assert len(packed) == 2
+    assert packed.guesses.shape == (packed.turn_offsets[-1], 3)
+
+    with PackedResultWriter(tmp_path / "packed") as writer:
+        writer.write(results[3])
+    packed = load_packed_results(tmp_path / "packed")
+    assert packed.games["game_index"].tolist() == [0, 1, 3]
+    assert packed.secret_code(2) == results[3]["game"]["secret_code"]
+    assert packed.chat_history(2) == results[3]["chat_history"]
+    assert [list(score) for _, score in packed.guess_history(2)] == [list(score) for _, score in results[3]["guess_history"]]
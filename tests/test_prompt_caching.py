@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+from mastermind.evaluator import Evaluator
+from mastermind.game import Mastermind
+from mastermind.metrics import record_turn, record_usage
+from mastermind.models import ANTHROPIC_SYSTEM_PROMPT, anthropic_request
+
+
+def test_prompt_caching_keeps_instruction_identical(dummy_model):
+    """Test that with prompt caching every game starts with the same messages."""
+    game = Mastermind(code_length=4, num_colors=6)
+    evaluator = Evaluator(game, dummy_model, seed=0, prompt_caching=True)
+    first_messages = {str(evaluator._init_chat_history(evaluator._game_rng(i))) for i in range(5)}
+    assert len(first_messages) == 1
+
+
+def test_anthropic_request_sets_cache_breakpoints():
+    """Test that system messages are moved out and cache breakpoints set on the instruction and latest turn."""
+    chat_history = [
+        {"role": "system", "content": "Be brief."},
+        {"role": "user", "content": "instruction"},
+        {"role": "assistant", "content": "guess"},
+        {"role": "user", "content": "feedback"},
+    ]
+    system, messages = anthropic_request(chat_history)
+    assert system == "Be brief."
+    assert [turn["content"] for turn in messages] == ["instruction", "guess", "feedback"]
+
+    system, messages = anthropic_request(chat_history, prompt_caching=True)
+    assert system[0]["text"] == "Be brief." and "cache_control" in system[0]
+    assert "cache_control" in messages[0]["content"][0] and "cache_control" in messages[-1]["content"][0]
+    assert messages[1]["content"] == "guess"
+    assert chat_history[1]["content"] == "instruction"
+
+    system, _ = anthropic_request(chat_history[1:2])
+    assert system == ANTHROPIC_SYSTEM_PROMPT
+
+
+def test_record_usage_reports_cached_tokens():
+    """Test that cache reads and writes are recorded for both usage formats."""
+    with record_turn() as metrics:
+        record_usage(
+            SimpleNamespace(input_tokens=10, output_tokens=5, cache_read_input_tokens=100, cache_creation_input_tokens=20),
+            "input_tokens",
+            "output_tokens",
+        )
+    assert metrics["prompt_tokens"] == 130 and metrics["cached_tokens"] == 100 and metrics["cache_write_tokens"] == 20
+
+    with record_turn() as metrics:
+        record_usage(SimpleNamespace(prompt_tokens=50, completion_tokens=5, prompt_tokens_details=SimpleNamespace(cached_tokens=32)))
+    assert metrics["prompt_tokens"] == 50 and metrics["cached_tokens"] == 32
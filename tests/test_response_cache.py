@@ -0,0 +1,114 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from mastermind.async_models import AsyncLanguageModel
+from mastermind.evaluator import Evaluator
+from mastermind.game import Mastermind
+from mastermind.models import ChatHistory, GenerationArgs, LanguageModel
+from mastermind.response_cache import AsyncCachedModel, CachedModel, ResponseCache, request_identity
+
+
+class CountingModel(LanguageModel):
+    def __init__(self):
+        self.generation_args = GenerationArgs(temperature=0.5)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, chat_history: ChatHistory) -> ChatHistory:
+        with self.lock:
+            self.calls += 1
+            calls = self.calls
+        chat_history.append({"role": "assistant", "content": f"reply {calls} to {chat_history[-1]['content']}"})
+        return chat_history
+
+    def get_model_info(self) -> str:
+        return "counting"
+
+
+def test_cached_model_replays_responses(tmp_path):
+    """Test that a rerun is answered from the cache, including repeated identical prompts in order."""
+    prompts = ["a", "b", "a"]
+    backend = CountingModel()
+    model = CachedModel(backend, ResponseCache(tmp_path / "cache.sqlite"))
+    first = [model([{"role": "user", "content": p}])[-1]["content"] for p in prompts]
+    assert backend.calls == 3
+    assert first[0] != first[2]
+
+    rerun_backend = CountingModel()
+    rerun = CachedModel(rerun_backend, ResponseCache(tmp_path / "cache.sqlite"))
+    assert [rerun([{"role": "user", "content": p}])[-1]["content"] for p in prompts] == first
+    assert rerun_backend.calls == 0
+    assert rerun.cache.hits == 3
+
+    rerun_backend.generation_args = GenerationArgs(temperature=0.0)
+    CachedModel(rerun_backend, ResponseCache(tmp_path / "cache.sqlite"))([{"role": "user", "content": "a"}])
+    assert rerun_backend.calls == 1
+
+
+def test_cache_key_includes_stop_at_final_guess(tmp_path):
+    """Test that responses cut off at the final guess are not replayed for a model that returns full replies."""
+    backend = CountingModel()
+    backend.stop_at_final_guess = True
+    CachedModel(backend, ResponseCache(tmp_path / "cache.sqlite"))([{"role": "user", "content": "a"}])
+
+    backend.stop_at_final_guess = False
+    CachedModel(backend, ResponseCache(tmp_path / "cache.sqlite"))([{"role": "user", "content": "a"}])
+    assert backend.calls == 2
+
+
+def test_cache_is_thread_safe_and_evicts_by_size(tmp_path):
+    """Test that concurrent games share the cache and the store stays below its size limit."""
+    cache = ResponseCache(tmp_path / "cache.sqlite", max_size_bytes=2000)
+    model = CachedModel(CountingModel(), cache)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: model([{"role": "user", "content": f"prompt {i}"}]), range(200)))
+    assert cache.misses == 200
+    assert 0 < cache.size_bytes <= 2000
+    stored = cache._connection.execute("SELECT COUNT(*), SUM(size) FROM responses").fetchone()
+    assert stored[0] < 200
+    assert stored[1] == cache.size_bytes
+
+
+def test_async_cached_model(tmp_path):
+    """Test that async backends are cached the same way."""
+
+    class AsyncEcho(AsyncLanguageModel):
+        calls = 0
+
+        async def __call__(self, chat_history):
+            self.calls += 1
+            chat_history.append({"role": "assistant", "content": ["red", "blue"]})
+            return chat_history
+
+        def get_model_info(self):
+            return "async-echo"
+
+    backend = AsyncEcho()
+    model = AsyncCachedModel(backend, ResponseCache(tmp_path / "cache.sqlite"))
+    asyncio.run(model([{"role": "user", "content": "x"}]))
+    rerun = AsyncCachedModel(backend, ResponseCache(tmp_path / "cache.sqlite"))
+    assert asyncio.run(rerun([{"role": "user", "content": "x"}]))[-1]["content"] == ["red", "blue"]
+    assert backend.calls == 1
+
+
+def test_seeded_games_replay_their_own_responses(tmp_path):
+    """Test that a rerun replays each game's responses, independent of completion order and identical prompts."""
+    game = Mastermind(code_length=3, num_colors=4, max_guesses=2)
+    backend = CountingModel()
+    model = CachedModel(backend, ResponseCache(tmp_path / "cache.sqlite"))
+    first = Evaluator(game, model, seed=3, prompt_caching=True).run(num_games=6, num_parallel=4)
+
+    rerun_backend = CountingModel()
+    rerun_model = CachedModel(rerun_backend, ResponseCache(tmp_path / "cache.sqlite"))
+    rerun = Evaluator(game, rerun_model, seed=3, prompt_caching=True).run(num_games=6, num_parallel=1)
+    assert rerun_backend.calls == 0
+    by_game = {result["game_index"]: result["chat_history"] for result in first}
+    assert all(result["chat_history"] == by_game[result["game_index"]] for result in rerun)
+    assert not rerun_model.cache._occurrences
+
+    chat_history = [{"role": "user", "content": "a"}]
+    with request_identity(3, 0, 0):
+        key = rerun_model.cache.request_key("counting", None, chat_history)
+    with request_identity(3, 1, 0):
+        assert rerun_model.cache.request_key("counting", None, chat_history) != key
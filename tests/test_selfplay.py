@@ -0,0 +1,38 @@
+import pytest
+
+from mastermind.corpus import iter_records
+from mastermind.feedback import unpack_score
+from mastermind.selfplay import SelfPlayWorker, expand_game, generate_corpus
+from mastermind.solvers import KnuthSearch
+
+
+def test_memoized_games_match_fresh_search():
+    """Test that games played from the memoized tree equal games played by a fresh search."""
+    worker = SelfPlayWorker(code_length=3, num_colors=4)
+    search = KnuthSearch(3, 4)
+    for game_index in range(40):
+        record = worker.play_game(game_index, seed=0, max_guesses=12)
+        assert record["solved"]
+        assert len(record["feedback"]) == len(record["guesses"]) == len(record["progress_history"])
+        search.reset()
+        guesses, progress = [record["guesses"][0]], [search.num_codes]
+        for packed in record["feedback"][:-1]:
+            search.observe(guesses[-1], *unpack_score(packed, 3))
+            progress.append(len(search.remaining_states))
+            guesses.append(search.next_guess())
+        assert guesses == record["guesses"]
+        assert progress == record["progress_history"]
+
+
+def test_generate_corpus_is_independent_of_chunking(tmp_path):
+    """Test that the corpus only depends on the seed and expands to evaluator-style game records."""
+    pytest.importorskip("pyarrow")
+    generate_corpus(tmp_path / "a", 3, 4, num_games=30, seed=1, num_workers=1, chunk_size=7, rows_per_shard=10)
+    generate_corpus(tmp_path / "b", 3, 4, num_games=30, seed=1, num_workers=1, chunk_size=30)
+    rows_a, rows_b = list(iter_records(tmp_path / "a")), list(iter_records(tmp_path / "b"))
+    assert rows_a == rows_b
+    assert [row["game_index"] for row in rows_a] == list(range(30))
+
+    game = expand_game(rows_a[0])
+    assert game["guess_history"][-1][0] == game["game"]["secret_code"]
+    assert game["guess_history"][-1][1] == [3, 0]
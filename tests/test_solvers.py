@@ -0,0 +1,84 @@
+import random
+
+import numpy as np
+
+from mastermind.evaluator import Evaluator
+from mastermind.feedback import unpack_score
+from mastermind.game import Mastermind
+from mastermind.solvers import KnuthSearch, KnuthSolver
+
+
+def play(solver: KnuthSolver, game: Mastermind):
+    chat_history = []
+    guesses = []
+    while len(guesses) < game.max_guesses:
+        chat_history = solver(chat_history)
+        guesses.append(chat_history[-1]["content"])
+        if guesses[-1] == game.secret_code:
+            break
+        chat_history.append({"role": "user", "content": "Feedback"})
+    return guesses
+
+
+def test_knuth_solver_solves_game():
+    """Test that the solver finds the secret code within Knuth's bound."""
+    random.seed(0)
+    game = Mastermind(code_length=4, num_colors=6)
+    guesses = play(KnuthSolver(game), game)
+    assert guesses[-1] == game.secret_code
+    assert len(guesses) <= 5
+
+
+def test_knuth_solver_tracks_index_sets():
+    """Test that the solver state is kept as index arrays over the code space."""
+    random.seed(1)
+    game = Mastermind(code_length=3, num_colors=4)
+    solver = KnuthSolver(game)
+    guesses = play(solver, game)
+    assert solver.unused_guesses.dtype == bool
+    assert solver.unused_guesses.sum() == 4**3 - (len(guesses) - 1)
+    assert np.all(np.diff(solver.remaining_states) > 0)
+
+
+def test_knuth_solver_table_and_batch_scoring_agree():
+    """Test that table lookups and batched scoring lead to identical guesses."""
+    for seed in range(3):
+        random.seed(seed)
+        game = Mastermind(code_length=3, num_colors=5)
+        with_table = play(KnuthSolver(game), game)
+        random.seed(seed)
+        game = Mastermind(code_length=3, num_colors=5)
+        without_table = play(KnuthSolver(game, use_feedback_table=False), game)
+        assert with_table == without_table
+
+
+def test_solver_games_in_processes_match_threads():
+    """Test that every game gets its own solver and that process and thread runs play the same games."""
+    game = Mastermind(code_length=3, num_colors=4)
+    solver = KnuthSolver(game)
+    threaded = Evaluator(game, solver, seed=0).run(num_games=6, num_parallel=2)
+    in_processes = Evaluator(game, solver, seed=0).run(num_games=6, num_parallel=2, use_processes=True)
+
+    assert all(r["solved"] for r in threaded)
+    assert [r["guess_history"] for r in threaded] == [r["guess_history"] for r in in_processes]
+    assert solver.guesses == []
+    assert all(r["metrics"]["queue_wait"] >= 0 for r in in_processes)
+
+
+def test_symmetry_reduction_keeps_choices():
+    """Test that scoring one representative per symmetry class yields the same guesses as scoring all codes."""
+    search = KnuthSearch(4, 6)
+    assert search.symmetry_representatives(np.arange(6**4)).tolist() == [0, 1, 7, 8, 51]
+
+    reduced, full = KnuthSearch(4, 5), KnuthSearch(4, 5, use_symmetry=False)
+    rng = np.random.default_rng(0)
+    for _ in range(10):
+        secret, guess = (int(i) for i in rng.integers(5**4, size=2))
+        reduced.reset()
+        full.reset()
+        while guess != secret:
+            feedback = unpack_score(reduced.scores(np.array([guess]), np.array([secret]))[0, 0], 4)
+            reduced.observe(guess, *feedback)
+            full.observe(guess, *feedback)
+            guess = reduced.next_guess()
+            assert guess == full.next_guess()
@@ -0,0 +1,70 @@
+import random
+
+import numpy as np
+
+from mastermind.feedback import rank_codes
+from mastermind.game import Mastermind
+from mastermind.solvers import KnuthSolver
+from mastermind.strategy_tree import (
+    StrategyTree,
+    StrategyTreeSolver,
+    build_strategy_tree,
+    canonical_form,
+    canonical_initial_guess,
+    get_strategy_tree,
+    tree_path,
+)
+
+
+def play(solver: KnuthSolver):
+    chat_history = []
+    while True:
+        chat_history = solver(chat_history)
+        if solver.guesses[-1] == solver.game.secret_code:
+            return solver.guesses
+
+
+def test_guess_counts_match_knuth():
+    """Test that the exact distribution from the tree matches Knuth's published result for 1122 on 4x6."""
+    tree = build_strategy_tree(4, 6, int(rank_codes(np.array([0, 0, 1, 1]), 6)))
+    assert tree.guess_counts().tolist() == [0, 1, 6, 62, 533, 694]
+
+
+def test_tree_solver_plays_like_knuth_solver(feedback_cache):
+    """Test that walking the saved tree yields the same games as searching every turn."""
+    for seed in range(5):
+        random.seed(seed)
+        game = Mastermind(code_length=3, num_colors=5)
+        initial_guess = [game.possible_colors[color] for color in canonical_initial_guess(3)]
+        knuth_solver = KnuthSolver(game)
+        knuth_solver.initial_guess = initial_guess
+        searched = play(knuth_solver)
+        walked = play(StrategyTreeSolver(game, initial_guess=initial_guess))
+        assert walked == searched
+
+    initial_guess = int(rank_codes(np.array([0, 1, 2]), 5))
+    tree = get_strategy_tree(3, 5, initial_guess)
+    loaded = StrategyTree.load(tree_path(3, 5, initial_guess, feedback_cache))
+    assert np.array_equal(loaded.children, tree.children)
+    assert loaded.guess_counts().sum() == 5**3
+
+
+def test_canonical_form_maps_back():
+    """Test that codes with the same color multiplicities share a canonical form that maps back to them."""
+    code = np.array([4, 2, 2, 4, 0], dtype=np.uint8)
+    canonical, positions, colors = canonical_form(code, 6)
+    assert canonical.tolist() == [0, 0, 1, 1, 2]
+    assert np.array_equal(code[positions], colors[canonical])
+    assert sorted(colors.tolist()) == list(range(6))
+
+
+def test_random_openings_share_one_tree(feedback_cache):
+    """Test that games from random openings without duplicates are all won from a single cached tree."""
+    tree = get_strategy_tree(4, 6, int(rank_codes(np.array([0, 1, 2, 3]), 6)))
+    worst_case = len(tree.guess_counts()) - 1
+    for seed in range(20):
+        random.seed(seed)
+        game = Mastermind(code_length=4, num_colors=6)
+        guesses = play(StrategyTreeSolver(game, rng=random.Random(seed)))
+        assert len(guesses) <= worst_case
+    assert len(list(feedback_cache.glob("strategy_*.npz"))) == 1
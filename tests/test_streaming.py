@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+from mastermind.metrics import record_turn
+from mastermind.streaming import StreamCollector, stream_chat_completion, stream_message
+from mastermind.utils import final_guess_end, parse_guess
+
+
+class FakeStream:
+    """Stand-in for an OpenAI chat completion stream that counts how many chunks were read."""
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+        self.consumed = 0
+        self.closed = False
+
+    def __iter__(self):
+        for delta in self.deltas:
+            self.consumed += 1
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+
+def test_final_guess_end():
+    """Test that only a closed guess line after any reasoning block counts as the final guess."""
+    assert final_guess_end("I think FINAL GUESS: ['red', 'bl") is None
+    assert final_guess_end("<think>FINAL GUESS: ['red']") is None
+    text = "<think>maybe [red]</think>\nFINAL GUESS: ['red', 'blue'] and more"
+    assert text[: final_guess_end(text)].endswith("['red', 'blue']")
+
+
+def test_stream_is_closed_after_final_guess():
+    """Test that streaming stops reading at the closing bracket and records the stream metrics."""
+    stream = FakeStream(["Let me think. ", "FINAL GUESS: ['red', ", "'blue']\nActually, ", "more text", "..."])
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: stream)))
+    with record_turn() as metrics:
+        text, usage = stream_chat_completion(client, model="m", messages=[])
+
+    assert text == "Let me think. FINAL GUESS: ['red', 'blue']"
+    assert parse_guess({"content": text}) == ["red", "blue"]
+    assert stream.consumed == 3 and stream.closed and usage is None
+    assert metrics["stopped_early"] is True and metrics["time_to_first_token"] >= 0
+    assert metrics["estimated_completion_tokens"] == 13 and "completion_tokens" not in metrics
+
+    collector = StreamCollector(stop_at_final_guess=False)
+    assert not any(collector.add(delta) for delta in ["FINAL GUESS: ['red']", " done"])
+    assert collector.text == "FINAL GUESS: ['red'] done"
+
+
+def test_cut_message_drops_stale_output_tokens():
+    """Test that a cut off Anthropic stream keeps the input counts but not the output tokens of its first event."""
+
+    class FakeMessageStream:
+        text_stream = iter(["FINAL GUESS: ['red']", " and then"])
+        current_message_snapshot = SimpleNamespace(usage=SimpleNamespace(input_tokens=12, output_tokens=1))
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            pass
+
+    client = SimpleNamespace(messages=SimpleNamespace(stream=lambda **kwargs: FakeMessageStream()))
+    with record_turn() as metrics:
+        text, usage = stream_message(client, model="m", messages=[])
+    assert text == "FINAL GUESS: ['red']"
+    assert usage.input_tokens == 12 and usage.output_tokens is None
+    assert metrics["estimated_completion_tokens"] == 5
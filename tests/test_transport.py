@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from mastermind import transport as transport_module
+from mastermind.transport import AdaptiveConcurrencyLimiter, Transport
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = FakeResponse(headers or {})
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+def flaky(errors):
+    errors = list(errors)
+
+    def call(value):
+        if errors:
+            raise errors.pop(0)
+        return value
+
+    return call
+
+
+def test_call_retries_with_backoff_and_retry_after(monkeypatch):
+    """Test that throttling and connection errors are retried, honoring retry-after, and 4xx errors are not."""
+    delays = []
+    monkeypatch.setattr(transport_module.time, "sleep", delays.append)
+    transport = Transport(max_connections=4, base_delay=0.01)
+    fn = flaky([FakeAPIError(429, {"retry-after": "3"}), APIConnectionError(), FakeAPIError(503)])
+    assert transport.call(fn, "ok") == "ok"
+    assert len(delays) == 3
+    assert delays[0] >= 3
+    assert max(delays[1:]) <= 0.04
+    assert transport.num_retries == 3
+    assert transport.num_throttled == 1
+
+    with pytest.raises(FakeAPIError):
+        transport.call(flaky([FakeAPIError(400)]), "ok")
+    with pytest.raises(FakeAPIError):
+        Transport(max_retries=2, base_delay=0).call(flaky([FakeAPIError(500)] * 3), "ok")
+
+
+def test_adaptive_limiter_shrinks_once_per_burst_and_recovers():
+    """Test that a burst of throttled calls halves the limit once and successes grow it back."""
+    limiter = AdaptiveConcurrencyLimiter(max_limit=8)
+    epochs = [limiter.acquire() for _ in range(8)]
+    for epoch in epochs:
+        limiter.release(epoch, throttled=True)
+    assert limiter.limit == 4
+    for _ in range(200):
+        limiter.release(limiter.acquire())
+    assert limiter.limit == 8
+
+
+def test_acall_retries():
+    """Test that async calls are retried the same way."""
+
+    errors = [FakeAPIError(529, {"retry-after-ms": "1"})]
+
+    async def fn():
+        if errors:
+            raise errors.pop()
+        return "ok"
+
+    transport = Transport(base_delay=0)
+    assert asyncio.run(transport.acall(fn)) == "ok"
+    assert transport.async_limiter.limit < transport.max_connections